@@ -0,0 +1,72 @@
+"""
+Compares the previous DataCollatorForMultipleChoice (flattening with `sum` and `tokenizer.pad`) with the current one
+on large COPA/WS-like batches.
+
+    python benchmarks/multiple_choice_collator.py --batch-size 512 --num-choices 2
+"""
+import argparse
+import random
+import timeit
+
+import torch
+from transformers import BertTokenizerFast
+
+from hueval.utils.data_collator import DataCollatorForMultipleChoice
+
+
+def previous_collator(tokenizer, features, padding, max_length):
+    labels = [feature.pop("labels") for feature in features]
+    batch_size = len(features)
+    num_choices = len(features[0]["input_ids"])
+    flattened_features = [
+        [{k: v[i] for k, v in feature.items()} for i in range(num_choices)] for feature in features
+    ]
+    flattened_features = sum(flattened_features, [])
+    batch = tokenizer.pad(flattened_features, padding=padding, max_length=max_length, return_tensors="pt")
+    batch = {k: v.view(batch_size, num_choices, -1) for k, v in batch.items()}
+    batch["labels"] = torch.tensor(labels, dtype=torch.int64)
+    return batch
+
+
+def make_features(batch_size, num_choices, max_length, vocab_size):
+    features = []
+    for _ in range(batch_size):
+        lengths = [random.randint(8, max_length) for _ in range(num_choices)]
+        features.append({
+            "input_ids": [[random.randrange(vocab_size) for _ in range(n)] for n in lengths],
+            "token_type_ids": [[0] * n for n in lengths],
+            "attention_mask": [[1] * n for n in lengths],
+            "labels": random.randrange(num_choices),
+        })
+    return features
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tokenizer", default="SZTAKI-HLT/hubert-base-cc")
+    parser.add_argument("--batch-size", type=int, default=512)
+    parser.add_argument("--num-choices", type=int, default=2)
+    parser.add_argument("--max-length", type=int, default=256)
+    parser.add_argument("--padding", default="longest")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    tokenizer = BertTokenizerFast.from_pretrained(args.tokenizer)
+    features = make_features(args.batch_size, args.num_choices, args.max_length, tokenizer.vocab_size)
+    collator = DataCollatorForMultipleChoice(tokenizer, padding=args.padding, max_length=args.max_length)
+
+    expected = previous_collator(tokenizer, [dict(f) for f in features], args.padding, args.max_length)
+    actual = collator(features)
+    assert all(torch.equal(expected[k], actual[k]) for k in expected)
+
+    previous = timeit.timeit(
+        lambda: previous_collator(tokenizer, [dict(f) for f in features], args.padding, args.max_length),
+        number=args.repeat
+    ) / args.repeat
+    current = timeit.timeit(lambda: collator(features), number=args.repeat) / args.repeat
+    print(f"previous: {previous * 1000:.1f} ms/batch, current: {current * 1000:.1f} ms/batch, "
+          f"speedup: {previous / current:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""
+Compares the previous uncased HuBert tokenizer (lowercasing the inputs in Python in `__call__`) with the current one
+(lowercasing in the normalizer of the backend tokenizer) on HuLU-like sentence pairs.
+
+    python benchmarks/uncased_tokenizer.py --vocab path/to/hubert_wiki_lower/vocab.txt --batch-size 1000
+"""
+import argparse
+import random
+import timeit
+
+from transformers import BertTokenizerFast
+
+from hueval.tokenizers.hubert import HuBertUncasedTokenizer
+
+
+class PreviousUncasedTokenizer(BertTokenizerFast):
+    def __call__(self, text, text_pair=None, **kwargs):
+        text = [x.lower() for x in text]
+        if text_pair is not None:
+            text_pair = [x.lower() for x in text_pair]
+        return super(PreviousUncasedTokenizer, self).__call__(text, text_pair, **kwargs)
+
+
+_WORDS = ["Az", "alma", "leesett", "a", "fáról,", "egyenesen", "Péter", "fejére.", "ŐSZI", "Éjszaka", "ÚJ", "öröm",
+          "Budapesten", "KÖZÉPEN", "Ünnep", "és", "NYTK", "1848-ban", "űrhajó", "Ízlés"]
+
+
+def make_sentences(n, max_words):
+    return [" ".join(random.choice(_WORDS) for _ in range(random.randint(3, max_words))) for _ in range(n)]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--vocab", required=True, help="vocab.txt of the uncased HuBert wiki model")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--max-words", type=int, default=40)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    previous_tokenizer = PreviousUncasedTokenizer(args.vocab, do_lower_case=False)
+    tokenizer = HuBertUncasedTokenizer(args.vocab)
+    sentences = make_sentences(args.batch_size, args.max_words)
+    pairs = make_sentences(args.batch_size, args.max_words)
+    kwargs = {"truncation": True, "max_length": 256}
+
+    expected = previous_tokenizer(sentences, pairs, **kwargs)
+    actual = tokenizer(sentences, pairs, **kwargs)
+    assert all(expected[k] == actual[k] for k in expected)
+
+    previous = timeit.timeit(lambda: previous_tokenizer(sentences, pairs, **kwargs), number=args.repeat) / args.repeat
+    current = timeit.timeit(lambda: tokenizer(sentences, pairs, **kwargs), number=args.repeat) / args.repeat
+    print(f"previous: {previous * 1000:.1f} ms/batch, current: {current * 1000:.1f} ms/batch, "
+          f"speedup: {previous / current:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,4 @@
+from hueval.cli import main
+
+
+main()
@@ -0,0 +1,231 @@
+import argparse
+import json
+import os
+from typing import List, Optional
+
+
+def _parse_value(value: str):
+    try:
+        return json.loads(value)
+    except json.JSONDecodeError:
+        return value
+
+
+def _list(args: argparse.Namespace):
+    if args.models:
+        from hueval.prepare import all_models
+        for model in all_models:
+            print(model)
+    elif args.tasks:
+        from hueval.prepare import all_tasks
+        for task in all_tasks:
+            print(" ".join(task))
+    else:
+        from hueval.datasets import available_datasets, available_configs
+        for name in available_datasets():
+            print(f"{name}: {', '.join(available_configs(name))}")
+
+
+def _prepare(args: argparse.Namespace):
+    from hueval.datasets import available_configs, prepare_dataset
+    for config in args.configs or available_configs(args.name):
+        prepare_dataset(args.name, config, num_proc=args.num_proc)
+
+
+def _refresh_checksums(args: argparse.Namespace):
+    from hueval.utils.network import refresh_checksums
+    for url in refresh_checksums(args.urls or None):
+        print(f"Forgot the recorded checksum of {url}")
+
+
+def _training_settings(args: argparse.Namespace):
+    from hueval.training import _PREDEFINED_TRAINING_ARGUMENTS
+    training_arguments = dict(_PREDEFINED_TRAINING_ARGUMENTS)
+    training_arguments["output_dir"] = os.path.expanduser(args.output_dir)
+    for argument in args.argument:
+        key, _, value = argument.partition("=")
+        training_arguments[key] = _parse_value(value)
+    training_kwargs = {
+        "max_seq_length": args.max_seq_length,
+        "seed": args.seed,
+        "batching": args.batching,
+        "max_tokens": args.max_tokens,
+        "packing": args.packing,
+        "preprocessing_batch_size": args.preprocessing_batch_size,
+        "preprocessing_num_proc": args.preprocessing_num_proc,
+    }
+    return training_kwargs, training_arguments
+
+
+def _training(args: argparse.Namespace, checkpoint: Optional[str] = None):
+    from hueval.training import Training
+    training_kwargs, training_arguments = _training_settings(args)
+    return Training(args.model, args.task, args.config, args.label, checkpoint=checkpoint, **training_kwargs,
+                    **training_arguments)
+
+
+def _fine_tuned_training(args: argparse.Namespace):
+    """
+    Training of the model saved into the output directory by `hueval train`, or of a model which is fine-tuned itself
+    """
+    from hueval.training import find_checkpoint
+    output_dir = os.path.expanduser(args.output_dir)
+    checkpoint = find_checkpoint(output_dir, args.model, args.task, args.config, args.label)
+    if checkpoint is None:
+        from hueval.models.cache import is_fine_tuned
+        if not is_fine_tuned(args.model):
+            raise SystemExit(f"{output_dir} does not contain {args.model} fine-tuned on {args.task}/{args.config}, "
+                             f"run `hueval train` with the same --output-dir first")
+    return _training(args, checkpoint=checkpoint)
+
+
+def _print_results(args: argparse.Namespace, results: Optional[dict]):
+    if results is None:
+        print(f"The test split of {args.task}/{args.config} is unlabeled, it can not be evaluated. "
+              f"Use `hueval predict` to write its predictions.")
+    else:
+        print(json.dumps(results, indent=2))
+
+
+def _train(args: argparse.Namespace):
+    training = _training(args)
+    training.train()
+    print(f"Saved the fine-tuned model into {training.save()}")
+    _print_results(args, training.eval())
+    if args.predictions:
+        training.predict(os.path.expanduser(args.predictions))
+
+
+def _predict(args: argparse.Namespace):
+    training = _fine_tuned_training(args)
+    print(training.predict(os.path.expanduser(args.predictions), split=args.split, batch_size=args.batch_size))
+
+
+def _eval(args: argparse.Namespace):
+    training = _fine_tuned_training(args)
+    _print_results(args, training.eval())
+
+
+def _optimize(args: argparse.Namespace):
+    training = _fine_tuned_training(args)
+    report_path = None if args.report is None else os.path.expanduser(args.report)
+    report = training.compare_runtimes(args.runtimes, split=args.split, batch_size=args.batch_size,
+                                       report_path=report_path)
+    print(json.dumps(report, indent=2))
+
+
+def _sweep(args: argparse.Namespace):
+    from hueval.prepare import all_configurations
+    from hueval.sweep import run_sweep, select_configurations
+    training_kwargs, training_arguments = _training_settings(args)
+    configurations = select_configurations(all_configurations, args.models, args.tasks)
+    memory_budget = None if args.memory_budget is None else int(args.memory_budget * (1 << 30))
+    run_sweep(configurations, os.path.expanduser(args.results_dir), memory_budget=memory_budget,
+              max_workers=args.max_workers, training_arguments=training_arguments, **training_kwargs)
+
+
+def _add_training_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("model", help="Name of the model, like 'SZTAKI-HLT/hubert-base-cc' or 'hubert-wiki-cased'")
+    parser.add_argument("task", help="Name of the dataset")
+    parser.add_argument("config", help="Name of the dataset configuration")
+    parser.add_argument("label", help="Name of the label column")
+    _add_training_options(parser)
+
+
+def _add_training_options(parser: argparse.ArgumentParser):
+    parser.add_argument("--max-seq-length", type=int, default=256)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--batching", choices=["fixed", "token_budget"], default="fixed",
+                        help="Pad to --max-seq-length, or batch by a token budget and pad to the longest example")
+    parser.add_argument("--max-tokens", type=int, default=4096, help="Token budget of a batch")
+    parser.add_argument("--packing", action="store_true",
+                        help="Pack sequence classification examples into --max-seq-length tokens (BERT models only)")
+    parser.add_argument("--preprocessing-batch-size", type=int, default=1000,
+                        help="Number of examples passed to the tokenizer at once")
+    parser.add_argument("--preprocessing-num-proc", type=int, default=None,
+                        help="Number of processes used by the tokenization")
+    parser.add_argument("--output-dir", default="~/temp/")
+    parser.add_argument("--argument", "-a", action="append", default=[], metavar="KEY=VALUE",
+                        help="Further transformers.TrainingArguments, values are parsed as JSON when possible")
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="hueval", description="Hungarian Evaluation library for NLP")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    list_parser = commands.add_parser("list", help="List the available datasets, models or tasks")
+    list_parser.add_argument("--models", action="store_true", help="List the evaluated models")
+    list_parser.add_argument("--tasks", action="store_true", help="List the evaluated tasks")
+    list_parser.set_defaults(func=_list)
+
+    prepare_parser = commands.add_parser("prepare", help="Download and prepare a dataset")
+    prepare_parser.add_argument("name", help="Name of the dataset")
+    prepare_parser.add_argument("configs", nargs="*", help="Configurations to prepare, every configuration by default")
+    prepare_parser.add_argument("--num-proc", type=int, default=None)
+    prepare_parser.set_defaults(func=_prepare)
+
+    train_parser = commands.add_parser(
+        "train", help="Fine-tune a model on a task, save it into --output-dir and evaluate it on the test split"
+    )
+    _add_training_arguments(train_parser)
+    train_parser.add_argument("--predictions", default=None, metavar="PATH",
+                              help="Write the predictions of the test split in the submission format of HuLU")
+    train_parser.set_defaults(func=_train)
+
+    eval_parser = commands.add_parser(
+        "eval", help="Evaluate the model fine-tuned by `hueval train` (in --output-dir) on the test split of a task"
+    )
+    _add_training_arguments(eval_parser)
+    eval_parser.set_defaults(func=_eval)
+
+    predict_parser = commands.add_parser(
+        "predict", help="Write the predictions of a model on a (possibly unlabeled) split in the HuLU submission format"
+    )
+    _add_training_arguments(predict_parser)
+    predict_parser.add_argument("predictions", help="Path of the JSON file")
+    predict_parser.add_argument("--split", default="test")
+    predict_parser.add_argument("--batch-size", type=int, default=128)
+    predict_parser.set_defaults(func=_predict)
+
+    optimize_parser = commands.add_parser(
+        "optimize", help="Compare the metrics and the CPU throughput of optimized runtimes of the model fine-tuned by "
+                         "`hueval train` (in --output-dir) to fp32"
+    )
+    _add_training_arguments(optimize_parser)
+    optimize_parser.add_argument("--runtimes", nargs="*", default=None,
+                                 choices=["fp32", "int8", "torchscript", "onnx"],
+                                 help="Runtimes to compare with fp32, every runtime by default")
+    optimize_parser.add_argument("--split", default="validation", help="Labeled split used by the evaluation")
+    optimize_parser.add_argument("--batch-size", type=int, default=32)
+    optimize_parser.add_argument("--report", default=None, metavar="PATH", help="Path of the JSON report")
+    optimize_parser.set_defaults(func=_optimize)
+
+    sweep_parser = commands.add_parser(
+        "sweep", help="Fine-tune and evaluate every model on every task, finished jobs are skipped on restart"
+    )
+    sweep_parser.add_argument("results_dir", help="Directory of the per job results")
+    sweep_parser.add_argument("--models", nargs="*", default=[], help="Models to run, every model by default")
+    sweep_parser.add_argument("--tasks", nargs="*", default=[],
+                              help="Tasks to run as task, task/config or task/config/label, every task by default")
+    sweep_parser.add_argument("--memory-budget", type=float, default=None,
+                              help="Memory (GiB) used by the concurrent jobs, 80%% of the physical memory by default")
+    sweep_parser.add_argument("--max-workers", type=int, default=None,
+                              help="Maximum number of concurrent workers, the number of CPUs by default (limited by "
+                                   "the memory of the host and the GPUs)")
+    _add_training_options(sweep_parser)
+    sweep_parser.set_defaults(func=_sweep)
+
+    checksums_parser = commands.add_parser("refresh-checksums",
+                                           help="Forget the checksums recorded at the first downloads of resources")
+    checksums_parser.add_argument("urls", nargs="*", help="URLs of the resources, every recorded checksum by default")
+    checksums_parser.set_defaults(func=_refresh_checksums)
+    return parser
+
+
+def main(argv: Optional[List[str]] = None):
+    args = build_parser().parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,20 @@
 from dataclasses import dataclass
-from transformers import PreTrainedModel, PreTrainedTokenizerBase, DataCollator
-from typing import Optional, Callable
-from datasets import DatasetDict
-from evaluate import EvaluationModule
+from typing import Optional, Callable, TYPE_CHECKING
 from .datasets import TaskType
 
+if TYPE_CHECKING:
+    from transformers import PreTrainedModel, PreTrainedTokenizerBase, DataCollator
+    from datasets import DatasetDict
+    from hueval.evaluation.metrics import Metric
+
 
 @dataclass
 class RunParameters:
-    model: Optional[PreTrainedModel] = None
-    tokenizer: Optional[PreTrainedTokenizerBase] = None
-    dataset: Optional[DatasetDict] = None
-    tokenized_dataset: Optional[DatasetDict] = None
-    metric: Optional[EvaluationModule] = None
-    data_collator: Optional[DataCollator] = None
+    model: Optional["PreTrainedModel"] = None
+    tokenizer: Optional["PreTrainedTokenizerBase"] = None
+    dataset: Optional["DatasetDict"] = None
+    tokenized_dataset: Optional["DatasetDict"] = None
+    metric: Optional["Metric"] = None
+    data_collator: Optional["DataCollator"] = None
     compute_metrics: Optional[Callable] = None
     task_type: Optional[TaskType] = None
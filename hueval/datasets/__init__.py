@@ -1,14 +1,14 @@
-from .hulu import Hulu
 from collections import namedtuple
-from evaluate import load
-from typing import List
-from .nerkor import _SUBS as NERKOR_SUBS
-from .nerkor_extended import _SUBS as NERKOR_EXTENDED_SUBS
-from .nerkor import NerKor
-from .nerkor_extended import NerKorExtended
-from .opinhubank import OpinHuBank
+from functools import lru_cache
+from importlib import import_module
+from typing import List, Optional, TYPE_CHECKING
+import os
+from .subsets import NERKOR_SUBS, NERKOR_EXTENDED_SUBS
 from enum import Enum
 
+if TYPE_CHECKING:
+    from datasets import DatasetDict, DatasetBuilder
+
 
 class TaskType(Enum):
     TOKEN_CLASSIFICATION = 0
@@ -19,21 +19,31 @@ class TaskType(Enum):
 
 Dataset = namedtuple("Dataset", ['dataset', 'metric', 'type'])
 
+# maximum number of datasets kept alive by the in-process registry
+_REGISTRY_SIZE = int(os.environ.get("HUEVAL_REGISTRY_SIZE", 32))
 
+# builders import `datasets`, they are imported on first use to keep `import hueval.datasets` fast
+_builders = {
+    "hulu": (".hulu", "Hulu"),
+    "nytk-nerkor": (".nerkor", "NerKor"),
+    "nerkor_1.41e": (".nerkor_extended", "NerKorExtended"),
+    "opinhubank": (".opinhubank", "OpinHuBank"),
+}
 
+# names of the metrics in `hueval.evaluation.metrics` (the metrics of glue and super_glue)
 _metric = {
     "hulu": {
-        "cola": ["glue", "cola"],
-        "sst2": ["glue", "sst2"],
-        "wnli": ["glue", "wnli"],
-        "rc": ["super_glue", "record"],
-        "copa": ["super_glue", "copa"],
-        "ws": ["super_glue", "wsc"],
+        "cola": "matthews_correlation",
+        "sst2": "accuracy",
+        "wnli": "accuracy",
+        "rc": "record",
+        "copa": "accuracy",
+        "ws": "accuracy",
     },
-    "nytk-nerkor": {x: ["seqeval"] for x in NERKOR_SUBS},
-    "nerkor_1.41e": {x: ["seqeval"] for x in NERKOR_EXTENDED_SUBS},
+    "nytk-nerkor": {x: "seqeval" for x in NERKOR_SUBS},
+    "nerkor_1.41e": {x: "seqeval" for x in NERKOR_EXTENDED_SUBS},
     "opinhubank": {
-        "opinhubank": ["accuracy"]
+        "opinhubank": "accuracy"
     },
 }
 
@@ -51,38 +61,86 @@ def available_datasets() -> List[str]:
     return [x for x in _metric.keys()]
 
 
+def __getattr__(name: str):
+    for module, class_name in _builders.values():
+        if class_name == name:
+            return getattr(import_module(module, __name__), class_name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def builder_class(name: str) -> type:
+    """
+    Returns the dataset builder of a given dataset
+    :param name: Name of the Dataset
+    :return:
+    """
+    if name not in _builders:
+        raise NotImplementedError(f"Dataset {name} does not exists")
+    module, class_name = _builders[name]
+    return getattr(import_module(module, __name__), class_name)
+
+
+def prepare_dataset(name: str, config: str, num_proc: Optional[int] = None):
+    """
+    Downloads and prepares a dataset without loading it
+    :param name: Name of the dataset
+    :param config: Name of the dataset configuration
+    :param num_proc: Number of processes used for the preparation
+    :return:
+    """
+    builder = builder_class(name)(config_name=config)
+    builder.download_and_prepare(num_proc=num_proc)
+
+
 def load_dataset(name: str, config: str) -> Dataset:
     """
-    Returns a Dataset with its corresponding metric
+    Returns a Dataset with its corresponding metric. Datasets are kept in an in-process LRU registry, so repeated calls
+    return the same (memory-mapped) objects, metrics are stateful, so every call creates a new one
     :param name: Name of the dataset
     :param config: Name of the dataset configuration
     :return:
     """
+    from hueval.evaluation.metrics import load_metric
+
+    if name not in _builders:
+        raise NotImplementedError(f"Dataset {name} does not exists")
+    return Dataset(dataset=_prepare_dataset(name, config), metric=load_metric(_metric[name][config]),
+                   type=_task_type(name, config))
+
+
+def clear_registry():
+    """
+    Drops every dataset held by the in-process registry
+    :return:
+    """
+    _prepare_dataset.cache_clear()
+
+
+def _task_type(name: str, config: str) -> TaskType:
     if name == "hulu":
-        builder = Hulu(config_name=config)
-        dataset = builder.download_and_prepare()
-        dataset = builder.as_dataset()
-        task_type = TaskType.SEQUENCE_CLASSIFICATION
         if config == "rc":
-            task_type = TaskType.SPAN_CLASSIFICATION
+            return TaskType.SPAN_CLASSIFICATION
         elif config in ["ws", "copa"]:
-            task_type = TaskType.MULTIPLE_CHOICE_QUESTION_ANSWERING
-        return Dataset(dataset=dataset, metric=load(*_metric[name][config]),
-                       type=task_type)
-    elif name == "nytk-nerkor":
-        builder = NerKor(config_name=config)
-        dataset = builder.download_and_prepare()
-        dataset = builder.as_dataset()
-        return Dataset(dataset=dataset, metric=load(*_metric[name][config]), type=TaskType.TOKEN_CLASSIFICATION)
-    elif name == "nerkor_1.41e":
-        builder = NerKorExtended(config_name=config)
-        dataset = builder.download_and_prepare()
-        dataset = builder.as_dataset()
-        return Dataset(dataset=dataset, metric=load(*_metric[name][config]), type=TaskType.TOKEN_CLASSIFICATION)
-    elif name == "opinhubank":
-        builder = OpinHuBank(config_name=config)
-        dataset = builder.download_and_prepare()
-        dataset = builder.as_dataset()
-        return Dataset(dataset=dataset, metric=load(*_metric[name][config]), type=TaskType.SEQUENCE_CLASSIFICATION)
-    raise NotImplementedError(f"Dataset {name} does not exists")
+            return TaskType.MULTIPLE_CHOICE_QUESTION_ANSWERING
+        return TaskType.SEQUENCE_CLASSIFICATION
+    elif name in ["nytk-nerkor", "nerkor_1.41e"]:
+        return TaskType.TOKEN_CLASSIFICATION
+    return TaskType.SEQUENCE_CLASSIFICATION
+
+
+def _is_prepared(builder: "DatasetBuilder") -> bool:
+    from datasets import config as datasets_config
+
+    # `download_and_prepare` writes into a temporary directory and renames it when every split is done,
+    # so an existing dataset info means that the arrow files are complete
+    return os.path.exists(os.path.join(builder.cache_dir, datasets_config.DATASET_INFO_FILENAME))
+
 
+@lru_cache(maxsize=_REGISTRY_SIZE)
+def _prepare_dataset(name: str, config: str) -> "DatasetDict":
+    builder = builder_class(name)(config_name=config)
+    # fast path: memory-map the prepared arrow files without the cache checks and verification of
+    # `download_and_prepare`
+    if not _is_prepared(builder):
+        builder.download_and_prepare()
+    return builder.as_dataset()
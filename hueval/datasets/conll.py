@@ -0,0 +1,97 @@
+import pyarrow as pa
+import pyarrow.compute as pc
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence
+from hueval.utils.archive import open_file
+
+
+_MISSING = "_"
+
+
+def read_conll(lines: Iterable[str],
+               columns: Dict[str, int],
+               label_names: Optional[Dict[str, List[str]]] = None,
+               missing_columns: Sequence[str] = (),
+               batch_size: int = 1000) -> Iterator[pa.Table]:
+    """
+    Streams a tab separated CoNLL file (starting with a header line) and yields a pyarrow table for every `batch_size`
+    sentences. Every column is a list column with one row per sentence, extended by a `sentence_id` column.
+    :param lines: Lines of the file, like an opened text file
+    :param columns: Name of the output column -> index of the field in a row
+    :param label_names: Name of the output column -> label names, these columns are converted to label ids in bulk
+    :param missing_columns: Columns where `_` marks a missing value, it is stored as -1 (or "-1" for string columns)
+    :param batch_size: Maximum number of sentences in a table
+    :return:
+    """
+    if label_names is None:
+        label_names = {}
+
+    lines = iter(lines)
+    next(lines, None)  # header
+
+    rows, offsets, sentence_id = [], [0], 0
+    for row in lines:
+        if row == '\n':
+            offsets.append(len(rows))
+            if len(offsets) > batch_size:
+                yield _to_table(rows, offsets, sentence_id, columns, label_names, missing_columns)
+                sentence_id += len(offsets) - 1
+                rows, offsets = [], [0]
+            continue
+        rows.append(row.rstrip('\n').split('\t'))
+
+    # trailing tokens without a closing empty line are not considered as a sentence
+    del rows[offsets[-1]:]
+    if len(offsets) > 1:
+        yield _to_table(rows, offsets, sentence_id, columns, label_names, missing_columns)
+
+
+def count_sentences(lines: Iterable[str]) -> int:
+    """
+    Counts the sentences `read_conll` yields for the same lines
+    :param lines: Lines of the file, like an opened text file
+    :return:
+    """
+    lines = iter(lines)
+    next(lines, None)  # header
+    return sum(1 for row in lines if row == '\n')
+
+
+def sentence_offsets(paths: Sequence[str]) -> List[int]:
+    """
+    Index of the first sentence of every file, when the files are processed one after another
+    :param paths: Paths of CoNLL files (or members of an archive, see `hueval.utils.archive.member`)
+    :return:
+    """
+    offsets, n = [], 0
+    for path in paths:
+        offsets.append(n)
+        with open_file(path) as f:
+            n += count_sentences(f)
+    return offsets
+
+
+def _to_table(rows: List[List[str]], offsets: List[int], sentence_id: int, columns: Dict[str, int],
+              label_names: Dict[str, List[str]], missing_columns: Sequence[str]) -> pa.Table:
+    fields = list(zip(*rows))
+    offsets = pa.array(offsets, type=pa.int32())
+    arrays = []
+    for name, index in columns.items():
+        values = pa.array(fields[index] if fields else [], type=pa.string())
+        if name in label_names:
+            values = _encode_labels(name, values, label_names[name], name in missing_columns)
+        elif name in missing_columns:
+            values = pc.if_else(pc.equal(values, _MISSING), pa.scalar("-1"), values)
+        arrays.append(pa.ListArray.from_arrays(offsets, values))
+    arrays.append(pa.array(range(sentence_id, sentence_id + len(offsets) - 1), type=pa.int32()))
+    return pa.Table.from_arrays(arrays, names=list(columns.keys()) + ["sentence_id"])
+
+
+def _encode_labels(name: str, values: pa.Array, names: List[str], missing: bool) -> pa.Array:
+    values = pc.utf8_trim_whitespace(values)
+    ids = pc.index_in(values, value_set=pa.array(names, type=pa.string()))
+    unknown = pc.is_null(ids)
+    if missing:
+        unknown = pc.and_(unknown, pc.not_equal(values, _MISSING))
+    if pc.any(unknown).as_py():
+        raise ValueError(f"Unknown label(s) in column {name}: {pc.unique(pc.filter(values, unknown)).to_pylist()}")
+    return pc.fill_null(ids, -1).cast(pa.int64())
@@ -1,9 +1,14 @@
 from datasets import GeneratorBasedBuilder, BuilderConfig, Version, DatasetInfo, Features, Value, \
     Sequence, ClassLabel, DownloadManager, SplitGenerator, Split
-import os
 import json
 import textwrap
-from sklearn.model_selection import train_test_split
+from bisect import bisect_right
+from functools import lru_cache
+from itertools import accumulate
+from typing import List, Tuple
+from hueval.utils.streaming_json import iter_json_array
+from hueval.utils import archive
+from .splits import split_indices, load_split_indices
 
 
 _CITATION = """
@@ -33,6 +38,18 @@ _SOURCES = {
     "ws": "https://github.com/nytud/HuWS/archive/cd12288254f0e5db9976eca6bcf1184c521eef94.zip"
 }
 
+_PASSAGE_SEPARATOR = "\0"
+
+# label encoding of the source files, predictions are submitted in the same encoding
+_SUBMISSION_LABELS = {
+    "cola": ["0", "1"],
+    "copa": ["1", "2"],
+    "wnli": ["0", "1"],
+    "sst2": ["negative", "neutral", "positive"],
+}
+
+_SST_LABELS = ["negative", "neutral", "positive"]
+
 _PATHS = {
     "cola": {"train": "data/cola_train.json", "validation": "data/cola_dev.json", "test": "data/cola_test.json"},
     "copa": {"train": "data/train.json", "validation": "data/val.json", "test": "data/test.json"},
@@ -43,6 +60,51 @@ _PATHS = {
 }
 
 
+def locate_answer(passages: List[str], answer: str) -> Tuple[int, int]:
+    """
+    Finds the first passage which contains the answer with a single scan over the joined passages. The joined text
+    and the offsets of the passages are built once and shared by the queries of the same passages
+    :param passages: Passages of an example
+    :param answer: Answer to look for
+    :return: Index of the passage and the start of the answer in it, or (-1, -1)
+    """
+    joined, starts = _passage_index(tuple(passages))
+    position = joined.find(answer)
+    if position == -1:
+        return -1, -1
+    passage_id = bisect_right(starts, position) - 1
+    return passage_id, position - starts[passage_id]
+
+
+@lru_cache(maxsize=64)
+def _passage_index(passages: Tuple[str, ...]) -> Tuple[str, List[int]]:
+    # passages are separated by a character which can not be part of an answer, so a match never spans two passages
+    return _PASSAGE_SEPARATOR.join(passages), list(accumulate((len(p) + 1 for p in passages[:-1]), initial=0))
+
+
+def submission_label(config: str, example: dict, label: int) -> str:
+    """
+    Converts a predicted label id back to the label encoding of the source files
+    :param config: Name of the dataset configuration
+    :param example: The predicted example
+    :param label: Predicted label id
+    :return:
+    """
+    if config == "ws":
+        # the correct answer of HuWS is given by its text
+        return example[f"choice{label + 1}"]
+    if config not in _SUBMISSION_LABELS:
+        raise NotImplementedError(f"Predictions of {config} can not be submitted")
+    return _SUBMISSION_LABELS[config][label]
+
+
+@lru_cache(maxsize=1)
+def _load_json(path: str):
+    # the splits of HuWS are generated from the same file, it is parsed only once
+    with archive.open_file(path) as f:
+        return json.load(f)
+
+
 def get_repo_url(x):
     if x.startswith("https://huggingface"):
         return "/".join(x.split("/")[:6])
@@ -60,9 +122,10 @@ class HuluConfig(BuilderConfig):
             data_url,
             data_dir,
             url,
+            version="1.0.0",
             **kwargs,
     ):
-        super(HuluConfig, self).__init__(version=Version("1.0.0", ""), **kwargs)
+        super(HuluConfig, self).__init__(version=Version(version, ""), **kwargs)
         self.label_column = label_column
         self.data_url = data_url
         self.data_dir = data_dir
@@ -140,7 +203,9 @@ class Hulu(GeneratorBasedBuilder):
             label_column="label",
             data_url=_SOURCES["sst2"],
             data_dir="hulu/sst2",
-            url=get_repo_url(_SOURCES["sst2"])
+            url=get_repo_url(_SOURCES["sst2"]),
+            # 1.0.1: the unlabeled test split is labeled -1 instead of positive
+            version="1.0.1"
         )
     ]
 
@@ -172,32 +237,35 @@ class Hulu(GeneratorBasedBuilder):
         )
 
     def _split_generators(self, dl_manager: DownloadManager):
-        if self.config.name == "rc":
-            path = dl_manager.download(self.config.data_url)
-        else:
-            path = dl_manager.download_and_extract(self.config.data_url)
+        # the snapshots are not extracted, the data files are read straight from the archives
+        path = dl_manager.download(self.config.data_url)
+        indices_file = None
+        if self.config.name == "ws":
+            # HuWS has no predefined splits, the indices are computed once and shared by the split generators
+            base_path = archive.member(path, archive.root(path))
+            content = _load_json(archive.join(base_path, _PATHS["ws"]["train"]))
+            indices_file = split_indices(len(content), path, self._output_dir)
         return [
             SplitGenerator(
                 name=Split.TRAIN,
-                gen_kwargs={"split_key": "train", "data_file": path},
+                gen_kwargs={"split_key": "train", "data_file": path, "indices_file": indices_file},
             ),
             SplitGenerator(
                 name=Split.VALIDATION,
-                gen_kwargs={"split_key": "validation", "data_file": path},
+                gen_kwargs={"split_key": "validation", "data_file": path, "indices_file": indices_file},
             ),
             SplitGenerator(
                 name=Split.TEST,
-                gen_kwargs={"split_key": "test", "data_file": path},
+                gen_kwargs={"split_key": "test", "data_file": path, "indices_file": indices_file},
             )
         ]
 
-    def _generate_examples(self, data_file, split_key, **kwargs):
+    def _generate_examples(self, data_file, split_key, indices_file=None, **kwargs):
         name = self.config.name
         if name == "rc":
             base_path = data_file[split_key]
         else:
-            zip_name = os.listdir(data_file)[0]
-            base_path = os.path.join(data_file, zip_name)
+            base_path = archive.member(data_file, archive.root(data_file))
         if name == "cola":
             for data in self._cola(base_path, name, split_key):
                 yield data
@@ -214,21 +282,13 @@ class Hulu(GeneratorBasedBuilder):
             for data in self._rc(base_path, name, split_key):
                 yield data
         elif name == "ws":
-            for data in self._ws(base_path, name, split_key):
+            for data in self._ws(base_path, name, split_key, indices_file):
                 yield data
 
     @staticmethod
-    def _ws(base_path, name, split_key):
-        with open(os.path.join(base_path, _PATHS[name][split_key]), mode="r", encoding="utf8") as f:
-            content = json.load(f)
-            train, test = train_test_split(content, train_size=0.8, random_state=0)
-            train, validation = train_test_split(train, train_size=int(len(content) * 0.7), random_state=0)
-            if split_key == "train":
-                content = train
-            elif split_key == "validation":
-                content = validation
-            elif split_key == "test":
-                content = test
+    def _ws(base_path, name, split_key, indices_file):
+        content = _load_json(archive.join(base_path, _PATHS[name][split_key]))
+        content = [content[i] for i in load_split_indices(indices_file, split_key)]
 
         for i, row in enumerate(content):
             label = 0 if row['Answer1'] == row['CorrectAnswer'] else 1
@@ -238,44 +298,33 @@ class Hulu(GeneratorBasedBuilder):
     @staticmethod
     def _rc(base_path, name, split_key):
         with open(base_path, mode="r", encoding="utf8") as f:
-            content = json.load(f)
-
-        for i, row in enumerate(content):
-            label = row['MASK'] if 'MASK' in row else -1
-            lead = row['lead'][0]
-            passage = row['passage']
-            query = row['query']
-            passage_id, start, end = -1, -1, -1
-            if split_key != "test":
-                for j, p in enumerate(passage):
-                    start = p.find(label)
-                    if start != -1:
-                        passage_id = j
-                        end = start + len(label)
-                        break
-                else:
-                    continue
-            yield i, {'idx': int(row['id']), 'lead': lead, 'passage': passage, 'query': query, 'labels': label,
-                      'passage_id': passage_id, "start_positions": start, "end_positions": end}
+            for i, row in enumerate(iter_json_array(f)):
+                label = row['MASK'] if 'MASK' in row else -1
+                lead = row['lead'][0]
+                passage = row['passage']
+                query = row['query']
+                passage_id, start, end = -1, -1, -1
+                if split_key != "test":
+                    passage_id, start = locate_answer(passage, label)
+                    if passage_id == -1:
+                        continue
+                    end = start + len(label)
+                yield i, {'idx': int(row['id']), 'lead': lead, 'passage': passage, 'query': query, 'labels': label,
+                          'passage_id': passage_id, "start_positions": start, "end_positions": end}
 
     @staticmethod
     def _sst(base_path, name, split_key):
-        with open(os.path.join(base_path, _PATHS[name][split_key]), mode="r", encoding="utf8") as f:
+        with archive.open_file(archive.join(base_path, _PATHS[name][split_key]), encoding="utf8") as f:
             content = json.load(f)
 
         for i, row in enumerate(content):
-            label = row['Label'] if 'Label' in row else -1
-            if label == "negative":
-                label = 0
-            elif label == "neutral":
-                label = 1
-            else:
-                label = 2
+            # the test split is unlabeled
+            label = _SST_LABELS.index(row['Label']) if 'Label' in row else -1
             yield i, {'idx': int(row['Sent_id'].split("_")[-1]), 'sentence': row['Sent'], 'labels': label}
 
     @staticmethod
     def _wnli(base_path, name, split_key):
-        with open(os.path.join(base_path, _PATHS[name][split_key]), mode="r", encoding="utf-8-sig") as f:
+        with archive.open_file(archive.join(base_path, _PATHS[name][split_key]), encoding="utf-8-sig") as f:
             content = json.load(f)
             if split_key == "validation" or split_key == "test":
                 content = content["data"]
@@ -287,7 +336,7 @@ class Hulu(GeneratorBasedBuilder):
 
     @staticmethod
     def _copa(base_path, name, split_key):
-        with open(os.path.join(base_path, _PATHS[name][split_key]), mode="r", encoding="utf8") as f:
+        with archive.open_file(archive.join(base_path, _PATHS[name][split_key]), encoding="utf8") as f:
             content = json.load(f)
 
         for i, row in enumerate(content):
@@ -297,7 +346,7 @@ class Hulu(GeneratorBasedBuilder):
 
     @staticmethod
     def _cola(base_path, name, split_key):
-        with open(os.path.join(base_path, _PATHS[name][split_key]), mode="r", encoding="utf8") as f:
+        with archive.open_file(archive.join(base_path, _PATHS[name][split_key]), encoding="utf8") as f:
             content = json.load(f)['data']
 
         for i, row in enumerate(content):
@@ -1,7 +1,11 @@
-from datasets import GeneratorBasedBuilder, BuilderConfig, Version, DatasetInfo, Features, Value, \
+from datasets import ArrowBasedBuilder, BuilderConfig, Version, DatasetInfo, Features, Value, \
     Sequence, ClassLabel, DownloadManager, SplitGenerator, Split
-import os
 import textwrap
+import pyarrow as pa
+import pyarrow.compute as pc
+from .conll import read_conll, sentence_offsets
+from hueval.utils import archive
+from .subsets import NERKOR_SUBS
 
 
 _CITATION = """
@@ -30,7 +34,7 @@ _PATHS = {
     "test": "data/train-devel-test/test/",
 }
 
-_SUBS = ["fiction", "legal", "news", "web", "wikipedia", "all"]
+_SUBS = NERKOR_SUBS
 
 
 _NER = Sequence(
@@ -98,7 +102,7 @@ class NerKorConfig(BuilderConfig):
         self.url = url
 
 
-class NerKor(GeneratorBasedBuilder):
+class NerKor(ArrowBasedBuilder):
     """NerKor datasets."""
     # FORM LEMMA UPOS XPOS FEATS CONLL:NER
     BUILDER_CONFIGS = [
@@ -134,78 +138,65 @@ class NerKor(GeneratorBasedBuilder):
         )
 
     def _split_generators(self, dl_manager: DownloadManager):
-        path = dl_manager.download_and_extract(self.config.data_url)
+        # the data files are read straight from the downloaded snapshot
+        path = dl_manager.download(self.config.data_url)
         return [
             SplitGenerator(
                 name=Split.TRAIN,
-                gen_kwargs={"split_key": "train", "data_file": path},
+                gen_kwargs=self._document_files(path, "train"),
             ),
             SplitGenerator(
                 name=Split.VALIDATION,
-                gen_kwargs={"split_key": "validation", "data_file": path},
+                gen_kwargs=self._document_files(path, "validation"),
             ),
             SplitGenerator(
                 name=Split.TEST,
-                gen_kwargs={"split_key": "test", "data_file": path},
+                gen_kwargs=self._document_files(path, "test"),
             )
         ]
 
-    def _generate_examples(self, data_file, split_key, **kwargs):
-        if self.config.name == "all":
-            base_path = os.path.join(data_file, os.listdir(data_file)[0], _PATHS[split_key])
-            base_path = [os.path.join(base_path, p) for p in os.listdir(base_path)]
-            train_pointers = [os.path.join(b, p) for b in base_path for p in os.listdir(b)]
-        else:
-            base_path = os.path.join(data_file, os.listdir(data_file)[0], _PATHS[split_key], self.config.name)
-            train_pointers = [os.path.join(base_path, x) for x in os.listdir(base_path)]
-        n = 0
-        for annotation in train_pointers:
-            for file in os.listdir(annotation):
-                pointer_file_path = os.path.join(annotation, file)
-                with open(pointer_file_path, mode="r") as f:
-                    data_file_path = f.readlines()[0]
-                for data in self._process_files(os.path.join(annotation, data_file_path), n):
-                    yield data
-                    n += 1
+    def _document_files(self, data_file, split_key):
+        """
+        Resolves the pointer files of a split. Lists in the returned `gen_kwargs` are sharded together by `datasets`
+        when `num_proc` is used, `offsets` holds the index of the first sentence of each file, so `idx` does not
+        depend on the number of shards.
+        """
+        base_path = archive.join(archive.member(data_file, archive.root(data_file)), _PATHS[split_key])
+        domains = archive.listdir(base_path) if self.config.name == "all" else [self.config.name]
+        files = []
+        for domain in domains:
+            for annotation in archive.listdir(archive.join(base_path, domain)):
+                annotation_path = archive.join(base_path, domain, annotation)
+                for pointer in archive.listdir(annotation_path):
+                    with archive.open_file(archive.join(annotation_path, pointer)) as f:
+                        files.append(archive.join(annotation_path, f.readline().strip()))
+        return {"split_key": split_key, "files": files, "offsets": sentence_offsets(files)}
+
+    def _generate_tables(self, split_key, files, offsets, **kwargs):
+        for file, n in zip(files, offsets):
+            for table in self._process_files(file, n):
+                yield n, table
+                n += table.num_rows
 
     @staticmethod
     def _process_files(data_file_path: str, n: int):
-        with open(data_file_path, mode="r", encoding="utf8") as f:
-            content = f.readlines()
-
-        tokens, lemmas, upos, xpos, feats, ner = [], [], [], [], [], []
-
-        sentence_id = 0
-        for i, row in enumerate(content[1:]):
-            if row == '\n':
-                p = data_file_path.split("/")[-3:]
-                yield n, {
-                    "idx": n,
-                    "text": " ".join(tokens),
-                    "tokens": tokens,
-                    "lemmas": lemmas,
-                    "upos": upos,
-                    "xpos": xpos,
-                    "feats": feats,
-                    "ner": ner,
-                    "file_name": "/".join(p),
-                    "sentence_id": sentence_id,
-                    "morph_tagged": p[1] == 'morph'
-                }
-                tokens, lemmas, upos, xpos, feats, ner = [], [], [], [], [], []
-                sentence_id += 1
-                n += 1
-                continue
-
-            data = row.split("\t")
-            _upos = data[2] if data[2] != "_" else -1
-            _xpos = data[3] if data[3] != "_" else -1
-            _feats = data[4] if data[4] != "_" else -1
-            _ner = data[5] if data[5] != "_" else -1
-
-            tokens.append(data[0])
-            lemmas.append(data[1])
-            upos.append(_upos)
-            xpos.append(_xpos)
-            feats.append(_feats)
-            ner.append(_ner)
+        p = data_file_path.split("/")[-3:]
+        with archive.open_file(data_file_path) as f:
+            tables = read_conll(
+                f,
+                columns={"tokens": 0, "lemmas": 1, "upos": 2, "xpos": 3, "feats": 4, "ner": 5},
+                label_names={"upos": _UPOS.feature.names, "ner": _NER.feature.names},
+                missing_columns=["upos", "xpos", "feats", "ner"]
+            )
+            for table in tables:
+                num_rows = table.num_rows
+                yield table.append_column(
+                    "idx", pa.array(range(n, n + num_rows), type=pa.int32())
+                ).append_column(
+                    "text", pc.binary_join(table["tokens"], " ")
+                ).append_column(
+                    "file_name", pa.array(["/".join(p)] * num_rows, type=pa.string())
+                ).append_column(
+                    "morph_tagged", pa.array([p[1] == 'morph'] * num_rows, type=pa.bool_())
+                )
+                n += num_rows
@@ -1,8 +1,12 @@
-from datasets import GeneratorBasedBuilder, BuilderConfig, Version, DatasetInfo, Features, Value, \
+from datasets import ArrowBasedBuilder, BuilderConfig, Version, DatasetInfo, Features, Value, \
     Sequence, ClassLabel, DownloadManager, SplitGenerator, Split
-import os
 import textwrap
+import pyarrow as pa
+import pyarrow.compute as pc
 from .nerkor import NerKorConfig, get_repo_url
+from .conll import read_conll, sentence_offsets
+from hueval.utils import archive
+from .subsets import NERKOR_EXTENDED_SUBS
 
 
 _CITATION = """
@@ -15,7 +19,7 @@ _CITATION = """
 }
 """
 _SOURCE = "https://github.com/novakat/NYTK-NerKor-Cars-OntoNotesPP/archive/eb94fc3c22ed27589593716e150d73e060e2333d.zip"
-_SUBS = ["fiction", "legal", "news", "web", "wikipedia", "cars", "all"]
+_SUBS = NERKOR_EXTENDED_SUBS
 
 
 # Missing tags from readme
@@ -27,7 +31,7 @@ _ONPP_NER = ClassLabel(
 )
 
 
-class NerKorExtended(GeneratorBasedBuilder):
+class NerKorExtended(ArrowBasedBuilder):
     """NerKor 1.41e datasets."""
     # FORM ONPP:NER
     BUILDER_CONFIGS = [
@@ -59,58 +63,51 @@ class NerKorExtended(GeneratorBasedBuilder):
         )
 
     def _split_generators(self, dl_manager: DownloadManager):
-        path = dl_manager.download_and_extract(self.config.data_url)
+        # the data files are read straight from the downloaded snapshot
+        path = dl_manager.download(self.config.data_url)
         return [
             SplitGenerator(
                 name=Split.TRAIN,
-                gen_kwargs={"split_key": "train", "data_file": path},
+                gen_kwargs=self._document_files(path, "train"),
             ),
             SplitGenerator(
                 name=Split.VALIDATION,
-                gen_kwargs={"split_key": "validation", "data_file": path},
+                gen_kwargs=self._document_files(path, "validation"),
             ),
             SplitGenerator(
                 name=Split.TEST,
-                gen_kwargs={"split_key": "test", "data_file": path},
+                gen_kwargs=self._document_files(path, "test"),
             )
         ]
 
-    def _generate_examples(self, data_file, split_key, **kwargs):
-        base_path = os.path.join(data_file, os.listdir(data_file)[0], "data")
-        n = 0
+    def _document_files(self, data_file, split_key):
+        base_path = archive.join(archive.member(data_file, archive.root(data_file)), "data")
         split = split_key if split_key != "validation" else "devel"
-        files = [x for x in os.listdir(base_path) if split in x and (self.config.name in x or self.config.name == "all")]
-        for file in files:
-            for data in self._process_files(os.path.join(base_path, file), n):
-                yield data
-                n += 1
+        files = [
+            archive.join(base_path, x) for x in archive.listdir(base_path)
+            if split in x and (self.config.name in x or self.config.name == "all")
+        ]
+        return {"split_key": split_key, "files": files, "offsets": sentence_offsets(files)}
+
+    def _generate_tables(self, split_key, files, offsets, **kwargs):
+        for file, n in zip(files, offsets):
+            for table in self._process_files(file, n):
+                yield n, table
+                n += table.num_rows
 
     @staticmethod
     def _process_files(data_file_path: str, n: int):
-        with open(data_file_path, mode="r", encoding="utf8") as f:
-            content = f.readlines()
-
-        tokens, ner = [], []
-
-        sentence_id = 0
-        for i, row in enumerate(content[1:]):
-            if row == '\n':
-                p = data_file_path.split("/")[-1]
-                yield n, {
-                    "idx": n,
-                    "text": " ".join(tokens),
-                    "tokens": tokens,
-                    "ner": ner,
-                    "file_name": p,
-                    "sentence_id": sentence_id,
-                    "morph_tagged": not ('no-morph' in p)
-                }
-                tokens, ner = [], []
-                sentence_id += 1
-                n += 1
-                continue
-
-            data = row.split("\t")
-
-            tokens.append(data[0])
-            ner.append(data[1].rstrip('\n'))
+        p = data_file_path.split("/")[-1]
+        with archive.open_file(data_file_path) as f:
+            for table in read_conll(f, columns={"tokens": 0, "ner": 1}, label_names={"ner": _ONPP_NER.names}):
+                num_rows = table.num_rows
+                yield table.append_column(
+                    "idx", pa.array(range(n, n + num_rows), type=pa.int32())
+                ).append_column(
+                    "text", pc.binary_join(table["tokens"], " ")
+                ).append_column(
+                    "file_name", pa.array([p] * num_rows, type=pa.string())
+                ).append_column(
+                    "morph_tagged", pa.array([not ('no-morph' in p)] * num_rows, type=pa.bool_())
+                )
+                n += num_rows
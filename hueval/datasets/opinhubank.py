@@ -1,11 +1,13 @@
-from datasets import GeneratorBasedBuilder, BuilderConfig, Version, DatasetInfo, Features, Value, \
+from datasets import ArrowBasedBuilder, BuilderConfig, Version, DatasetInfo, Features, Value, \
     Sequence, ClassLabel, DownloadManager, SplitGenerator, Split
-import os
 import textwrap
 from hueval.utils.network import download_url
-import csv
+from hueval.utils import archive
 import numpy as np
-from sklearn.model_selection import train_test_split
+import pandas as pd
+import pyarrow as pa
+from functools import lru_cache
+from .splits import split_indices, load_split_indices
 
 
 _CITATION = """
@@ -13,6 +15,7 @@ Miháltz, Márton (2013). “OpinHuBank: szabadon hozzáférhető annotált korp
 Tanács Attila, Vincze Veronika (szerk.): IX. Magyar Számítógépes Nyelvészeti Konferencia (MSZNY 2013), SZTE, Szeged, 2013, pp. 343-345.
 """
 
+_FILE_NAME = "OpinHuBank_20130106.csv"
 _SOURCE = "https://metashare.nytud.hu/repository/download/608756be64e211e2aa7c68b599c26a068dd5b3551f024f6281131670412d37d3/"
 
 
@@ -38,7 +41,7 @@ class OpinHuBankConfig(BuilderConfig):
         self.url = url
 
 
-class OpinHuBank(GeneratorBasedBuilder):
+class OpinHuBank(ArrowBasedBuilder):
     """Hulu datasets."""
 
     BUILDER_CONFIGS = [
@@ -70,20 +73,22 @@ class OpinHuBank(GeneratorBasedBuilder):
         )
 
     def _split_generators(self, dl_manager: DownloadManager):
+        # the csv file is read straight from the downloaded archive
         path = dl_manager.download_custom(self.config.data_url, self._custom_download)
-        path = dl_manager.extract(path)
+        indices_file = split_indices(_read_table(archive.member(path, _FILE_NAME)).num_rows, path,
+                                     self._output_dir)
         return [
             SplitGenerator(
                 name=Split.TRAIN,
-                gen_kwargs={"split_key": "train", "data_file": path},
+                gen_kwargs={"split_key": "train", "data_file": path, "indices_file": indices_file},
             ),
             SplitGenerator(
                 name=Split.VALIDATION,
-                gen_kwargs={"split_key": "validation", "data_file": path},
+                gen_kwargs={"split_key": "validation", "data_file": path, "indices_file": indices_file},
             ),
             SplitGenerator(
                 name=Split.TEST,
-                gen_kwargs={"split_key": "test", "data_file": path},
+                gen_kwargs={"split_key": "test", "data_file": path, "indices_file": indices_file},
             )
         ]
 
@@ -95,39 +100,41 @@ class OpinHuBank(GeneratorBasedBuilder):
             "licence": "CC-BY"
         })
 
-    def _generate_examples(self, data_file, split_key, **kwargs):
-        path = os.path.join(data_file, "OpinHuBank_20130106.csv")
-        data = []
-        with open(path, mode="r", encoding="iso-8859-2") as f:
-            content = csv.reader(f)
-            skip = True
-            for i, line in enumerate(content):
-                if skip:
-                    skip = False
-                    continue
-                labels = [int(line[x])+1 for x in range(6, 11)]
-                uniq = np.unique(labels, return_counts=True)
-                majority_label_index = np.argmax(uniq[1])
-                majority_label = uniq[0][majority_label_index]
-                if uniq[1][majority_label_index] == 2:
-                    majority_label = 1
-                data.append({
-                    "idx": i,
-                    "start": line[1],
-                    "len": line[2],
-                    "entity": line[3],
-                    "sentence": line[4],
-                    "url": line[5],
-                    "annotators": labels,
-                    "labels": majority_label
-                })
-        train, test = train_test_split(data, train_size=0.8, random_state=0)
-        train, validation = train_test_split(train, train_size=int(len(data)*0.7), random_state=0)
-        if split_key == "train":
-            data = train
-        elif split_key == "validation":
-            data = validation
-        elif split_key == "test":
-            data = test
-        for n, d in enumerate(data):
-            yield n, d
+    def _generate_tables(self, data_file, split_key, indices_file, **kwargs):
+        table = _read_table(archive.member(data_file, _FILE_NAME))
+        yield 0, table.take(load_split_indices(indices_file, split_key))
+
+
+@lru_cache(maxsize=1)
+def _read_table(path: str) -> pa.Table:
+    # the three splits are taken from the same file, it is parsed only once
+    with archive.open_file(path, mode="rb") as f:
+        content = pd.read_csv(f, encoding="iso-8859-2", dtype=str, keep_default_na=False)
+    annotators = content.iloc[:, 6:11].to_numpy(dtype=np.int64) + 1
+    return pa.table({
+        # rows are numbered from 1, 0 was the header of the csv file
+        "idx": pa.array(np.arange(1, len(content) + 1), type=pa.int32()),
+        "start": pa.array(content.iloc[:, 1].astype(np.int32)),
+        "len": pa.array(content.iloc[:, 2].astype(np.int32)),
+        "entity": pa.array(content.iloc[:, 3], type=pa.string()),
+        "sentence": pa.array(content.iloc[:, 4], type=pa.string()),
+        "url": pa.array(content.iloc[:, 5], type=pa.string()),
+        "annotators": pa.ListArray.from_arrays(
+            pa.array(np.arange(0, annotators.size + 1, annotators.shape[1]), type=pa.int32()),
+            pa.array(annotators.ravel())
+        ),
+        "labels": pa.array(majority_vote(annotators)),
+    })
+
+
+def majority_vote(annotators: np.ndarray) -> np.ndarray:
+    """
+    Majority label of every row, a tie between two pairs of annotators (2-2-1) results in the neutral label (1)
+    :param annotators: Label ids of shape (N, number of annotators)
+    :return: Label ids of shape (N, )
+    """
+    values = np.arange(annotators.min(initial=0), annotators.max(initial=0) + 1)
+    counts = (annotators[:, :, None] == values).sum(axis=1)
+    majority = values[counts.argmax(axis=1)]
+    majority[counts.max(axis=1) == 2] = 1
+    return majority
@@ -0,0 +1,59 @@
+import hashlib
+import json
+import os
+import shutil
+from typing import Dict, List, Optional
+import numpy as np
+from hueval.utils.cache import get_cache_dir
+
+
+SPLIT_INDICES_FILENAME = "split_indices.json"
+
+
+def split_indices(n_samples: int, source_file: str, output_dir: Optional[str] = None) -> str:
+    """
+    Deterministic train (70%), validation (10%) and test (20%) indices for datasets without predefined splits. They are
+    computed once per source file and stored in the hueval cache (`<hueval cache>/splits/`, keyed by the checksum of
+    the source file), so every preparation of the same data reuses them and every split generator reads the same file
+    :param n_samples: Number of examples in the dataset
+    :param source_file: Downloaded file of the dataset
+    :param output_dir: Directory of the prepared dataset (usually the temporary directory of the preparation), a copy
+    of the indices is stored in it
+    :return: Path to the json file mapping the split names to the indices
+    """
+    path = os.path.join(get_cache_dir("splits"), f"{_checksum(source_file)}_{n_samples}.json")
+    if not os.path.exists(path):
+        from sklearn.model_selection import train_test_split
+
+        indices = np.arange(n_samples)
+        train, test = train_test_split(indices, train_size=0.8, random_state=0)
+        train, validation = train_test_split(train, train_size=int(n_samples * 0.7), random_state=0)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, mode="w") as f:
+            json.dump({"train": train.tolist(), "validation": validation.tolist(), "test": test.tolist()}, f)
+        os.replace(tmp_path, path)
+
+    if output_dir is not None:
+        os.makedirs(output_dir, exist_ok=True)
+        shutil.copyfile(path, os.path.join(output_dir, SPLIT_INDICES_FILENAME))
+    return path
+
+
+def _checksum(path: str) -> str:
+    hasher = hashlib.sha256()
+    with open(path, mode="rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()[:32]
+
+
+def load_split_indices(path: str, split_key: str) -> List[int]:
+    """
+    Reads the indices of a split written by `split_indices`
+    :param path: Path to the json file
+    :param split_key: train, validation or test
+    :return:
+    """
+    with open(path, mode="r") as f:
+        indices: Dict[str, List[int]] = json.load(f)
+    return indices[split_key]
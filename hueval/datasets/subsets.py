@@ -0,0 +1,2 @@
+NERKOR_SUBS = ["fiction", "legal", "news", "web", "wikipedia", "all"]
+NERKOR_EXTENDED_SUBS = ["fiction", "legal", "news", "web", "wikipedia", "cars", "all"]
@@ -0,0 +1,325 @@
+import re
+import string
+from collections import Counter
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+
+class Metric:
+    """
+    Metric computed from sufficient statistics, which are accumulated batch by batch with `add_batch`, so predictions
+    are not kept in memory. The interface follows `evaluate.EvaluationModule`: `compute` returns the result and resets
+    the state.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        raise NotImplementedError
+
+    def add_batch(self, predictions, references):
+        raise NotImplementedError
+
+    def _compute(self) -> Dict:
+        raise NotImplementedError
+
+    def compute(self, predictions=None, references=None) -> Dict:
+        """
+        Computes the metric from the accumulated batches (and the provided predictions), then resets the state
+        :param predictions: Predictions of a last batch
+        :param references: References of a last batch
+        :return:
+        """
+        if predictions is not None:
+            self.add_batch(predictions, references)
+        result = self._compute()
+        self.reset()
+        return result
+
+
+class Accuracy(Metric):
+    """
+    Accuracy of label ids, like the `accuracy` metric and the accuracy of `glue` and `super_glue`
+    """
+
+    def reset(self):
+        self.correct, self.total = 0, 0
+
+    def add_batch(self, predictions, references):
+        predictions, references = np.asarray(predictions).ravel(), np.asarray(references).ravel()
+        self.correct += int(np.count_nonzero(predictions == references))
+        self.total += references.size
+
+    def _compute(self) -> Dict:
+        return {"accuracy": self.correct / self.total}
+
+
+class MatthewsCorrelation(Metric):
+    """
+    Matthews correlation coefficient of label ids from a confusion matrix, like `glue/cola` (`sklearn`'s
+    `matthews_corrcoef`)
+    """
+
+    def reset(self):
+        self.confusion = np.zeros((0, 0), dtype=np.int64)
+
+    def add_batch(self, predictions, references):
+        predictions, references = np.asarray(predictions).ravel(), np.asarray(references).ravel()
+        if references.size == 0:
+            return
+        n = max(int(predictions.max()), int(references.max()), self.confusion.shape[0] - 1) + 1
+        confusion = np.bincount(references * n + predictions, minlength=n * n).reshape(n, n)
+        confusion[:self.confusion.shape[0], :self.confusion.shape[1]] += self.confusion
+        self.confusion = confusion
+
+    def _compute(self) -> Dict:
+        t_sum = self.confusion.sum(axis=1, dtype=np.float64)
+        p_sum = self.confusion.sum(axis=0, dtype=np.float64)
+        n_correct = np.trace(self.confusion, dtype=np.float64)
+        n_samples = p_sum.sum()
+        cov_ytyp = n_correct * n_samples - np.dot(t_sum, p_sum)
+        cov_ypyp = n_samples ** 2 - np.dot(p_sum, p_sum)
+        cov_ytyt = n_samples ** 2 - np.dot(t_sum, t_sum)
+        if cov_ypyp * cov_ytyt == 0:
+            return {"matthews_correlation": 0.0}
+        return {"matthews_correlation": float(cov_ytyp / np.sqrt(cov_ytyt * cov_ypyp))}
+
+
+class F1(Metric):
+    """
+    Binary F1 score of label ids, like the `f1` metric (`sklearn`'s `f1_score`)
+    """
+
+    def __init__(self, pos_label: int = 1):
+        self.pos_label = pos_label
+        super(F1, self).__init__()
+
+    def reset(self):
+        self.tp, self.pred, self.true = 0, 0, 0
+
+    def add_batch(self, predictions, references):
+        predictions = np.asarray(predictions).ravel() == self.pos_label
+        references = np.asarray(references).ravel() == self.pos_label
+        self.tp += int(np.count_nonzero(predictions & references))
+        self.pred += int(np.count_nonzero(predictions))
+        self.true += int(np.count_nonzero(references))
+
+    def _compute(self) -> Dict:
+        precision, recall, f1 = _prf(np.array([self.tp]), np.array([self.pred]), np.array([self.true]))
+        return {"f1": float(f1[0])}
+
+
+class ReCoRD(Metric):
+    """
+    Exact match and token F1 of the best matching answer, like `super_glue/record`. Predictions and references are
+    either in the format of `evaluate` (`{"idx": ..., "prediction_text": ...}` and `{"idx": ..., "answers": [...]}`)
+    or plain prediction strings and lists of answers.
+    """
+
+    def reset(self):
+        self.exact_match, self.f1, self.total = 0.0, 0.0, 0
+
+    def add_batch(self, predictions, references):
+        if predictions and isinstance(predictions[0], dict):
+            predictions = {p["idx"]["query"]: p["prediction_text"] for p in predictions}
+            references = [(r["idx"]["query"], r["answers"]) for r in references]
+        else:
+            predictions = dict(enumerate(predictions))
+            references = list(enumerate(references))
+        for key, answers in references:
+            self.total += 1
+            if key not in predictions:
+                continue
+            prediction = predictions[key]
+            self.exact_match += max(float(_normalize_answer(prediction) == _normalize_answer(a)) for a in answers)
+            self.f1 += max(_token_f1(prediction, a) for a in answers)
+
+    def _compute(self) -> Dict:
+        return {"exact_match": self.exact_match / self.total, "f1": self.f1 / self.total}
+
+
+class SeqEval(Metric):
+    """
+    Entity level precision, recall and F1 of BIO (IOBES) tagged sequences, identical to the default mode of `seqeval`
+    (and the `seqeval` metric of `evaluate`), but entities are extracted with array operations on label ids.
+    Sequences are 2D arrays of label ids, where the positions with `ignore_index` in the references are skipped (like
+    the outputs of a token classification model) or lists of label ids or label strings.
+    """
+
+    def __init__(self, label_names: Optional[Sequence[str]] = None, ignore_index: int = -100):
+        """
+        :param label_names: Names of the label ids, if it is not provided, sequences are label strings
+        :param ignore_index: Reference label of the skipped positions
+        """
+        self.label_names = None if label_names is None else list(label_names)
+        self.ignore_index = ignore_index
+        self._label_ids = {} if label_names is None else {name: i for i, name in enumerate(label_names)}
+        super(SeqEval, self).__init__()
+
+    def reset(self):
+        self.tp, self.pred, self.true = Counter(), Counter(), Counter()
+        self.correct, self.total = 0, 0
+
+    def add_batch(self, predictions, references):
+        predictions, references = self._flatten(predictions, references)
+        self.correct += int(np.count_nonzero((predictions == references) & (references >= 0)))
+        self.total += int(np.count_nonzero(references >= 0))
+
+        tags, types, type_names = self._label_table()
+        true = _entities(references, tags, types)
+        pred = _entities(predictions, tags, types)
+        common = np.intersect1d(true, pred, assume_unique=True)
+        n = references.size + 1
+        for counter, entities in ((self.tp, common), (self.pred, pred), (self.true, true)):
+            for type_id, count in zip(*np.unique(entities // (n * n), return_counts=True)):
+                counter[type_names[type_id]] += int(count)
+
+    def _compute(self) -> Dict:
+        type_names = sorted(set(self.true) | set(self.pred))
+        tp = np.array([self.tp[t] for t in type_names], dtype=np.int64)
+        pred = np.array([self.pred[t] for t in type_names], dtype=np.int64)
+        true = np.array([self.true[t] for t in type_names], dtype=np.int64)
+        precision, recall, f1 = _prf(tp, pred, true)
+        scores = {
+            type_name: {"precision": float(p), "recall": float(r), "f1": float(f), "number": int(s)}
+            for type_name, p, r, f, s in zip(type_names, precision, recall, f1, true)
+        }
+        precision, recall, f1 = _prf(np.array([tp.sum()]), np.array([pred.sum()]), np.array([true.sum()]))
+        scores["overall_precision"] = float(precision[0])
+        scores["overall_recall"] = float(recall[0])
+        scores["overall_f1"] = float(f1[0])
+        # 0 without labeled tokens, like the undefined precision and recall
+        scores["overall_accuracy"] = self.correct / self.total if self.total else 0.0
+        return scores
+
+    def _flatten(self, predictions, references):
+        """
+        Concatenates the sequences into 1D id arrays, every sequence is followed by a separator (-1, handled as `O`)
+        """
+        if isinstance(references, np.ndarray) and references.ndim == 2:
+            predictions = np.asarray(predictions)
+            mask = references != self.ignore_index
+            lengths = mask.sum(axis=1)
+            references, predictions = references[mask], predictions[mask]
+        else:
+            lengths = np.array([len(x) for x in references], dtype=np.int64)
+            references = self._ids([x for sequence in references for x in sequence])
+            predictions = self._ids([x for sequence in predictions for x in sequence])
+        positions = np.arange(references.size) + np.repeat(np.arange(lengths.size), lengths)
+        # like seqeval, an `O` closes the last sequence
+        flat_references = np.full(references.size + lengths.size + 1, -1, dtype=np.int64)
+        flat_predictions = flat_references.copy()
+        flat_references[positions] = references
+        flat_predictions[positions] = predictions
+        return flat_predictions, flat_references
+
+    def _ids(self, labels: List) -> np.ndarray:
+        if labels and isinstance(labels[0], str):
+            for label in labels:
+                if label not in self._label_ids:
+                    self._label_ids[label] = len(self._label_ids)
+            return np.fromiter((self._label_ids[label] for label in labels), dtype=np.int64, count=len(labels))
+        return np.asarray(labels, dtype=np.int64)
+
+    def _label_table(self):
+        """
+        Tag (first character) and type of every label id like `seqeval.metrics.sequence_labeling.get_entities`, the
+        last row belongs to the separator
+        """
+        names = self.label_names if self.label_names is not None else list(self._label_ids)
+        # type 0 is the empty type of the position before the first label
+        type_names = ["", "_"]
+        tags, types = [], []
+        for name in names + ["O"]:
+            type_name = name[1:].split("-", maxsplit=1)[-1] or "_"
+            if type_name not in type_names:
+                type_names.append(type_name)
+            tags.append(ord(name[0]))
+            types.append(type_names.index(type_name))
+        return np.array(tags, dtype=np.int64), np.array(types, dtype=np.int64), type_names
+
+
+_B, _I, _E, _S, _O, _DOT = (ord(x) for x in "BIESO.")
+
+
+def _entities(sequence: np.ndarray, tags: np.ndarray, types: np.ndarray) -> np.ndarray:
+    """
+    Entities of a flattened sequence of label ids (the separator is -1) following the chunk rules of seqeval
+    (`end_of_chunk` and `start_of_chunk`), encoded as `(type * n + begin) * n + end` where n = len(sequence) + 1
+    """
+    tag, type_ = tags[sequence], types[sequence]
+    prev_tag = np.concatenate([[_O], tag[:-1]])
+    prev_type = np.concatenate([[0], type_[:-1]])
+
+    end_of_chunk = (
+        (prev_tag == _E) | (prev_tag == _S)
+        | (((prev_tag == _B) | (prev_tag == _I)) & ((tag == _B) | (tag == _S) | (tag == _O)))
+        | ((prev_tag != _O) & (prev_tag != _DOT) & (prev_type != type_))
+    )
+    start_of_chunk = (
+        (tag == _B) | (tag == _S)
+        | (((prev_tag == _E) | (prev_tag == _S) | (prev_tag == _O)) & ((tag == _E) | (tag == _I)))
+        | ((tag != _O) & (tag != _DOT) & (prev_type != type_))
+    )
+
+    positions = np.arange(sequence.size)
+    # the chunk closed at position i started at the last start before i
+    last_start = np.maximum.accumulate(np.where(start_of_chunk, positions, 0))
+    ends = positions[end_of_chunk]
+    begins = np.concatenate([[0], last_start])[ends]
+    n = sequence.size + 1
+    return (prev_type[ends] * n + begins) * n + (ends - 1)
+
+
+def _prf(tp: np.ndarray, pred: np.ndarray, true: np.ndarray):
+    # like sklearn and seqeval (zero_division="warn"), 0 is returned for an undefined precision or recall
+    precision = np.divide(tp, pred, out=np.zeros(tp.shape, dtype=np.float64), where=pred != 0)
+    recall = np.divide(tp, true, out=np.zeros(tp.shape, dtype=np.float64), where=true != 0)
+    denominator = precision + recall
+    denominator[denominator == 0.0] = 1
+    f1 = 2 * precision * recall / denominator
+    return precision, recall, f1
+
+
+_PUNCTUATION = set(string.punctuation)
+
+
+def _normalize_answer(s: str) -> str:
+    s = "".join(ch for ch in s.lower() if ch not in _PUNCTUATION)
+    s = re.sub(r"\b(a|an|the)\b", " ", s)
+    return " ".join(s.split())
+
+
+def _token_f1(prediction: str, ground_truth: str) -> float:
+    prediction_tokens = _normalize_answer(prediction).split()
+    ground_truth_tokens = _normalize_answer(ground_truth).split()
+    common = Counter(prediction_tokens) & Counter(ground_truth_tokens)
+    num_same = sum(common.values())
+    if num_same == 0:
+        return 0
+    precision = 1.0 * num_same / len(prediction_tokens)
+    recall = 1.0 * num_same / len(ground_truth_tokens)
+    return (2 * precision * recall) / (precision + recall)
+
+
+_METRICS = {
+    "accuracy": Accuracy,
+    "matthews_correlation": MatthewsCorrelation,
+    "f1": F1,
+    "record": ReCoRD,
+    "seqeval": SeqEval,
+}
+
+
+def load_metric(name: str, **kwargs) -> Metric:
+    """
+    Creates a metric by name (accuracy, matthews_correlation, f1, record, seqeval)
+    :param name: Name of the metric
+    :param kwargs: Arguments of the metric
+    :return:
+    """
+    if name not in _METRICS:
+        raise NotImplementedError(f"Metric {name} does not exists")
+    return _METRICS[name](**kwargs)
@@ -7,6 +7,33 @@ from torch.nn import CrossEntropyLoss, MSELoss
 from transformers.models.bert.modeling_bert import BertPreTrainedModel, BertModel
 
 
+def span_max_pool(sequence_output: torch.Tensor, spans: torch.Tensor) -> torch.Tensor:
+    """
+    Max pools the hidden states within every span in one gather, only a window of the longest span is materialized
+    instead of a mask over the whole sequence for every span.
+    :param sequence_output: Hidden states of shape (batch_size, sequence_length, hidden_size)
+    :param spans: Start and end (inclusive) positions of shape (batch_size, num_spans, 2), padded spans have a negative
+    start (or an end before the start)
+    :return: Span representations of shape (batch_size, num_spans, hidden_size), padded spans are zeros
+    """
+    batch_size, sequence_length, hidden_size = sequence_output.shape
+    num_spans = spans.size(1)
+    starts, ends = spans[..., 0], spans[..., 1]
+    valid_spans = (starts >= 0) & (ends >= starts)
+    widths = torch.where(valid_spans, ends - starts + 1, torch.zeros_like(starts))
+    window = max(int(widths.max()) if widths.numel() else 0, 1)
+
+    offsets = torch.arange(window, device=spans.device)
+    index = (starts.clamp(min=0).unsqueeze(-1) + offsets).clamp(max=sequence_length - 1)  # (B, S, W)
+    windows = torch.gather(
+        sequence_output, 1, index.view(batch_size, num_spans * window, 1).expand(-1, -1, hidden_size)
+    ).view(batch_size, num_spans, window, hidden_size)
+    in_span = offsets < widths.unsqueeze(-1)  # (B, S, W)
+    windows = windows.masked_fill(~in_span.unsqueeze(-1), float("-inf"))
+    span_reps = windows.amax(dim=2)
+    return span_reps.masked_fill(~valid_spans.unsqueeze(-1), 0.0)
+
+
 class BertForSpanClassification(BertPreTrainedModel):
     def __init__(self, config):
         super(BertForSpanClassification, self).__init__(config)
@@ -34,9 +61,9 @@ class BertForSpanClassification(BertPreTrainedModel):
     ):
         r"""
         spans (:obj:`torch.LongTensor` of shape :obj:`(batch_size, num_spans, 2)`):
-            Labels for position (index) of the start and end of the labelled span.
-            We assume a fixed number of spans per input and max pool over the span
-            to get a span representation.
+            Labels for position (index) of the start and end (inclusive) of the labelled span.
+            We max pool over the span to get a span representation. Inputs may have fewer than
+            ``config.num_spans`` spans, missing spans are padded by ``-1`` and represented by zeros.
         labels (:obj:`torch.LongTensor` of shape :obj:`(batch_size,)`, `optional`, defaults to :obj:`None`):
             Labels for computing the sequence classification/regression loss.
             Indices should be in :obj:`[0, ..., config.num_labels - 1]`.
@@ -87,21 +114,13 @@ class BertForSpanClassification(BertPreTrainedModel):
         sequence_output = outputs[0]
 
         # extract representations correponding to the spans
-        span_reps = []
-        for batch_spans in spans.transpose(0, 1):
-            # spans: n_spans x bz x 2 (start, end)
-
-            span_mask = torch.zeros_like(sequence_output)
-            for batch_idx, (start, end) in enumerate(batch_spans):
-                span_mask[batch_idx, start : end + 1] = 1
-
-            # pool within spans
-            masked_output = sequence_output * span_mask
-            span_rep, _ = masked_output.max(dim=1)
-            span_reps.append(span_rep)
-
+        span_reps = span_max_pool(sequence_output, spans)
+        if span_reps.size(1) > self.num_spans:
+            raise ValueError(f"Got {span_reps.size(1)} spans, but the model expects at most {self.num_spans}")
+        # inputs with fewer spans are padded by zero representations
+        span_reps = nn.functional.pad(span_reps, (0, 0, 0, self.num_spans - span_reps.size(1)))
         # combine multiple spans
-        span_reps = torch.cat(span_reps, dim=1)
+        span_reps = span_reps.flatten(1)
         # feed to ff classifier
         span_reps = self.dropout(span_reps)
         logits = self.classifier(span_reps)
@@ -0,0 +1,206 @@
+import copy
+import hashlib
+import json
+import os
+import struct
+import threading
+from typing import Dict, Tuple
+
+import torch
+from transformers import AutoConfig, AutoModel, BertConfig, PretrainedConfig, PreTrainedModel
+from hueval.models.initialization import skip_init, initialize_missing
+from hueval.utils.cache import get_cache_dir
+
+
+# architectures of checkpoints which have no task specific head
+_PRETRAINING_HEADS = ("Model", "ForPreTraining", "ForMaskedLM", "ForCausalLM", "LMHeadModel")
+_DTYPES = {
+    "F64": torch.float64, "F32": torch.float32, "F16": torch.float16, "BF16": torch.bfloat16, "I64": torch.int64,
+    "I32": torch.int32, "I16": torch.int16, "I8": torch.int8, "U8": torch.uint8, "BOOL": torch.bool,
+}
+
+
+class MappedCheckpoint:
+    """
+    Index of the base model weights of a safetensors file. Every `state_dict` call memory-maps the file copy-on-write,
+    so the models built from it share the pages of the file (the page cache) until they modify their weights, and the
+    weights are never held twice by the process.
+    """
+
+    def __init__(self, path: str, prefix: str = ""):
+        """
+        :param path: Path of the safetensors file
+        :param prefix: Prefix of the keys of the base model (like `bert.`), other tensors are ignored
+        """
+        with open(path, mode="rb") as f:
+            header_size = struct.unpack("<Q", f.read(8))[0]
+            header = json.loads(f.read(header_size))
+        header.pop("__metadata__", None)
+        self.path = path
+        self.size = os.path.getsize(path)
+        self._data_offset = 8 + header_size
+        self._tensors = {key[len(prefix):]: (_DTYPES[entry["dtype"]], entry["shape"], entry["data_offsets"])
+                         for key, entry in header.items() if key.startswith(prefix)}
+
+    def state_dict(self) -> Dict[str, torch.Tensor]:
+        """
+        Tensors of a new copy-on-write mapping of the file, writing them does not change the file or other mappings
+        :return:
+        """
+        storage = torch.UntypedStorage.from_file(self.path, False, self.size)
+        state_dict = {}
+        for key, (dtype, shape, (start, end)) in self._tensors.items():
+            offset = self._data_offset + start
+            tensor = torch.empty(0, dtype=torch.uint8).set_(storage, offset, (end - start,))
+            if offset % torch.empty(0, dtype=dtype).element_size():
+                # tensors which are not aligned to their element size can not be viewed in place
+                tensor = tensor.clone()
+            state_dict[key] = tensor.view(dtype).view(shape)
+        return state_dict
+
+
+class BackboneCache:
+    """
+    In-process cache of backbones (the config and the mapped safetensors checkpoint of the base model) keyed by model
+    name. Task specific models of the same backbone are built from the memory-mapped weights instead of reading and
+    deserializing the checkpoint again. The configs of the models are kept for every model, including the fine-tuned
+    checkpoints which are not cached.
+    """
+
+    def __init__(self):
+        self._entries: Dict[str, MappedCheckpoint] = {}
+        self._configs: Dict[str, PretrainedConfig] = {}
+        self._lock = threading.Lock()
+
+    def config(self, name: str) -> PretrainedConfig:
+        """
+        Config of a model, loaded on a miss
+        :param name: Name of the model (like `SZTAKI-HLT/hubert-base-cc` or `hubert-wiki-cased`)
+        :return:
+        """
+        with self._lock:
+            if name in self._configs:
+                return self._configs[name]
+        config = _load_config(name)
+        with self._lock:
+            self._configs[name] = config
+        return config
+
+    def get(self, name: str) -> Tuple[PretrainedConfig, MappedCheckpoint]:
+        """
+        Config and mapped base model checkpoint of a model, loaded on a miss
+        :param name: Name of the model (like `SZTAKI-HLT/hubert-base-cc` or `hubert-wiki-cased`)
+        :return:
+        """
+        config = self.config(name)
+        with self._lock:
+            if name in self._entries:
+                return config, self._entries[name]
+        checkpoint = _load_backbone(name, config)
+        with self._lock:
+            self._entries[name] = checkpoint
+        return config, checkpoint
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._configs.clear()
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+backbone_cache = BackboneCache()
+
+
+def is_fine_tuned(name: str) -> bool:
+    """
+    Whether a checkpoint has a task specific head (like the output of a training), unlike the pretrained backbones
+    :param name: Name or path of the model
+    :return:
+    """
+    if name.startswith("hubert-wiki"):
+        return False
+    architectures = backbone_cache.config(name).architectures or []
+    return any(not architecture.endswith(_PRETRAINING_HEADS) for architecture in architectures)
+
+
+def create_from_backbone(name: str, model_class, **config) -> PreTrainedModel:
+    """
+    Builds a task specific model from the cached backbone. The parameters of the backbone are memory-mapped from its
+    checkpoint copy-on-write (training does not modify the checkpoint), only the parameters which are not part of the
+    backbone (the task head) are initialized.
+    :param name: Name of the model (like `SZTAKI-HLT/hubert-base-cc` or `hubert-wiki-cased`)
+    :param model_class: Class of the model, an auto class (like `transformers.AutoModelForTokenClassification`) or a
+    model class (like `transformers.BertForTokenClassification`)
+    :param config: Further parameters of the config like num_labels
+    :return:
+    """
+    backbone_config = backbone_cache.config(name)
+    model_config = copy.deepcopy(backbone_config)
+    for key, value in config.items():
+        setattr(model_config, key, value)
+    if name not in backbone_cache and is_fine_tuned(name):
+        # fine-tuned checkpoints (like the output of a training) are loaded with their task head
+        return model_class.from_pretrained(name, config=model_config)
+    _, checkpoint = backbone_cache.get(name)
+    with skip_init():
+        model = getattr(model_class, "from_config", model_class)(model_config)
+
+    base_model = model.base_model
+    prefix = f"{model.base_model_prefix}." if base_model is not model else ""
+    tensors = dict(base_model.named_parameters())
+    tensors.update(base_model.named_buffers())
+    loaded_keys = []
+    for key, tensor in checkpoint.state_dict().items():
+        if key not in tensors:
+            continue
+        if tensor.shape != tensors[key].shape:
+            raise RuntimeError(f"Size mismatch for {key}: copying a param with shape {tuple(tensor.shape)} from "
+                               f"checkpoint, the shape in current model is {tuple(tensors[key].shape)}")
+        # the parameter takes over the mapped tensor (tied parameters share it), only a different dtype is copied
+        tensors[key].data = tensor.to(tensors[key].dtype)
+        loaded_keys.append(f"{prefix}{key}")
+    initialize_missing(model, loaded_keys)
+    return model
+
+
+def _hubert_type(name: str) -> str:
+    return "uncased" if name.endswith("uncased") else "cased"
+
+
+def _load_config(name: str) -> PretrainedConfig:
+    if name.startswith("hubert-wiki"):
+        from hueval.models.hubert import convert_model
+        _, config_path = convert_model(_hubert_type(name))
+        with open(config_path, mode="r") as f:
+            return BertConfig(**json.load(f))
+    return AutoConfig.from_pretrained(name)
+
+
+def _load_backbone(name: str, config: PretrainedConfig) -> MappedCheckpoint:
+    if name.startswith("hubert-wiki"):
+        from hueval.models.hubert import convert_model, convert_to_safetensors
+        path, _ = convert_model(_hubert_type(name))
+        # the checkpoint is a BertForPreTraining, only the weights of the BertModel are kept
+        return MappedCheckpoint(convert_to_safetensors(path), prefix="bert.")
+
+    # the weights of the base model are stored once as safetensors, keyed by the revision of the checkpoint
+    revision = getattr(config, "_commit_hash", None)
+    if os.path.isdir(name):
+        revision = sorted((entry.name, entry.stat().st_size, entry.stat().st_mtime) for entry in os.scandir(name))
+    digest = hashlib.sha256(json.dumps([name, revision], default=str).encode("utf8")).hexdigest()[:32]
+    path = os.path.join(get_cache_dir("backbones"), f"{digest}.safetensors")
+    if not os.path.exists(path):
+        from safetensors.torch import save_file
+        model = AutoModel.from_pretrained(name, config=config)
+        # tied weights share storage, which safetensors refuses to store
+        state_dict = {key: value.detach().contiguous().clone() for key, value in model.state_dict().items()}
+        del model
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        save_file(state_dict, tmp_path, metadata={"format": "pt"})
+        os.replace(tmp_path, path)
+    return MappedCheckpoint(path)
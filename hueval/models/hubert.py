@@ -1,10 +1,9 @@
 import torch
-from transformers.models.bert.convert_bert_original_tf_checkpoint_to_pytorch import convert_tf_checkpoint_to_pytorch
 import os
 from hueval.utils.network import download_url
-from typing import Literal, Union, Type
+from typing import Literal, Optional, Union, Type
 from transformers import BertForSequenceClassification, BertForPreTraining, BertForTokenClassification, \
-    BertForMultipleChoice, BertForMaskedLM, BertForQuestionAnswering, BertForNextSentencePrediction, BertConfig
+    BertForMultipleChoice, BertForMaskedLM, BertForQuestionAnswering, BertForNextSentencePrediction
 import tarfile
 import json
 from pathlib import Path
@@ -51,11 +50,22 @@ def download_model(model_type: _TYPES):
     return download_path
 
 
+# members needed by the tokenizer and the checkpoint conversion, the rest of the archive is not extracted
+_NEEDED_MEMBERS = ("config.json", "vocab.txt", "tokenizer_config.json", "special_tokens_map.json",
+                   "model.ckpt-100000.")
+
+
 def extract(path: str):
-    with tarfile.open(path) as f:
-        destination = path.rstrip(".tar.gz")
-        if not os.path.exists(destination):
-            f.extractall(destination)
+    destination = path.rstrip(".tar.gz")
+    if os.path.exists(destination):
+        return destination
+    tmp_destination = f"{destination}.{os.getpid()}.tmp"
+    # a single streaming pass over the archive
+    with tarfile.open(path, mode="r|gz") as f:
+        for member in f:
+            if member.isfile() and os.path.basename(member.name).startswith(_NEEDED_MEMBERS):
+                f.extract(member, tmp_destination)
+    os.replace(tmp_destination, destination)
     return destination
 
 
@@ -83,6 +93,9 @@ def convert_model(model_type: _TYPES):
     )
     config_path = os.path.join(path, f"{prefix}/config.json")
     if not os.path.exists(torch_model_path):
+        # imports TensorFlow, so it is only imported when a conversion is needed
+        from transformers.models.bert.convert_bert_original_tf_checkpoint_to_pytorch import \
+            convert_tf_checkpoint_to_pytorch
         convert_tf_checkpoint_to_pytorch(
             tf_checkpoint_path=os.path.join(
                 path, f"{prefix}/model.ckpt-100000.index"
@@ -93,21 +106,59 @@ def convert_model(model_type: _TYPES):
     return torch_model_path, config_path
 
 
-def load_hubert(model_type: _TYPES, model_class: _MODELS, config: dict) -> _RETURN_MODELS:
+def convert_to_safetensors(torch_model_path: str) -> str:
+    """
+    Stores the converted weights next to `pytorch_model.bin` as `model.safetensors`, which can be memory-mapped when
+    the weights are loaded
+    :param torch_model_path: Path of the `pytorch_model.bin`
+    :return: path of the `model.safetensors`
+    """
+    from safetensors.torch import save_file
+
+    safetensors_path = os.path.join(os.path.dirname(torch_model_path), "model.safetensors")
+    if not os.path.exists(safetensors_path):
+        state_dict = torch.load(torch_model_path, map_location="cpu")
+        # tied weights share storage, which safetensors refuses to store
+        state_dict = {key: value.contiguous().clone() for key, value in state_dict.items()}
+        tmp_path = f"{safetensors_path}.{os.getpid()}.tmp"
+        save_file(state_dict, tmp_path, metadata={"format": "pt"})
+        os.replace(tmp_path, safetensors_path)
+    return safetensors_path
+
+
+def load_safetensors(model: torch.nn.Module, path: str):
+    """
+    Copies the weights of a memory-mapped safetensors file into the model one tensor at a time, weights which are not
+    part of the model are ignored (like `load_state_dict(..., strict=False)`)
+    :param model: Initialized model
+    :param path: Path of the safetensors file
+    :return: keys of the state dict which were loaded
+    """
+    from safetensors import safe_open
+
+    state_dict, loaded_keys = model.state_dict(), []
+    with safe_open(path, framework="pt") as f, torch.no_grad():
+        for key in f.keys():
+            if key not in state_dict:
+                continue
+            tensor = f.get_tensor(key)
+            if tensor.shape != state_dict[key].shape:
+                raise RuntimeError(f"Size mismatch for {key}: copying a param with shape {tuple(tensor.shape)} from "
+                                   f"checkpoint, the shape in current model is {tuple(state_dict[key].shape)}")
+            state_dict[key].copy_(tensor)
+            loaded_keys.append(key)
+    return loaded_keys
+
+
+def load_hubert(model_type: _TYPES, model_class: _MODELS, config: Optional[dict] = None) -> _RETURN_MODELS:
     """
     Loads Hubert wiki weights into the provided model which is equivalent to a 'SZTAKI-HLT/hubert-base-cc' in terms of
-    parameters
+    parameters. The weights are memory-mapped from the converted checkpoint by the backbone cache
+    (`hueval.models.cache.create_from_backbone`), only the rest of the model (like the task head) is initialized
     :param model_type: cased, uncased
     :param model_class: Class of the model (like `transformer.BertForSequenceClassification`) NOT the initialized object
     :param config: Further parameters for the model like num_labels. Same as transformers.BertConfig
     :return: desired model with the appropriate weights
     """
-    path, cfg = convert_model(model_type)
-    with open(cfg, mode='r') as f:
-        config_ = json.load(f)
-    for key, value in config.items():
-        config_[key] = value
-    model = model_class(BertConfig(**config_))
-    model.load_state_dict(torch.load(path), strict=False)
-    return model
-
+    from hueval.models.cache import create_from_backbone
+    return create_from_backbone(f"hubert-wiki-{model_type}", model_class, **(config or {}))
@@ -0,0 +1,51 @@
+import contextlib
+from typing import Iterable
+
+import torch
+from transformers import PreTrainedModel
+from transformers.modeling_utils import no_init_weights
+
+
+_INIT_FUNCTIONS = [
+    "uniform_", "normal_", "trunc_normal_", "constant_", "zeros_", "ones_", "eye_", "dirac_", "xavier_uniform_",
+    "xavier_normal_", "kaiming_uniform_", "kaiming_normal_", "orthogonal_", "sparse_",
+]
+
+
+def _skip(tensor, *args, **kwargs):
+    return tensor
+
+
+@contextlib.contextmanager
+def skip_init():
+    """
+    Models constructed within the context allocate their parameters without initializing them (neither
+    `torch.nn.init` in the constructors of the layers, nor `PreTrainedModel._init_weights` runs), so the weights have
+    to be loaded (or initialized by `initialize_missing`) afterwards
+    :return:
+    """
+    originals = {name: getattr(torch.nn.init, name) for name in _INIT_FUNCTIONS if hasattr(torch.nn.init, name)}
+    try:
+        for name in originals:
+            setattr(torch.nn.init, name, _skip)
+        with no_init_weights(_enable=True):
+            yield
+    finally:
+        for name, function in originals.items():
+            setattr(torch.nn.init, name, function)
+
+
+def initialize_missing(model: PreTrainedModel, loaded_keys: Iterable[str]):
+    """
+    Initializes the modules of a model constructed by `skip_init` which have parameters that were not loaded from a
+    checkpoint (like the task specific head), then ties the weights
+    :param model: Model constructed within `skip_init`
+    :param loaded_keys: Keys of the state dict which were loaded from the checkpoint
+    :return:
+    """
+    loaded_keys = set(loaded_keys)
+    for module_name, module in model.named_modules():
+        prefix = f"{module_name}." if module_name else ""
+        if any(f"{prefix}{name}" not in loaded_keys for name, _ in module.named_parameters(recurse=False)):
+            model._init_weights(module)
+    model.tie_weights()
@@ -0,0 +1,185 @@
+import copy
+import inspect
+import os
+import time
+from typing import Callable, Dict, Iterable, List, Tuple
+
+import numpy as np
+import torch
+from torch import nn
+
+
+RUNTIMES = ("fp32", "int8", "torchscript", "onnx")
+_WARMUP_STEPS = 3
+
+Runtime = Callable[[Dict[str, torch.Tensor]], torch.Tensor]
+
+
+class _Logits(nn.Module):
+    """
+    Takes the inputs of a model as positional tensors and returns its logits, which can be traced and exported
+    """
+
+    def __init__(self, model: nn.Module, input_names: List[str]):
+        super(_Logits, self).__init__()
+        self.model = model
+        self.input_names = input_names
+
+    def forward(self, *inputs: torch.Tensor) -> torch.Tensor:
+        return self.model(**dict(zip(self.input_names, inputs))).logits
+
+
+def quantize_dynamic(model: nn.Module) -> nn.Module:
+    """
+    Copy of a model with int8 weights in the linear layers, the activations are quantized dynamically during the
+    inference (CPU only)
+    :param model: Model to quantize
+    :return:
+    """
+    model = copy.deepcopy(model).to("cpu").eval()
+    return torch.quantization.quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8)
+
+
+def export_torchscript(model: nn.Module, example_batch: Dict[str, torch.Tensor], path: str) -> str:
+    """
+    Traces a model and saves it as TorchScript, the traced module takes the inputs of the batch as positional
+    arguments (in the order of `example_batch`) and returns the logits
+    :param model: Model to export
+    :param example_batch: Inputs of the model used for the tracing
+    :param path: Path of the saved module
+    :return:
+    """
+    input_names = list(example_batch.keys())
+    with torch.no_grad():
+        traced = torch.jit.trace(_Logits(model.eval(), input_names), tuple(example_batch.values()), strict=False)
+    torch.jit.save(traced, path)
+    return path
+
+
+def export_onnx(model: nn.Module, example_batch: Dict[str, torch.Tensor], path: str, opset_version: int = 14) -> str:
+    """
+    Exports a model to ONNX with dynamic batch and sequence dimensions. The graph takes the inputs of the batch by
+    their names and returns the `logits`
+    :param model: Model to export
+    :param example_batch: Inputs of the model used for the export
+    :param path: Path of the ONNX file
+    :param opset_version: ONNX opset version
+    :return:
+    """
+    input_names = list(example_batch.keys())
+    # every dimension of the inputs (batch, number of choices, sequence) can change between batches
+    dynamic_axes = {name: {axis: f"{name}_{axis}" for axis in range(tensor.dim())}
+                    for name, tensor in example_batch.items()}
+    dynamic_axes["logits"] = {0: "batch"}
+    # newer versions of PyTorch default to the dynamo based exporter, the graph is traced like by earlier versions
+    kwargs = {"dynamo": False} if "dynamo" in inspect.signature(torch.onnx.export).parameters else {}
+    with torch.no_grad():
+        torch.onnx.export(
+            _Logits(model.eval(), input_names), tuple(example_batch.values()), path, input_names=input_names,
+            output_names=["logits"], dynamic_axes=dynamic_axes, opset_version=opset_version, **kwargs
+        )
+    return path
+
+
+def create_runtime(name: str, model: nn.Module, example_batch: Dict[str, torch.Tensor],
+                   export_dir: str) -> Runtime:
+    """
+    Creates a CPU runtime of a copy of a model, which takes a batch of inputs and returns the logits. The model itself
+    is not moved or switched to evaluation mode
+    :param name: `fp32` (the model itself), `int8` (dynamically quantized model), `torchscript` (traced model) or
+    `onnx` (ONNX Runtime session, requires the `onnxruntime` package)
+    :param model: Model
+    :param example_batch: Inputs of the model used for the tracing and the export
+    :param export_dir: Directory of the exported models
+    :return:
+    """
+    model = copy.deepcopy(model).to("cpu").eval()
+    input_names = list(example_batch.keys())
+    if name == "fp32":
+        return lambda batch: model(**batch).logits
+    elif name == "int8":
+        quantized = quantize_dynamic(model)
+        return lambda batch: quantized(**batch).logits
+    elif name == "torchscript":
+        traced = torch.jit.load(export_torchscript(model, example_batch, os.path.join(export_dir, "model.pt")))
+        return lambda batch: traced(*(batch[key] for key in input_names))
+    elif name == "onnx":
+        try:
+            import onnxruntime
+        except ImportError:
+            raise ImportError("The onnx runtime requires the onnx and onnxruntime packages "
+                              "(`pip install onnx onnxruntime`)")
+        path = export_onnx(model, example_batch, os.path.join(export_dir, "model.onnx"))
+        session = onnxruntime.InferenceSession(path, providers=["CPUExecutionProvider"])
+        return lambda batch: torch.from_numpy(
+            session.run(["logits"], {key: batch[key].numpy() for key in input_names})[0]
+        )
+    raise NotImplementedError(f"Runtime {name} does not exists")
+
+
+def _batches(dataset, data_collator: Callable, batch_size: int) -> Iterable[Dict[str, torch.Tensor]]:
+    for start in range(0, len(dataset), batch_size):
+        columns = dataset[start:start + batch_size]
+        yield data_collator([dict(zip(columns.keys(), values)) for values in zip(*columns.values())])
+
+
+def evaluate_runtime(runtime: Runtime, dataset, data_collator: Callable, metric,
+                     batch_size: int = 32) -> Tuple[Dict, float]:
+    """
+    Evaluates a runtime on a tokenized dataset. The throughput only covers the calls of the runtime, the batching and
+    the collation of the inputs are not measured
+    :param runtime: Runtime created by `create_runtime`
+    :param dataset: Tokenized dataset with labels
+    :param data_collator: Data collator of the task
+    :param metric: Metric of the task (`hueval.evaluation.metrics.Metric`)
+    :param batch_size: Number of examples in a batch
+    :return: Results of the metric and the number of examples processed by the runtime per second
+    """
+    metric.reset()
+    elapsed = 0.0
+    with torch.inference_mode():
+        for batch in _batches(dataset, data_collator, batch_size):
+            labels = batch.pop("labels")
+            start = time.perf_counter()
+            logits = runtime(batch)
+            elapsed += time.perf_counter() - start
+            metric.add_batch(logits.argmax(dim=-1).numpy(), labels.numpy())
+    return metric.compute(), len(dataset) / elapsed
+
+
+def compare_runtimes(model: nn.Module, dataset, data_collator: Callable, metric, export_dir: str,
+                     runtimes: Iterable[str] = RUNTIMES, batch_size: int = 32) -> Dict[str, Dict]:
+    """
+    Evaluates a model with the fp32 baseline and the optimized runtimes on CPU. The report contains the results of the
+    metric and the model-only throughput (`model_examples_per_second`, without the collation of the batches) of every
+    runtime, with the difference of the (top level) scores and the speedup compared to the baseline. The model is
+    copied, so its device and training mode are kept
+    :param model: Fine-tuned model
+    :param dataset: Tokenized dataset with labels
+    :param data_collator: Data collator of the task
+    :param metric: Metric of the task (`hueval.evaluation.metrics.Metric`)
+    :param export_dir: Directory of the exported models
+    :param runtimes: Runtimes to compare with the baseline
+    :param batch_size: Number of examples in a batch
+    :return: Runtime name -> report
+    """
+    os.makedirs(export_dir, exist_ok=True)
+    example_batch = next(iter(_batches(dataset, data_collator, batch_size)))
+    example_batch.pop("labels")
+
+    report = {}
+    for name in ["fp32"] + [runtime for runtime in runtimes if runtime != "fp32"]:
+        runtime = create_runtime(name, model, example_batch, export_dir)
+        # the first calls of the traced and exported models are optimization passes, they are not measured
+        with torch.inference_mode():
+            for _ in range(_WARMUP_STEPS):
+                runtime(example_batch)
+        results, throughput = evaluate_runtime(runtime, dataset, data_collator, metric, batch_size=batch_size)
+        report[name] = {"metrics": results, "model_examples_per_second": throughput}
+        baseline = report["fp32"]
+        report[name]["speedup"] = throughput / baseline["model_examples_per_second"]
+        report[name]["metric_difference"] = {
+            key: value - baseline["metrics"][key] for key, value in results.items()
+            if isinstance(value, (int, float, np.floating))
+        }
+    return report
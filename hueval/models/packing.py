@@ -0,0 +1,55 @@
+from torch import nn
+from torch.nn import CrossEntropyLoss, MSELoss
+from transformers import PreTrainedModel
+from transformers.modeling_outputs import SequenceClassifierOutput
+
+
+class PackedForSequenceClassification(nn.Module):
+    """
+    Wraps a BERT sequence classification model (like `transformers.BertForSequenceClassification`) to run on inputs
+    packed by `hueval.utils.data_collator.DataCollatorForPacking`. The encoder runs on the packed sequences with
+    a block-diagonal attention mask and per-example position ids, then the [CLS] representation of every packed
+    example is pooled and classified separately, which matches the unpacked model.
+    """
+
+    def __init__(self, model: PreTrainedModel):
+        super(PackedForSequenceClassification, self).__init__()
+        if model.config.model_type != "bert" or getattr(model.base_model, "pooler", None) is None:
+            raise NotImplementedError(f"Packing is not supported for {model.__class__.__name__}")
+        self.model = model
+        self.config = model.config
+
+    def forward(
+        self,
+        input_ids=None,
+        attention_mask=None,
+        token_type_ids=None,
+        position_ids=None,
+        cls_positions=None,
+        labels=None,
+    ):
+        r"""
+        attention_mask (:obj:`torch.LongTensor` of shape :obj:`(batch_size, sequence_length, sequence_length)`):
+            Block-diagonal mask, tokens only attend to tokens of the same example.
+        cls_positions (:obj:`torch.LongTensor` of shape :obj:`(num_examples, 2)`):
+            Row and column of the first token of every packed example.
+        labels (:obj:`torch.LongTensor` of shape :obj:`(num_examples,)`, `optional`):
+            Labels of the packed examples.
+        """
+        outputs = self.model.base_model(
+            input_ids,
+            attention_mask=attention_mask,
+            token_type_ids=token_type_ids,
+            position_ids=position_ids,
+        )
+        cls_states = outputs[0][cls_positions[:, 0], cls_positions[:, 1]]
+        pooled_output = self.model.base_model.pooler(cls_states.unsqueeze(1))
+        logits = self.model.classifier(self.model.dropout(pooled_output))
+
+        loss = None
+        if labels is not None:
+            if self.config.num_labels == 1:
+                loss = MSELoss()(logits.view(-1), labels.view(-1).to(logits.dtype))
+            else:
+                loss = CrossEntropyLoss()(logits.view(-1, self.config.num_labels), labels.view(-1))
+        return SequenceClassifierOutput(loss=loss, logits=logits)
@@ -1,8 +1,15 @@
-from hueval.datasets import load_dataset, available_datasets, available_configs
-from hueval.models.hubert import load_hubert
+from importlib import import_module
 from itertools import product
 
 
+# re-exported names, they are imported on first use to keep `import hueval.prepare` free of heavy dependencies
+_EXPORTS = {
+    "load_dataset": "hueval.datasets",
+    "available_datasets": "hueval.datasets",
+    "available_configs": "hueval.datasets",
+    "load_hubert": "hueval.models.hubert",
+}
+
 all_models = [
     "SzegedAI/hubert-tiny-wiki-seq128", "SzegedAI/hubert-tiny-wiki", "SzegedAI/hubert-small-wiki-seq128",
     "SzegedAI/hubert-small-wiki", "SzegedAI/hubert-medium-wiki-seq128", "SzegedAI/hubert-medium-wiki",
@@ -39,3 +46,9 @@ all_tasks = [
 all_configurations = [
     (x, y[0], y[1], y[2]) for x, y in product(all_models, all_tasks)
 ]
+
+
+def __getattr__(name: str):
+    if name in _EXPORTS:
+        return getattr(import_module(_EXPORTS[name]), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,290 @@
+import json
+import multiprocessing
+import os
+import sys
+import time
+import traceback
+from multiprocessing.connection import wait
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+Configuration = Tuple[str, str, str, str]
+
+_GB = 1 << 30
+# rough peak host memory of a fine-tuning process, used until a job of the model was measured
+_MEMORY_ESTIMATES = [
+    ("tiny", 2 * _GB),
+    ("small", 3 * _GB),
+    ("medium", 4 * _GB),
+    ("distilbert", 5 * _GB),
+    ("large", 12 * _GB),
+    ("rembert", 16 * _GB),
+]
+_DEFAULT_ESTIMATE = 6 * _GB
+# measured peaks vary between tasks of the same model
+_HEADROOM = 1.2
+# share of the memory of a GPU which can be reserved by the workers running on it
+_GPU_BUDGET = 0.9
+
+
+def job_name(configuration: Configuration) -> str:
+    """
+    Name of the result file of a job
+    :param configuration: (model, task, task configuration, label) like the elements of
+    `hueval.prepare.all_configurations`
+    :return:
+    """
+    return "__".join(configuration).replace("/", "_")
+
+
+def estimate_memory(model_name: str, measured: Optional[Dict[str, int]] = None) -> int:
+    """
+    Peak memory of a job in bytes, the largest measured peak of the model (with some headroom) or an estimate based on
+    its name
+    :param model_name: Name of the model
+    :param measured: Model name -> measured peak memory
+    :return:
+    """
+    if measured and model_name in measured:
+        return int(measured[model_name] * _HEADROOM)
+    estimate = _DEFAULT_ESTIMATE
+    for keyword, memory in _MEMORY_ESTIMATES:
+        if keyword in model_name.lower():
+            estimate = memory
+    return estimate
+
+
+def total_memory() -> int:
+    return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+
+
+def select_device(reserved: List[int], budgets: List[int], memory: int) -> Optional[int]:
+    """
+    GPU of a new worker, the device with the most free memory if the worker fits into its budget, or an idle device
+    (a worker which does not fit into the budget of any device is run alone)
+    :param reserved: GPU memory reserved by the running workers of every device
+    :param budgets: GPU memory which can be reserved on every device
+    :param memory: Peak GPU memory of the worker
+    :return: Index of the device, None if the worker has to wait
+    """
+    if not budgets:
+        return None
+    device = max(range(len(budgets)), key=lambda i: budgets[i] - reserved[i])
+    if reserved[device] + memory <= budgets[device] or reserved[device] == 0:
+        return device
+    return None
+
+
+def run_sweep(configurations: Iterable[Configuration], output_dir: str, memory_budget: Optional[int] = None,
+              max_workers: Optional[int] = None, training_arguments: Optional[dict] = None, **training_kwargs):
+    """
+    Fine-tunes and evaluates every configuration. The jobs of a model are run one after the other by a worker process
+    of their own, so the backbone weights are loaded once per model (`hueval.models.cache`) instead of once per task.
+    Workers are started while their (measured or estimated) peak memory fits into the budget, so small models run
+    concurrently and large ones alone. With GPUs every worker gets a device (through `CUDA_VISIBLE_DEVICES`), workers
+    share a device while their peak GPU memory fits into 90% of its memory. The result of every job is written to
+    `<output_dir>/<job name>.json`, jobs with an existing result are skipped, so an interrupted sweep continues where
+    it stopped. When the test split of a task is unlabeled (like the test splits of HuLU), the scores of the
+    validation split are stored.
+    :param configurations: (model, task, task configuration, label) tuples, like `hueval.prepare.all_configurations`
+    :param output_dir: Directory of the results
+    :param memory_budget: Host memory in bytes which can be used by the workers at once, 80% of the physical memory
+    by default
+    :param max_workers: Maximum number of concurrent workers, the number of CPUs by default (the number of workers is
+    limited by the memory budgets)
+    :param training_arguments: Arguments of `transformers.TrainingArguments`, `output_dir` is extended by the job name
+    :param training_kwargs: Further arguments of `hueval.training.Training` (like `max_seq_length`)
+    :return: Results of the finished jobs
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    if memory_budget is None:
+        memory_budget = int(total_memory() * 0.8)
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    gpu_budgets = [int(memory * _GPU_BUDGET) for memory in _gpu_memory()]
+    gpu_reserved = [0] * len(gpu_budgets)
+    if training_arguments is None:
+        training_arguments = {}
+
+    results, measured, measured_gpu, pending = {}, {}, {}, {}  # pending: model name -> configurations
+    for configuration in configurations:
+        configuration = tuple(configuration)
+        result = _load_result(output_dir, configuration)
+        if result is None:
+            pending.setdefault(configuration[0], []).append(configuration)
+            continue
+        results[configuration] = result
+        _update_measured(measured, measured_gpu, configuration[0], result)
+    print(f"Sweep: {len(results)} finished, {sum(map(len, pending.values()))} pending jobs "
+          f"of {len(pending)} models")
+
+    context = multiprocessing.get_context("spawn")
+    running = {}  # sentinel -> (process, model name, jobs, reserved memory, device, reserved GPU memory)
+    while pending or running:
+        in_use = sum(reserved for _, _, _, reserved, _, _ in running.values())
+        for model_name in list(pending):
+            if len(running) >= max_workers:
+                break
+            reserved = estimate_memory(model_name, measured)
+            # a worker which does not fit into the budget at all is run alone
+            if in_use + reserved > memory_budget and running:
+                continue
+            device, reserved_gpu = None, 0
+            if gpu_budgets:
+                reserved_gpu = estimate_memory(model_name, measured_gpu)
+                device = select_device(gpu_reserved, gpu_budgets, reserved_gpu)
+                if device is None:
+                    continue
+                gpu_reserved[device] += reserved_gpu
+            jobs = pending.pop(model_name)
+            process = context.Process(
+                target=_run_worker,
+                args=(jobs, output_dir, training_arguments, training_kwargs, device),
+                name=model_name.replace("/", "_")
+            )
+            process.start()
+            running[process.sentinel] = (process, model_name, jobs, reserved, device, reserved_gpu)
+            in_use += reserved
+            on_device = "" if device is None else f" on GPU {device}"
+            print(f"Started {len(jobs)} jobs of {model_name}{on_device} ({reserved / _GB:.1f} GiB reserved)")
+
+        for sentinel in wait(list(running)):
+            process, model_name, jobs, _, device, reserved_gpu = running.pop(sentinel)
+            process.join()
+            if device is not None:
+                gpu_reserved[device] -= reserved_gpu
+            for configuration in jobs:
+                result = _load_result(output_dir, configuration)
+                if result is None:
+                    print(f"Failed {job_name(configuration)} (exit code of the worker {process.exitcode})")
+                    continue
+                results[configuration] = result
+                _update_measured(measured, measured_gpu, configuration[0], result)
+                print(f"Finished {job_name(configuration)} ({result['peak_memory'] / _GB:.1f} GiB peak)")
+    return results
+
+
+def _update_measured(measured: Dict[str, int], measured_gpu: Dict[str, int], model_name: str, result: dict):
+    if result.get("peak_memory"):
+        measured[model_name] = max(measured.get(model_name, 0), result["peak_memory"])
+    if result.get("peak_gpu_memory"):
+        measured_gpu[model_name] = max(measured_gpu.get(model_name, 0), result["peak_gpu_memory"])
+
+
+def _result_path(output_dir: str, configuration: Configuration) -> str:
+    return os.path.join(output_dir, f"{job_name(configuration)}.json")
+
+
+def _load_result(output_dir: str, configuration: Configuration) -> Optional[dict]:
+    path = _result_path(output_dir, configuration)
+    if not os.path.exists(path):
+        return None
+    with open(path, mode="r") as f:
+        result = json.load(f)
+    # results without scores (like the unlabeled test splits of earlier versions) are run again
+    return result if result.get("results") is not None else None
+
+
+def _write_json(path: str, content: dict):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, mode="w") as f:
+        json.dump(content, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def _gpu_memory() -> List[int]:
+    import torch
+    return [torch.cuda.get_device_properties(i).total_memory for i in range(torch.cuda.device_count())]
+
+
+def _peak_memory() -> int:
+    import resource
+    # the peak of the worker so far, which includes the cached backbone weights of the earlier jobs; the tokenization
+    # workers (`num_proc`) are child processes
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    # kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _reset_peak_gpu_memory():
+    import torch
+    if torch.cuda.is_available():
+        torch.cuda.empty_cache()
+        torch.cuda.reset_peak_memory_stats()
+
+
+def _peak_gpu_memory() -> Optional[int]:
+    import torch
+    return torch.cuda.max_memory_allocated() if torch.cuda.is_available() else None
+
+
+def _run_worker(configurations: List[Configuration], output_dir: str, training_arguments: dict, training_kwargs: dict,
+                device: Optional[int] = None):
+    if device is not None:
+        # has to be set before CUDA is initialized
+        os.environ["CUDA_VISIBLE_DEVICES"] = str(device)
+    failed = 0
+    for configuration in configurations:
+        failed += not _run_job(configuration, output_dir, training_arguments, training_kwargs)
+    if failed:
+        sys.exit(1)
+
+
+def _run_job(configuration: Configuration, output_dir: str, training_arguments: dict, training_kwargs: dict) -> bool:
+    import gc
+    from hueval.training import Training, _PREDEFINED_TRAINING_ARGUMENTS
+
+    model_name, task_name, task_configuration, label_name = configuration
+    arguments = dict(_PREDEFINED_TRAINING_ARGUMENTS)
+    arguments.update(training_arguments)
+    arguments["output_dir"] = os.path.join(os.path.expanduser(arguments["output_dir"]), job_name(configuration))
+    _reset_peak_gpu_memory()
+    start = time.time()
+    try:
+        training = Training(model_name, task_name, task_configuration, label_name, **training_kwargs, **arguments)
+        training.train()
+        results, split = training.eval(), "test"
+        if results is None:
+            # the test split is unlabeled, the scores of the validation split are kept
+            results, split = training.trainer.evaluate(), "validation"
+    except Exception:
+        traceback.print_exc()
+        return False
+    finally:
+        # the backbone weights stay in the cache of the worker, everything else of the job is freed
+        training = None
+        gc.collect()
+    _write_json(_result_path(output_dir, configuration), {
+        "model": model_name,
+        "task": task_name,
+        "config": task_configuration,
+        "label": label_name,
+        "split": split,
+        "results": results,
+        "peak_memory": _peak_memory(),
+        "peak_gpu_memory": _peak_gpu_memory(),
+        "runtime": time.time() - start,
+    })
+    return True
+
+
+def select_configurations(configurations: Iterable[Configuration], models: Optional[List[str]] = None,
+                          tasks: Optional[List[str]] = None) -> List[Configuration]:
+    """
+    Filters configurations by model names and tasks
+    :param configurations: (model, task, task configuration, label) tuples
+    :param models: Names of the models to keep, every model if empty
+    :param tasks: Tasks to keep as `task`, `task/config` or `task/config/label`, every task if empty
+    :return:
+    """
+    selected = []
+    for configuration in configurations:
+        model_name, task_name, task_configuration, label_name = configuration
+        keys = {task_name, f"{task_name}/{task_configuration}", f"{task_name}/{task_configuration}/{label_name}"}
+        if models and model_name not in models:
+            continue
+        if tasks and keys.isdisjoint(tasks):
+            continue
+        selected.append(configuration)
+    return selected
@@ -4,29 +4,15 @@ import os
 
 
 class HuBertUncasedTokenizer(BertTokenizerFast):
-    text_arguments = ['text', 'text_pair', 'text_target', 'text_pair_target']
-
-    def __call__(self, *args, **kwargs):
-        new_args = []
-        for i in range(min(len(args), 4)):
-            if type(args[i]) is str:
-                new_args.append(args[i].lower())
-            elif type(args[i]) is list:
-                if type(args[i][0]) is list:
-                    new_args.append([[x.lower() for x in y] for y in args[i]])
-                else:
-                    new_args.append([x.lower() for x in args[i]])
+    """
+    Tokenizer of the uncased HuBert wiki model. The input is lowercased by the normalizer of the backend tokenizer
+    (in the batched Rust pipeline), accents are kept.
+    """
 
-        for argument_name in self.text_arguments[i+1:]:
-            if argument_name in kwargs:
-                if type(kwargs[argument_name]) is str:
-                    kwargs[argument_name] = kwargs[argument_name].lower()
-                elif type(kwargs[argument_name]) is list:
-                    if type(kwargs[argument_name][0]) is list:
-                        kwargs[argument_name] = [[x.lower() for x in y] for y in kwargs[argument_name]]
-                    else:
-                        kwargs[argument_name] = [x.lower() for x in kwargs[argument_name]]
-        return super(HuBertUncasedTokenizer, self).__call__(*new_args, **kwargs)
+    def __init__(self, *args, **kwargs):
+        kwargs["do_lower_case"] = True
+        kwargs["strip_accents"] = False
+        super(HuBertUncasedTokenizer, self).__init__(*args, **kwargs)
 
 
 # "model_type": "bert"
@@ -35,8 +21,8 @@ def load_tokenizer(model_type: _TYPES, return_wrapped: bool = True) -> BertToken
     """
     Loads the tokenizer for HuBert wiki
     :param model_type: cased or uncased, depends on the model type
-    :param return_wrapped: if True returns a tokenizer which calls lower on the input string for the uncased version,
-    otherwise returns a regular FastTokenizer
+    :param return_wrapped: if True returns a tokenizer which lowercases the input for the uncased version,
+    otherwise returns a regular FastTokenizer which does not
     :return:
     """
     path = download_and_extract(model_type)
@@ -44,7 +30,7 @@ def load_tokenizer(model_type: _TYPES, return_wrapped: bool = True) -> BertToken
     path = os.path.join(path, prefix)
     if model_type == "uncased":
         if return_wrapped:
-            tokenizer = HuBertUncasedTokenizer.from_pretrained(path, do_lower_case=False)
+            tokenizer = HuBertUncasedTokenizer.from_pretrained(path)
         else:
             tokenizer = BertTokenizerFast.from_pretrained(path, do_lower_case=False)
     else:
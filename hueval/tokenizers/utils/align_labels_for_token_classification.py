@@ -1,3 +1,7 @@
+from itertools import chain
+import numpy as np
+
+
 class AlignLabels:
     def __init__(self, tokenizer, label_name: str, label_all_tokens: bool = False, truncation: bool = True,
                  is_split_into_words: bool = True, padding: str = "max_length", max_length: int = 512):
@@ -14,27 +18,39 @@ class AlignLabels:
             examples["tokens"], truncation=self.truncation, is_split_into_words=self.is_split_into_words,
             padding=self.padding, max_length=self.max_length
         )
+        word_ids = [encoding.word_ids for encoding in tokenized_inputs.encodings]
+        tokenized_inputs["labels"] = self.align_labels(word_ids, examples[self.label_name])
+        return tokenized_inputs
 
-        labels = []
-        for i, label in enumerate(examples[self.label_name]):
-            word_ids = tokenized_inputs.word_ids(batch_index=i)
-            previous_word_idx = None
-            label_ids = []
-            for word_idx in word_ids:
-                # Special tokens have a word id that is None. We set the label to -100 so they are automatically
-                # ignored in the loss function.
-                if word_idx is None:
-                    label_ids.append(-100)
-                # We set the label for the first token of each word.
-                elif word_idx != previous_word_idx:
-                    label_ids.append(label[word_idx])
-                # For the other tokens in a word, we set the label to either the current label or -100, depending on
-                # the label_all_tokens flag.
-                else:
-                    label_ids.append(label[word_idx] if self.label_all_tokens else -100)
-                previous_word_idx = word_idx
+    def align_labels(self, word_ids, labels):
+        """
+        Assigns the label of each word to its first subword token, the rest of the subword tokens get the label of
+        the word if `label_all_tokens` is set otherwise -100, just like special tokens. Works on the flattened word
+        ids of the whole batch at once.
+        :param word_ids: Word index (or None) of every token, one list per example
+        :param labels: Word level labels, one list per example
+        :return: Token level labels, one list per example
+        """
+        if len(word_ids) == 0:
+            return []
+        lengths = np.fromiter((len(x) for x in word_ids), dtype=np.int64, count=len(word_ids))
+        # None (special tokens) becomes nan, then -1
+        flat_word_ids = np.array(list(chain.from_iterable(word_ids)), dtype=np.float64)
+        is_word = ~np.isnan(flat_word_ids)
+        flat_word_ids = np.where(is_word, flat_word_ids, -1).astype(np.int64)
 
-            labels.append(label_ids)
+        # a token starts a word if its word id differs from the previous token of the same example
+        previous = np.empty_like(flat_word_ids)
+        previous[1:] = flat_word_ids[:-1]
+        starts = np.cumsum(lengths) - lengths
+        previous[starts[lengths > 0]] = -1
+        first_tokens = is_word & (flat_word_ids != previous)
 
-        tokenized_inputs["labels"] = labels
-        return tokenized_inputs
+        label_lengths = np.fromiter((len(x) for x in labels), dtype=np.int64, count=len(labels))
+        flat_labels = np.fromiter(chain.from_iterable(labels), dtype=np.int64, count=int(label_lengths.sum()))
+        label_offsets = np.repeat(np.cumsum(label_lengths) - label_lengths, lengths)
+
+        labelled = is_word if self.label_all_tokens else first_tokens
+        aligned = np.full(len(flat_word_ids), -100, dtype=np.int64)
+        aligned[labelled] = flat_labels[label_offsets[labelled] + flat_word_ids[labelled]]
+        return [x.tolist() for x in np.split(aligned, np.cumsum(lengths)[:-1])]
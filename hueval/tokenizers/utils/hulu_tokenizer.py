@@ -41,15 +41,17 @@ class MultipleChoiceTokenizer:
 
     def preprocess_function(self, examples):
         columns = mcqa_task_to_keys[self.task]
-        num_choices = len(columns[2:])
-        first_sentences = [[f"{x}" if self.task == "copa" else f"{x} {y}"] * len(columns[2:]) for x, y in zip(examples[columns[0]], examples[columns[1]])]
-
+        choices = columns[2:]
+        num_choices = len(choices)
+        # one (context, choice) pair per choice, flattened in linear time
+        first_sentences = [
+            f"{x}" if self.task == "copa" else f"{x} {y}"
+            for x, y in zip(examples[columns[0]], examples[columns[1]]) for _ in range(num_choices)
+        ]
         second_sentences = [
-            [f"{examples[choice][i]}" for choice in columns[2:]] for i in range(len(examples[columns[0]]))
+            f"{examples[choice][i]}" for i in range(len(examples[columns[0]])) for choice in choices
         ]
 
-        first_sentences = sum(first_sentences, [])
-        second_sentences = sum(second_sentences, [])
         tokenized = self.tokenizer(
             first_sentences, second_sentences, truncation=self.truncation, padding=self.padding, max_length=self.max_length
         )
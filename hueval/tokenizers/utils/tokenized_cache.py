@@ -0,0 +1,108 @@
+import hashlib
+import json
+import os
+from typing import Sequence
+from datasets import Dataset, DatasetDict
+from transformers import PreTrainedTokenizerBase
+from hueval.tokenizers.hubert import HuBertUncasedTokenizer
+from hueval.utils.cache import get_cache_dir
+
+
+# has to be bumped whenever the tokenization or the label alignment code changes (like `AlignLabels.align_labels` or
+# the normalization of `HuBertUncasedTokenizer`), so the tokenized splits of the earlier versions are not reused
+PREPROCESSING_VERSION = 2
+
+
+def tokenizer_fingerprint(tokenizer: PreTrainedTokenizerBase) -> str:
+    """
+    Fingerprint of the tokenization behaviour, tokenizers with identical vocabularies and settings share it
+    :param tokenizer: Tokenizer
+    :return: Hex digest
+    """
+    hasher = hashlib.sha256()
+    vocab = sorted(tokenizer.get_vocab().items(), key=lambda x: (x[1], x[0]))
+    hasher.update(json.dumps(vocab, ensure_ascii=False).encode("utf8"))
+    hasher.update(json.dumps({
+        "lowercase": isinstance(tokenizer, HuBertUncasedTokenizer) or bool(getattr(tokenizer, "do_lower_case", False)),
+        "special_tokens": tokenizer.special_tokens_map,
+        "padding_side": tokenizer.padding_side,
+        "backend": _backend_state(tokenizer),
+    }, sort_keys=True, default=str).encode("utf8"))
+    return hasher.hexdigest()
+
+
+def _backend_state(tokenizer: PreTrainedTokenizerBase) -> dict:
+    backend = getattr(tokenizer, "backend_tokenizer", None)
+    if backend is not None:
+        # the vocabulary of the model is hashed separately
+        state = json.loads(backend.to_str())
+        return {key: state.get(key) for key in ("normalizer", "pre_tokenizer", "post_processor")}
+    # slow tokenizers are described by their settings, the paths of their files differ between identical tokenizers
+    return {key: value for key, value in tokenizer.init_kwargs.items() if not key.endswith(("_file", "name_or_path"))}
+
+
+def preprocessing_fingerprint(preprocessor, dataset_fingerprint: str, **settings) -> str:
+    """
+    Fingerprint of a tokenized split. It is built from the tokenizer fingerprint, the parameters of the preprocessor
+    (task, label column, max_length, truncation and padding policy, ...), the version of the preprocessing code and
+    the fingerprint of the source split
+    :param preprocessor: `AlignLabels`, `SequenceTokenizer` or `MultipleChoiceTokenizer`
+    :param dataset_fingerprint: Fingerprint of the split which is tokenized
+    :param settings: Further settings which affect the result (like the kept columns)
+    :return: Hex digest
+    """
+    key = {k: v for k, v in vars(preprocessor).items() if k != "tokenizer"}
+    key.update(settings)
+    key["preprocessor"] = f"{type(preprocessor).__module__}.{type(preprocessor).__qualname__}"
+    key["version"] = PREPROCESSING_VERSION
+    key["tokenizer"] = tokenizer_fingerprint(preprocessor.tokenizer)
+    key["dataset"] = dataset_fingerprint
+    return hashlib.sha256(json.dumps(key, sort_keys=True, default=str).encode("utf8")).hexdigest()[:32]
+
+
+def tokenize_dataset(dataset: DatasetDict, preprocessor, batch_size: int = 1000, num_proc: int = None,
+                     keep_columns: Sequence[str] = ("label", "labels", "idx"), **map_kwargs) -> DatasetDict:
+    """
+    Tokenizes every split with `preprocessor.preprocess_function`. The result is cached under
+    `<hueval cache>/tokenized/` by an explicit fingerprint instead of hashing the preprocessor, so models with the same
+    vocabulary reuse the same memory-mapped tokenized splits. Every split is cached in a single file (the shards of the
+    processes are merged), so the cache is reused with any number of processes
+    :param dataset: Dataset to tokenize
+    :param preprocessor: `AlignLabels`, `SequenceTokenizer` or `MultipleChoiceTokenizer`
+    :param batch_size: Number of examples passed to the tokenizer at once
+    :param num_proc: Number of processes tokenizing the shards of a split
+    :param keep_columns: Columns of the source dataset which are kept, the rest (raw text, metadata, ...) is dropped.
+    The `idx` column is kept, so tokenized examples can be joined back to the source examples (the order of the rows
+    is not changed either), it is removed by the Trainer before the examples are passed to the model
+    :param map_kwargs: Further arguments of `datasets.Dataset.map`
+    :return:
+    """
+    map_kwargs.setdefault("batched", True)
+    cache_dir = get_cache_dir("tokenized")
+    # the batch size only changes the result when the examples are padded to the longest one of the batch
+    settings = {"batch_size": batch_size} if getattr(preprocessor, "padding", None) in (True, "longest") else {}
+    tokenized = {}
+    for split, data in dataset.items():
+        remove_columns = [column for column in data.column_names if column not in keep_columns]
+        fingerprint = preprocessing_fingerprint(preprocessor, data._fingerprint, remove_columns=remove_columns,
+                                                **settings)
+        cache_file_name = os.path.join(cache_dir, f"{fingerprint}.arrow")
+        if not os.path.exists(cache_file_name):
+            kwargs = dict(batch_size=batch_size, remove_columns=remove_columns, new_fingerprint=fingerprint,
+                          **map_kwargs)
+            if num_proc is not None and num_proc > 1:
+                shards = data.map(
+                    preprocessor.preprocess_function,
+                    num_proc=num_proc,
+                    cache_file_name=os.path.join(cache_dir, f"{fingerprint}_{os.getpid()}.arrow"),
+                    **kwargs
+                )
+                shards.flatten_indices(cache_file_name=cache_file_name, new_fingerprint=fingerprint)
+                for cache_file in shards.cache_files:
+                    os.remove(cache_file["filename"])
+            else:
+                data.map(preprocessor.preprocess_function, cache_file_name=cache_file_name, **kwargs)
+        # loaded explicitly, `Dataset.map` only looks up the cache file of splits which are stored on disk themselves
+        tokenized[split] = Dataset.from_file(cache_file_name, split=data.split)
+        tokenized[split]._fingerprint = fingerprint
+    return DatasetDict(tokenized)
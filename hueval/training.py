@@ -1,12 +1,10 @@
-from transformers import Trainer, TrainingArguments, IntervalStrategy, DataCollatorForTokenClassification, \
-    DataCollatorWithPadding, set_seed
 from hueval.datasets import load_dataset, TaskType
-from hueval.transformers.token_classification import create_model as token_classification_model
-from hueval.transformers.sequence_classification import create_model as sequence_classification_model
-from hueval.transformers.multiple_choice_qa import create_model as multiple_choice_qa_model
 from hueval.tokenizers.utils.align_labels_for_token_classification import AlignLabels
 from hueval.tokenizers.utils.hulu_tokenizer import SequenceTokenizer, MultipleChoiceTokenizer
-from hueval.utils.data_collator import DataCollatorForMultipleChoice
+from functools import partial
+from typing import List, Literal, Optional
+import json
+import os
 import numpy as np
 
 
@@ -17,76 +15,263 @@ _PREDEFINED_TRAINING_ARGUMENTS = {
     "gradient_accumulation_steps": 4,
     "learning_rate": 5e-5,
     "num_train_epochs": 3,
-    "evaluation_strategy": IntervalStrategy.EPOCH,
-    "save_strategy": IntervalStrategy.NO,
+    "evaluation_strategy": "epoch",
+    "save_strategy": "no",
     "data_seed": 0,
-    "logging_strategy": IntervalStrategy.EPOCH,
+    "logging_strategy": "epoch",
 }
+# describes the fine-tuned model saved into the output directory
+_CHECKPOINT_INFO = "hueval_training.json"
+
+
+def find_checkpoint(output_dir: str, model_name: str, task_name: str, task_configuration: str,
+                    label_name: str) -> Optional[str]:
+    """
+    Looks up the model saved by `Training.save` for a model and a task
+    :param output_dir: Directory the model was saved into
+    :param model_name: Name of the fine-tuned model
+    :param task_name: Name of the dataset
+    :param task_configuration: Name of the dataset configuration
+    :param label_name: Name of the label column
+    :return: Path of the checkpoint, or None if the directory does not contain the model fine-tuned on the task
+    """
+    path = os.path.join(output_dir, _CHECKPOINT_INFO)
+    if not os.path.exists(path):
+        return None
+    with open(path, mode="r") as f:
+        info = json.load(f)
+    if info != {"model": model_name, "task": task_name, "config": task_configuration, "label": label_name}:
+        return None
+    return output_dir
 
 
 class Training:
     def __init__(self, model_name: str, task_name: str, task_configuration: str, label_name: str,
-                 max_seq_length: int = 256, seed: int = 0, **training_arguments):
+                 max_seq_length: int = 256, seed: int = 0, batching: Literal["fixed", "token_budget"] = "fixed",
+                 max_tokens: int = 4096, packing: bool = False, preprocessing_batch_size: int = 1000,
+                 preprocessing_num_proc: Optional[int] = None, checkpoint: Optional[str] = None,
+                 **training_arguments):
+        """
+        :param model_name: Name of the model
+        :param task_name: Name of the dataset
+        :param task_configuration: Name of the dataset configuration
+        :param label_name: Name of the label column
+        :param max_seq_length: Maximum length of a tokenized sequence
+        :param seed: Random seed
+        :param batching: `fixed` pads every sequence to `max_seq_length` and uses batches of a fixed number of
+        examples, `token_budget` groups examples of similar length into batches of at most `max_tokens` (padded)
+        tokens and pads every batch to its longest member
+        :param max_tokens: Token budget of a batch, used by the `token_budget` batching
+        :param packing: Packs several examples of a sequence classification task into sequences of `max_seq_length`
+        tokens with a block-diagonal attention mask, instead of padding them (BERT models only)
+        :param preprocessing_batch_size: Number of examples passed to the tokenizer at once during the preprocessing
+        :param preprocessing_num_proc: Number of processes used by the preprocessing
+        :param checkpoint: Directory of a model fine-tuned on the task and saved by `Training.save` (see
+        `find_checkpoint`), its weights replace the weights of the created model
+        :param training_arguments: Arguments of `transformers.TrainingArguments`
+        """
+        # transformers, torch and the model specific modules are imported on first use
+        from transformers import TrainingArguments, DataCollatorForTokenClassification, \
+            DataCollatorWithPadding, set_seed
+        from hueval.transformers.token_classification import create_model as token_classification_model
+        from hueval.transformers.sequence_classification import create_model as sequence_classification_model
+        from hueval.transformers.multiple_choice_qa import create_model as multiple_choice_qa_model
+        from hueval.tokenizers.utils.tokenized_cache import tokenize_dataset
+        from hueval.utils.data_collator import DataCollatorForMultipleChoice, DataCollatorForPacking
+        from hueval.models.packing import PackedForSequenceClassification
+        from hueval.utils.trainer import StreamingMetricTrainer, TokenBudgetTrainer
+        from hueval.evaluation.metrics import SeqEval
+
+        if batching not in ("fixed", "token_budget"):
+            raise ValueError(f"Unknown batching: {batching}")
+        if packing and batching != "fixed":
+            raise ValueError("Packing can only be used with the fixed batching")
+        # with a token budget the inputs are left unpadded and every batch is padded to its longest member
+        padding = "max_length" if batching == "fixed" else False
+        collator_padding = "max_length" if batching == "fixed" else "longest"
+
         set_seed(seed)
         dataset = load_dataset(task_name, task_configuration)
+        if packing and dataset.type != TaskType.SEQUENCE_CLASSIFICATION:
+            raise ValueError("Packing is only supported for sequence classification tasks")
         if dataset.type == TaskType.TOKEN_CLASSIFICATION:
             params = token_classification_model(model_name, label_name, dataset)
             if label_name == 'upos':
                 params.dataset = params.dataset.filter(lambda example: example['morph_tagged'])
-            aligner = AlignLabels(params.tokenizer, label_name, max_length=max_seq_length)
+            aligner = AlignLabels(params.tokenizer, label_name, padding=padding, max_length=max_seq_length)
             params.data_collator = DataCollatorForTokenClassification(
-                tokenizer=params.tokenizer, padding='max_length', max_length=max_seq_length
+                tokenizer=params.tokenizer, padding=collator_padding, max_length=max_seq_length
             )
+            # entities are extracted from the label ids, the names only define their BIO tags and types
+            params.metric = SeqEval(label_names=params.dataset['train'].features[label_name].feature.names)
             params.compute_metrics = self.compute_metrics_
         elif dataset.type == TaskType.SEQUENCE_CLASSIFICATION:
             params = sequence_classification_model(model_name, label_name, dataset)
-            aligner = SequenceTokenizer(params.tokenizer, task_configuration, max_length=max_seq_length)
-            params.data_collator = DataCollatorWithPadding(
-                tokenizer=params.tokenizer, padding='max_length', max_length=max_seq_length
-            )
+            aligner = SequenceTokenizer(params.tokenizer, task_configuration, padding=False if packing else padding,
+                                        max_length=max_seq_length)
+            if packing:
+                params.model = PackedForSequenceClassification(params.model)
+                params.data_collator = DataCollatorForPacking(tokenizer=params.tokenizer, max_length=max_seq_length)
+            else:
+                params.data_collator = DataCollatorWithPadding(
+                    tokenizer=params.tokenizer, padding=collator_padding, max_length=max_seq_length
+                )
             params.compute_metrics = self.compute_metrics_
         elif dataset.type == TaskType.MULTIPLE_CHOICE_QUESTION_ANSWERING:
             params = multiple_choice_qa_model(model_name, label_name, dataset)
-            aligner = MultipleChoiceTokenizer(params.tokenizer, task_configuration, max_length=max_seq_length)
+            aligner = MultipleChoiceTokenizer(params.tokenizer, task_configuration, padding=padding,
+                                              max_length=max_seq_length)
             params.data_collator = DataCollatorForMultipleChoice(
-                tokenizer=params.tokenizer, padding='max_length', max_length=max_seq_length
+                tokenizer=params.tokenizer, padding=collator_padding, max_length=max_seq_length
             )
             params.compute_metrics = self.compute_metrics_
         else:
             raise NotImplementedError
 
+        if checkpoint is not None:
+            from hueval.models.hubert import load_safetensors
+            load_safetensors(params.model.model if packing else params.model,
+                             os.path.join(checkpoint, "model.safetensors"))
         params.task_type = dataset.type
-        params.tokenized_dataset = params.dataset.map(aligner.preprocess_function, batched=True, batch_size=8)
+        params.tokenized_dataset = tokenize_dataset(params.dataset, aligner, batch_size=preprocessing_batch_size,
+                                                    num_proc=preprocessing_num_proc)
         self.params = params
         training_arguments['seed'] = seed
         self.arguments = TrainingArguments(
             **training_arguments
         )
-        self.trainer = Trainer(
+        if batching == "token_budget":
+            trainer_kwargs = {"max_tokens": max_tokens}
+            trainer_class = TokenBudgetTrainer
+        else:
+            trainer_kwargs = {}
+            trainer_class = StreamingMetricTrainer
+        self.trainer = trainer_class(
             model=params.model,
             args=self.arguments,
             data_collator=params.data_collator,
             train_dataset=params.tokenized_dataset['train'],
             eval_dataset=params.tokenized_dataset['validation'],
             tokenizer=params.tokenizer,
-            compute_metrics=params.compute_metrics
+            compute_metrics=params.compute_metrics,
+            metric=params.metric,
+            **trainer_kwargs
         )
+        self.model_name = model_name
+        self.task_name = task_name
+        self.task_configuration = task_configuration
         self.label_name = label_name
+        self.packing = packing
 
     def train(self):
         self.trainer.train()
 
+    def save(self, output_dir: Optional[str] = None) -> str:
+        """
+        Saves the fine-tuned model (as safetensors), it is loaded by passing the directory as the `checkpoint` of a
+        `Training` of the same model and task
+        :param output_dir: Directory of the model, the output directory of the training by default
+        :return: Directory of the model
+        """
+        output_dir = output_dir or self.arguments.output_dir
+        model = self.params.model.model if self.packing else self.params.model
+        model.save_pretrained(output_dir, safe_serialization=True)
+        with open(os.path.join(output_dir, _CHECKPOINT_INFO), mode="w") as f:
+            json.dump({"model": self.model_name, "task": self.task_name, "config": self.task_configuration,
+                       "label": self.label_name}, f, indent=2)
+        return output_dir
+
     def eval(self):
         if self.params.dataset['test'][self.label_name][0] == -1:
             return
-        self.trainer.evaluate(self.params.tokenized_dataset['test'], metric_key_prefix="test")
+        return self.trainer.evaluate(self.params.tokenized_dataset['test'], metric_key_prefix="test")
+
+    def predict(self, output_path: str, split: str = "test", batch_size: int = 128, window_size: int = 8192) -> str:
+        """
+        Predicts the labels of a (possibly unlabeled) split, like the test splits of HuLU. The predictions are written
+        as a JSON array of `{"id", "label"}` objects in the order of the split, with the labels in the encoding of the
+        source files, which is the submission format of HuLU. Examples are processed in windows of `window_size`
+        examples, which are sorted by length and split into batches, so only one window is kept in memory
+        :param output_path: Path of the JSON file
+        :param split: Name of the split
+        :param batch_size: Number of examples in a batch
+        :param window_size: Number of examples sorted by length at once
+        :return: Path of the written file
+        """
+        import torch
+
+        if self.params.task_type not in (TaskType.SEQUENCE_CLASSIFICATION,
+                                         TaskType.MULTIPLE_CHOICE_QUESTION_ANSWERING):
+            raise NotImplementedError("Only sequence classification and multiple choice tasks can be predicted")
+        if self.task_name == "hulu":
+            from hueval.datasets.hulu import submission_label
+            encode_label = partial(submission_label, self.task_configuration)
+        else:
+            names = self.params.dataset[split].features[self.label_name].names
+
+            def encode_label(example, label):
+                return names[label]
+
+        examples = self.params.dataset[split]
+        tokenized = self.trainer._remove_unused_columns(self.params.tokenized_dataset[split], description="prediction")
+        device = self.arguments.device
+        model = self.trainer.model.to(device)
+        model.eval()
+
+        tmp_path = f"{output_path}.{os.getpid()}.tmp"
+        with open(tmp_path, mode="w", encoding="utf8") as f, torch.inference_mode():
+            f.write("[")
+            separator = "\n"
+            for start in range(0, len(tokenized), window_size):
+                columns = tokenized[start:start + window_size]
+                features = [dict(zip(columns.keys(), values)) for values in zip(*columns.values())]
+                lengths = [max(map(len, ids)) if ids and isinstance(ids[0], list) else len(ids)
+                           for ids in columns["input_ids"]]
+                order = np.argsort(lengths, kind="stable")
+                predictions = np.empty(len(features), dtype=np.int64)
+                for i in range(0, len(order), batch_size):
+                    indices = order[i:i + batch_size]
+                    batch = self.params.data_collator([features[j] for j in indices])
+                    # the labels of unlabeled splits are invalid for the loss
+                    batch.pop("labels", None)
+                    batch.pop("label", None)
+                    logits = model(**{key: value.to(device) for key, value in batch.items()}).logits
+                    predictions[indices] = logits.argmax(dim=-1).cpu().numpy()
+
+                window = examples[start:start + window_size]
+                for j, label in enumerate(predictions.tolist()):
+                    example = {key: values[j] for key, values in window.items()}
+                    entry = {"id": example["idx"], "label": encode_label(example, label)}
+                    f.write(f"{separator}{json.dumps(entry, ensure_ascii=False)}")
+                    separator = ",\n"
+            f.write("\n]\n")
+        os.replace(tmp_path, output_path)
+        return output_path
+
+    def compare_runtimes(self, runtimes: Optional[List[str]] = None, split: str = "validation", batch_size: int = 32,
+                         report_path: Optional[str] = None) -> dict:
+        """
+        Evaluates the (fine-tuned) model on CPU with the fp32 baseline and the optimized runtimes (dynamic int8
+        quantization, TorchScript and ONNX Runtime), and reports the results of the metric and the model-only throughput
+        of every runtime compared to the baseline. The exported models are written into `<output_dir>/optimized`
+        :param runtimes: Names of the runtimes (`hueval.models.optimization.RUNTIMES`), every runtime by default
+        :param split: Name of a labeled split
+        :param batch_size: Number of examples in a batch
+        :param report_path: Path of the JSON report
+        :return: Runtime name -> report
+        """
+        from hueval.models.optimization import compare_runtimes, RUNTIMES
+
+        dataset = self.trainer._remove_unused_columns(self.params.tokenized_dataset[split], description="optimization")
+        report = compare_runtimes(self.trainer.model, dataset, self.params.data_collator, self.params.metric,
+                                  os.path.join(self.arguments.output_dir, "optimized"),
+                                  runtimes=runtimes or RUNTIMES, batch_size=batch_size)
+        if report_path is not None:
+            with open(report_path, mode="w") as f:
+                json.dump(report, f, indent=2)
+        return report
 
     def compute_metrics_(self, predictions):
         preds = np.argmax(predictions.predictions, axis=-1)
-        labels = predictions.label_ids
-        if self.params.task_type == TaskType.TOKEN_CLASSIFICATION:
-            id2label = self.params.dataset['train'].features[self.label_name].feature.names
-            preds = [[id2label[id_] for j, id_ in enumerate(row) if labels[i][j] != -100] for i, row in enumerate(preds)]
-            labels = [[id2label[id_] for id_ in row if id_ != -100] for row in labels]
-        results = self.params.metric.compute(predictions=preds, references=labels)
-        return results
+        # the metrics work on the label ids (ignored positions of token classification are masked by the metric)
+        return self.params.metric.compute(predictions=preds, references=predictions.label_ids)
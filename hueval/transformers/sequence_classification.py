@@ -1,6 +1,6 @@
 from transformers import AutoModelForSequenceClassification, BertForSequenceClassification, AutoTokenizer
 from hueval.datasets import Dataset
-from hueval.models.hubert import load_hubert
+from hueval.models.cache import create_from_backbone
 from hueval.tokenizers.hubert import load_tokenizer
 from hueval.dataclasses import RunParameters
 
@@ -13,10 +13,10 @@ def create_model(name: str, label_column: str, dataset: Dataset) -> RunParameter
         model_type = 'cased'
         if name.endswith("uncased"):
             model_type = 'uncased'
-        model = load_hubert(model_type, BertForSequenceClassification, config)
+        model = create_from_backbone(name, BertForSequenceClassification, **config)
         tokenizer = load_tokenizer(model_type)
     else:
-        model = AutoModelForSequenceClassification.from_pretrained(name, **config)
+        model = create_from_backbone(name, AutoModelForSequenceClassification, **config)
         tokenizer = AutoTokenizer.from_pretrained(name)
 
     return RunParameters(model=model, tokenizer=tokenizer, dataset=dataset.dataset, metric=dataset.metric)
\ No newline at end of file
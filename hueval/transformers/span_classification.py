@@ -1,6 +1,6 @@
 from transformers import AutoModelForQuestionAnswering, BertForQuestionAnswering, AutoTokenizer
 from hueval.datasets import Dataset
-from hueval.models.hubert import load_hubert
+from hueval.models.cache import create_from_backbone
 from hueval.tokenizers.hubert import load_tokenizer
 from hueval.dataclasses import RunParameters
 
@@ -11,10 +11,10 @@ def create_model(name: str, dataset: Dataset) -> RunParameters:
         model_type = 'cased'
         if name.endswith("uncased"):
             model_type = 'uncased'
-        model = load_hubert(model_type, BertForQuestionAnswering, config)
+        model = create_from_backbone(name, BertForQuestionAnswering, **config)
         tokenizer = load_tokenizer(model_type)
     else:
-        model = AutoModelForQuestionAnswering.from_pretrained(name, **config)
+        model = create_from_backbone(name, AutoModelForQuestionAnswering, **config)
         tokenizer = AutoTokenizer.from_pretrained(name)
 
     return RunParameters(model=model, tokenizer=tokenizer, dataset=dataset.dataset, metric=dataset.metric)
\ No newline at end of file
@@ -1,6 +1,6 @@
 from transformers import AutoModelForTokenClassification, BertForTokenClassification, AutoTokenizer
 from hueval.datasets import Dataset
-from hueval.models.hubert import load_hubert
+from hueval.models.cache import create_from_backbone
 from hueval.tokenizers.hubert import load_tokenizer
 from hueval.dataclasses import RunParameters
 
@@ -13,10 +13,10 @@ def create_model(name: str, label_column: str, dataset: Dataset) -> RunParameter
         model_type = 'cased'
         if name.endswith("uncased"):
             model_type = 'uncased'
-        model = load_hubert(model_type, BertForTokenClassification, config)
+        model = create_from_backbone(name, BertForTokenClassification, **config)
         tokenizer = load_tokenizer(model_type)
     else:
-        model = AutoModelForTokenClassification.from_pretrained(name, **config)
+        model = create_from_backbone(name, AutoModelForTokenClassification, **config)
         tokenizer = AutoTokenizer.from_pretrained(name)
 
     return RunParameters(model=model, tokenizer=tokenizer, dataset=dataset.dataset, metric=dataset.metric)
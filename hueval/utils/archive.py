@@ -0,0 +1,95 @@
+import io
+import os
+import posixpath
+import zipfile
+from functools import lru_cache
+from typing import IO, List, Tuple
+
+
+# `::` would be read as a hop between chained URLs by the path functions which `datasets` patches into the builder
+# modules (like `os.path.join` -> `xjoin`)
+MEMBER_SEPARATOR = "!/"
+
+
+def member(archive: str, name: str = "") -> str:
+    """
+    Path of a member of a zip archive (`<archive>!/<name>`), it can be extended by `join` like a directory and opened
+    by `open_file`, without extracting the archive
+    :param archive: Path of the zip archive
+    :param name: Name of the member (or directory) in the archive
+    :return:
+    """
+    return f"{archive}{MEMBER_SEPARATOR}{name}"
+
+
+def is_member(path: str) -> bool:
+    return MEMBER_SEPARATOR in path
+
+
+def join(path: str, *names: str) -> str:
+    """
+    Like `os.path.join`, but members of an archive (paths created by `member`) are always joined by `/`
+    :param path: Path of a directory
+    :param names: Path components
+    :return:
+    """
+    if not is_member(path):
+        return os.path.join(path, *names)
+    archive, _, name = path.partition(MEMBER_SEPARATOR)
+    return member(archive, posixpath.join(name, *names))
+
+
+def root(archive: str) -> str:
+    """
+    Name of the top level directory of an archive, like the `<repository>-<commit>` directory of a GitHub snapshot
+    :param archive: Path of the zip archive
+    :return:
+    """
+    return _zip(archive).namelist()[0].split("/")[0]
+
+
+def listdir(path: str) -> List[str]:
+    """
+    Like `os.listdir`, but also lists directories of an archive (paths created by `member`)
+    :param path: Path of a directory
+    :return: Sorted names of the entries
+    """
+    if not is_member(path):
+        return sorted(os.listdir(path))
+    archive, name = _split(path)
+    prefix = f"{name}/" if name else ""
+    entries = {n[len(prefix):].split("/")[0] for n in _zip(archive).namelist() if n.startswith(prefix)}
+    entries.discard("")
+    return sorted(entries)
+
+
+def open_file(path: str, mode: str = "r", encoding: str = "utf8") -> IO:
+    """
+    Opens a regular file or a member of an archive (paths created by `member`) for reading
+    :param path: Path of the file
+    :param mode: `r` or `rb`
+    :param encoding: Encoding of the text, when opened in text mode
+    :return:
+    """
+    if not is_member(path):
+        return open(path, mode=mode) if "b" in mode else open(path, mode=mode, encoding=encoding)
+    archive, name = _split(path)
+    f = _zip(archive).open(name)
+    return f if "b" in mode else io.TextIOWrapper(f, encoding=encoding)
+
+
+def _split(path: str) -> Tuple[str, str]:
+    archive, _, name = path.partition(MEMBER_SEPARATOR)
+    # relative references (like the pointer files of NerKor) are resolved within the archive
+    name = posixpath.normpath(name) if name else name
+    return archive, "" if name == "." else name
+
+
+def _zip(archive: str) -> zipfile.ZipFile:
+    # the underlying file object can not be shared with forked (num_proc) workers
+    return _open_zip(archive, os.getpid())
+
+
+@lru_cache(maxsize=16)
+def _open_zip(archive: str, pid: int) -> zipfile.ZipFile:
+    return zipfile.ZipFile(archive)
@@ -0,0 +1,18 @@
+import os
+from pathlib import Path
+
+
+def get_cache_dir(*parts: str) -> str:
+    """
+    Returns a directory inside the hueval cache and creates it if it does not exist. The root of the cache is taken
+    from the `HUEVAL_CACHE` environment variable, otherwise it is `~/.cache/hueval`
+    :param parts: Path components relative to the root of the cache
+    :return: Path to the directory
+    """
+    if 'HUEVAL_CACHE' in os.environ:
+        cache_dir = os.environ['HUEVAL_CACHE']
+    else:
+        cache_dir = os.path.join(str(Path.home()), ".cache/hueval/")
+    path = os.path.join(cache_dir, *parts)
+    os.makedirs(path, exist_ok=True)
+    return path
@@ -1,6 +1,8 @@
 from dataclasses import dataclass
+from itertools import chain
 from typing import Optional, Union
 
+import numpy as np
 import torch
 from transformers.tokenization_utils_base import PreTrainedTokenizerBase, PaddingStrategy
 
@@ -8,7 +10,8 @@ from transformers.tokenization_utils_base import PreTrainedTokenizerBase, Paddin
 @dataclass
 class DataCollatorForMultipleChoice:
     """
-    Data collator that will dynamically pad the inputs for multiple choice received.
+    Data collator that will dynamically pad the inputs for multiple choice received. The pre-tokenized choices are
+    written straight into preallocated tensors of shape (batch_size, num_choices, sequence_length).
     """
     tokenizer: PreTrainedTokenizerBase
     padding: Union[bool, str, PaddingStrategy] = True
@@ -17,23 +20,109 @@ class DataCollatorForMultipleChoice:
 
     def __call__(self, features):
         label_name = "label" if "label" in features[0].keys() else "labels"
-        labels = [feature.pop(label_name) for feature in features]
+        labels = [feature[label_name] for feature in features]
         batch_size = len(features)
         num_choices = len(features[0]["input_ids"])
-        flattened_features = [
-            [{k: v[i] for k, v in feature.items()} for i in range(num_choices)] for feature in features
-        ]
-
-        flattened_features = sum(flattened_features, [])
-        batch = self.tokenizer.pad(
-            flattened_features,
-            padding=self.padding,
-            max_length=self.max_length,
-            pad_to_multiple_of=self.pad_to_multiple_of,
-            return_tensors="pt",
+
+        lengths = np.fromiter(
+            (len(choice) for feature in features for choice in feature["input_ids"]), dtype=np.int64,
+            count=batch_size * num_choices
         )
+        sequence_length = self._sequence_length(int(lengths.max(initial=0)))
+        # position of every token in the flattened (batch_size * num_choices, sequence_length) tensor
+        rows = np.repeat(np.arange(len(lengths)), lengths)
+        columns = np.arange(len(rows)) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        if self.tokenizer.padding_side == "left":
+            columns += np.repeat(sequence_length - lengths, lengths)
+        rows, columns = torch.from_numpy(rows), torch.from_numpy(columns)
 
-        batch = {k: v.view(batch_size, num_choices, -1) for k, v in batch.items()}
+        batch = {}
+        for key in features[0].keys():
+            if key == label_name:
+                continue
+            values = np.fromiter(
+                chain.from_iterable(choice for feature in features for choice in feature[key]), dtype=np.int64,
+                count=len(rows)
+            )
+            tensor = torch.full((batch_size * num_choices, sequence_length), self._pad_value(key), dtype=torch.int64)
+            tensor[rows, columns] = torch.from_numpy(values)
+            batch[key] = tensor.view(batch_size, num_choices, sequence_length)
         batch["labels"] = torch.tensor(labels, dtype=torch.int64)
 
         return batch
+
+    def _sequence_length(self, longest: int) -> int:
+        padding = self.padding.value if isinstance(self.padding, PaddingStrategy) else self.padding
+        length = longest
+        if padding == "max_length":
+            if self.max_length is None:
+                raise ValueError("max_length is required for padding='max_length'")
+            if longest > self.max_length:
+                raise ValueError(f"A choice is longer ({longest}) than max_length ({self.max_length})")
+            length = self.max_length
+        if self.pad_to_multiple_of is not None and length % self.pad_to_multiple_of != 0:
+            length = (length // self.pad_to_multiple_of + 1) * self.pad_to_multiple_of
+        return length
+
+    def _pad_value(self, key: str) -> int:
+        if key == "input_ids":
+            return self.tokenizer.pad_token_id
+        if key == "token_type_ids":
+            return self.tokenizer.pad_token_type_id
+        return 0
+
+
+@dataclass
+class DataCollatorForPacking:
+    """
+    Data collator that packs several tokenized (unpadded) sequence classification examples into sequences of at most
+    `max_length` tokens. Examples are packed in order, every example gets its own position ids and a block-diagonal
+    (batch_size, sequence_length, sequence_length) attention mask, so examples can not attend to each other.
+    `cls_positions` holds the (row, column) of the first token of every example, in the order of the features.
+    """
+    tokenizer: PreTrainedTokenizerBase
+    max_length: int = 512
+    position_offset: int = 0
+
+    def __call__(self, features):
+        label_name = "label" if "label" in features[0].keys() else "labels"
+        lengths = [len(feature["input_ids"]) for feature in features]
+        if max(lengths) > self.max_length:
+            raise ValueError(f"An example is longer ({max(lengths)}) than max_length ({self.max_length})")
+
+        # next-fit keeps the order of the examples
+        rows, row_lengths = [], []
+        for i, length in enumerate(lengths):
+            if rows and row_lengths[-1] + length <= self.max_length:
+                rows[-1].append(i)
+                row_lengths[-1] += length
+            else:
+                rows.append([i])
+                row_lengths.append(length)
+
+        shape = (len(rows), max(row_lengths))
+        input_ids = torch.full(shape, self.tokenizer.pad_token_id, dtype=torch.int64)
+        token_type_ids = torch.full(shape, self.tokenizer.pad_token_type_id, dtype=torch.int64)
+        position_ids = torch.zeros(shape, dtype=torch.int64)
+        attention_mask = torch.zeros(shape + (shape[1],), dtype=torch.int64)
+        cls_positions = torch.zeros((len(features), 2), dtype=torch.int64)
+        for r, row in enumerate(rows):
+            start = 0
+            for i in row:
+                end = start + lengths[i]
+                input_ids[r, start:end] = torch.tensor(features[i]["input_ids"])
+                if "token_type_ids" in features[i]:
+                    token_type_ids[r, start:end] = torch.tensor(features[i]["token_type_ids"])
+                position_ids[r, start:end] = torch.arange(lengths[i]) + self.position_offset
+                attention_mask[r, start:end, start:end] = 1
+                cls_positions[i, 0], cls_positions[i, 1] = r, start
+                start = end
+
+        return {
+            "input_ids": input_ids,
+            "token_type_ids": token_type_ids,
+            "position_ids": position_ids,
+            "attention_mask": attention_mask,
+            "cls_positions": cls_positions,
+            "labels": torch.tensor([feature[label_name] for feature in features], dtype=torch.int64),
+        }
@@ -1,8 +1,113 @@
+import hashlib
+import json
 import os
-from typing import Optional, List, Literal
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, List, Literal, Dict, Tuple
 import tqdm
 import requests
 from bs4 import BeautifulSoup
+from hueval.utils.cache import get_cache_dir
+
+
+_MANIFEST: Dict[str, str] = {}
+# digests of the resources downloaded without a known checksum, later downloads of them are verified
+_RECORDED_CHECKSUMS = "download_checksums.json"
+_RECORD_LOCK = threading.Lock()
+_SESSION: Optional[requests.Session] = None
+_SESSION_LOCK = threading.Lock()
+
+
+def register_checksums(checksums: Dict[str, str]):
+    """
+    Registers the expected SHA-256 digests of resources, downloads of these URLs are verified against them.
+    Further digests are read from the JSON file ({url: sha256}) the `HUEVAL_DOWNLOAD_MANIFEST` environment variable
+    points to.
+    :param checksums: URL -> SHA-256 hex digest
+    :return:
+    """
+    _MANIFEST.update(checksums)
+
+
+def expected_checksum(url: str) -> Optional[str]:
+    """
+    SHA-256 digest of a resource from the manifest, or the digest recorded at its first download
+    :param url: URL
+    :return: Hex digest or None if it is unknown
+    """
+    if url in _MANIFEST:
+        return _MANIFEST[url]
+    manifest = os.environ.get("HUEVAL_DOWNLOAD_MANIFEST")
+    if manifest:
+        with open(manifest, mode="r") as f:
+            digest = json.load(f).get(url)
+        if digest is not None:
+            return digest
+    return _recorded_checksums().get(url)
+
+
+def _recorded_checksums_path() -> str:
+    return os.path.join(get_cache_dir(), _RECORDED_CHECKSUMS)
+
+
+def _recorded_checksums() -> Dict[str, str]:
+    path = _recorded_checksums_path()
+    if not os.path.exists(path):
+        return {}
+    with open(path, mode="r") as f:
+        return json.load(f)
+
+
+def _record_checksum(url: str, digest: str):
+    with _RECORD_LOCK:
+        checksums = _recorded_checksums()
+        checksums[url] = digest
+        _write_recorded_checksums(checksums)
+
+
+def _write_recorded_checksums(checksums: Dict[str, str]):
+    path = _recorded_checksums_path()
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, mode="w") as f:
+        json.dump(checksums, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def refresh_checksums(urls: Optional[List[str]] = None) -> List[str]:
+    """
+    Forgets the digests recorded at the first downloads of resources, so a resource which was updated upstream is
+    downloaded again instead of failing the verification, and its new digest is recorded. Digests of the manifest are
+    not affected
+    :param urls: URLs whose digests are forgotten, every recorded digest by default
+    :return: URLs whose digests were forgotten
+    """
+    with _RECORD_LOCK:
+        checksums = _recorded_checksums()
+        forgotten = [url for url in checksums if urls is None or url in urls]
+        if not forgotten:
+            return []
+        for url in forgotten:
+            del checksums[url]
+        _write_recorded_checksums(checksums)
+    return forgotten
+
+
+def get_session(pool_size: int = 8) -> requests.Session:
+    """
+    Session shared by the downloads, so connections are reused
+    :param pool_size: Minimum number of connections kept per host
+    :return:
+    """
+    global _SESSION
+    with _SESSION_LOCK:
+        if _SESSION is None or _SESSION.adapters["https://"]._pool_maxsize < pool_size:
+            session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _SESSION = session
+        return _SESSION
 
 
 def download_url(url: str,
@@ -11,9 +116,17 @@ def download_url(url: str,
                  verify_ssl: bool = True,
                  tqdm_params: Optional[dict] = None,
                  method: Literal["get", "post"] = "get",
-                 request_params: Optional[dict] = None) -> Optional[str]:
+                 request_params: Optional[dict] = None,
+                 chunk_size: int = 1 << 20,
+                 connections: int = 4,
+                 sha256: Optional[str] = None) -> Optional[str]:
     """
-    Downloads a file from the specified URL to the output folder
+    Downloads a file from the specified URL to the output folder. The file is written next to the output with a
+    `.part` suffix and renamed when it is complete, failed attempts are resumed with HTTP Range requests and large GET
+    resources are downloaded in `connections` segments in parallel. Partial files are only resumed when the resource
+    did not change since (`If-Range` with its ETag or Last-Modified date). The downloaded file is verified against the
+    size reported by the server and the expected SHA-256 digest; the digest of a resource without a known checksum is
+    recorded, so later downloads of it are verified.
     :param url: URL
     :param output: Output folder
     :param retries: Maximum number of retries to acquire the resource
@@ -21,6 +134,10 @@ def download_url(url: str,
     :param tqdm_params: Parameters for tqdm customization
     :param method: Method to retrieve the resource
     :param request_params: Parameters for the request
+    :param chunk_size: Size of the chunks read from the response in bytes
+    :param connections: Maximum number of parallel connections (segments) of a GET request
+    :param sha256: Expected SHA-256 digest of the resource, it is looked up in the manifest when it is not provided
+    (see `register_checksums`)
     :return: Path to the resource, or None
     """
 
@@ -34,25 +151,52 @@ def download_url(url: str,
     if request_params is None:
         request_params = {}
 
+    recorded = False
+    if sha256 is None:
+        sha256 = expected_checksum(url)
+        recorded = sha256 is not None and sha256 == _recorded_checksums().get(url)
+
+    session = get_session(max(connections, 1))
+    part = f"{output}.part"
     while retries + 1 > 0:
         try:
             print(f'Downloading {filename} from {url} ...')
             if method == "get":
-                resp = requests.get(url, params=request_params, stream=True, verify=verify_ssl)
+                probed_size, ranges, validator = _probe(session, url, request_params, verify_ssl)
+                # partial files of an earlier version of the resource (or of an unknown version) are not continued
+                _discard_stale_parts(part, validator)
+                if ranges and validator and probed_size >= 2 * chunk_size and connections > 1:
+                    _download_segments(session, url, part, probed_size, request_params, verify_ssl, chunk_size,
+                                       connections, tqdm_params, validator)
+                    total_size = probed_size
+                else:
+                    total_size = _download_single(session, url, part, request_params, verify_ssl, chunk_size,
+                                                  tqdm_params, validator if ranges else None)
             else:
-                resp = requests.post(url, data=request_params, stream=True, verify=verify_ssl)
-            if resp.status_code != 200:
-                raise RuntimeError(f'Failed to download content from url: {url}')
-
-            total_size = int(resp.headers.get('content-length', 0))
-            chunk_size = 1024
-            with tqdm.tqdm(total=total_size, unit='iB', unit_scale=True, **tqdm_params) as t:
-                with open(output, 'wb') as f:
-                    for chunk in resp.iter_content(chunk_size=chunk_size):
-                        if chunk:  # filter out keep-alive new chunks
-                            if tqdm is not None:
-                                t.update(len(chunk))
-                            f.write(chunk)
+                # form submissions can not be resumed
+                resp = session.post(url, data=request_params, stream=True, verify=verify_ssl)
+                if resp.status_code != 200:
+                    raise RuntimeError(f'Failed to download content from url: {url}')
+                total_size = int(resp.headers.get('content-length', 0))
+                with tqdm.tqdm(total=total_size, unit='iB', unit_scale=True, **tqdm_params) as t:
+                    with open(part, 'wb') as f:
+                        _write_response(resp, f, chunk_size, t, url)
+
+            if total_size and os.path.getsize(part) != total_size:
+                raise RuntimeError(f'Incomplete download of {url}: {os.path.getsize(part)} of {total_size} bytes')
+            digest = _sha256(part, chunk_size)
+            if sha256 is not None and digest != sha256.lower():
+                # the partial file is corrupt, resuming it would not help
+                _discard_stale_parts(part, None)
+                message = f'Checksum mismatch of {url}: expected {sha256}, got {digest}'
+                if recorded:
+                    message += (f' (recorded at its first download in {_recorded_checksums_path()}, if the resource '
+                                f'was updated upstream, run `hueval refresh-checksums {url}` and download it again)')
+                raise RuntimeError(message)
+            if sha256 is None:
+                _record_checksum(url, digest)
+            os.replace(part, output)
+            _discard_stale_parts(part, None)
             break
         except Exception as e:
             retries -= 1
@@ -62,6 +206,137 @@ def download_url(url: str,
     return output
 
 
+def _probe(session: requests.Session, url: str, params: dict, verify_ssl: bool) -> Tuple[int, bool, Optional[str]]:
+    """
+    Size of the resource, whether byte ranges are supported and its validator (a strong ETag or the Last-Modified
+    date), which identifies the version of the resource
+    """
+    resp = session.head(url, params=params, allow_redirects=True, verify=verify_ssl)
+    if resp.status_code != 200:
+        return 0, False, None
+    total_size = int(resp.headers.get('content-length', 0))
+    etag = resp.headers.get('etag')
+    validator = etag if etag and not etag.startswith('W/') else resp.headers.get('last-modified')
+    return total_size, total_size > 0 and resp.headers.get('accept-ranges', '').lower() == 'bytes', validator
+
+
+def _part_files(part: str) -> List[str]:
+    directory, name = os.path.split(part)
+    pattern = re.compile(rf"{re.escape(name)}(\d*|\.validator)")
+    return [os.path.join(directory, f) for f in os.listdir(directory or ".") if pattern.fullmatch(f)]
+
+
+def _discard_stale_parts(part: str, validator: Optional[str]):
+    """
+    Removes the partial files (the `.part` file and the segments) unless they belong to the given version of the
+    resource, then records the version of the new partial files
+    """
+    validator_path = f"{part}.validator"
+    stored = None
+    if os.path.exists(validator_path):
+        with open(validator_path, mode="r") as f:
+            stored = f.read()
+    if validator is None or stored != validator:
+        for path in _part_files(part):
+            os.remove(path)
+    if validator is not None:
+        with open(validator_path, mode="w") as f:
+            f.write(validator)
+
+
+def _write_response(resp: requests.Response, f, chunk_size: int, t: tqdm.tqdm, url: str):
+    try:
+        for chunk in resp.iter_content(chunk_size=chunk_size):
+            if chunk:  # filter out keep-alive new chunks
+                t.update(len(chunk))
+                f.write(chunk)
+    except (requests.exceptions.ChunkedEncodingError, requests.exceptions.ConnectionError) as e:
+        # responses without a length (or a checksum) can only be verified by the transfer itself
+        raise RuntimeError(f'The response of {url} ended early') from e
+
+
+def _content_range_total(resp: requests.Response) -> int:
+    # Content-Range: bytes <start>-<end>/<total> or bytes */<total>
+    total = resp.headers.get('content-range', '').rpartition('/')[2]
+    return int(total) if total.isdigit() else 0
+
+
+def _download_single(session: requests.Session, url: str, part: str, params: dict, verify_ssl: bool,
+                     chunk_size: int, tqdm_params: dict, validator: Optional[str]) -> int:
+    """
+    Downloads the resource in one stream, the partial file is resumed when a validator of the resource is given
+    :return: Expected size of the resource, 0 if it is unknown
+    """
+    offset = os.path.getsize(part) if validator and os.path.exists(part) else 0
+    headers = {'Range': f'bytes={offset}-', 'If-Range': validator} if offset else {}
+    resp = session.get(url, params=params, stream=True, verify=verify_ssl, headers=headers)
+    if resp.status_code == 416:  # the part file is already complete
+        return _content_range_total(resp)
+    if resp.status_code not in (200, 206):
+        raise RuntimeError(f'Failed to download content from url: {url}')
+    if resp.status_code == 200:  # the server ignored the range or the resource changed
+        offset = 0
+        total_size = int(resp.headers.get('content-length', 0))
+    else:
+        start = resp.headers.get('content-range', '').partition(' ')[2].partition('-')[0]
+        if start != str(offset):
+            raise RuntimeError(f'Unexpected range {resp.headers.get("content-range")} from url: {url}')
+        total_size = _content_range_total(resp) or offset + int(resp.headers.get('content-length', 0))
+    with tqdm.tqdm(total=total_size, initial=offset, unit='iB', unit_scale=True, **tqdm_params) as t:
+        with open(part, 'ab' if offset else 'wb') as f:
+            _write_response(resp, f, chunk_size, t, url)
+    return total_size
+
+
+def _download_segments(session: requests.Session, url: str, part: str, total_size: int, params: dict,
+                       verify_ssl: bool, chunk_size: int, connections: int, tqdm_params: dict, validator: str):
+    segment_size = -(-total_size // connections)
+    segments = [(i, start, min(start + segment_size, total_size) - 1)
+                for i, start in enumerate(range(0, total_size, segment_size))]
+    segment_parts = [f"{part}{i}" for i, _, _ in segments]
+    done = sum(os.path.getsize(p) for p in segment_parts if os.path.exists(p))
+
+    with tqdm.tqdm(total=total_size, initial=done, unit='iB', unit_scale=True, **tqdm_params) as t:
+        def fetch(segment):
+            i, start, end = segment
+            offset = os.path.getsize(segment_parts[i]) if os.path.exists(segment_parts[i]) else 0
+            if start + offset > end:
+                return
+            resp = session.get(url, params=params, stream=True, verify=verify_ssl,
+                               headers={'Range': f'bytes={start + offset}-{end}', 'If-Range': validator})
+            if resp.status_code != 206:
+                # a full response means that the resource changed, the next attempt starts over
+                raise RuntimeError(f'Failed to download bytes {start + offset}-{end} from url: {url}')
+            with open(segment_parts[i], 'ab') as f:
+                _write_response(resp, f, chunk_size, t, url)
+
+        with ThreadPoolExecutor(max_workers=len(segments)) as executor:
+            list(executor.map(fetch, segments))
+
+    for (_, start, end), segment_part in zip(segments, segment_parts):
+        if os.path.getsize(segment_part) != end - start + 1:
+            raise RuntimeError(f'Incomplete segment {start}-{end} of {url}')
+    with open(part, 'wb') as f:
+        for segment_part in segment_parts:
+            with open(segment_part, 'rb') as s:
+                while True:
+                    chunk = s.read(chunk_size)
+                    if not chunk:
+                        break
+                    f.write(chunk)
+
+
+def _sha256(path: str, chunk_size: int) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
 def get_url_paths(url, ext='', params=None) -> Optional[List]:
     """
     Retrieve file list in web folder
@@ -0,0 +1,54 @@
+from typing import Iterator, List, Sequence, Tuple
+import numpy as np
+from torch.utils.data import Sampler
+
+
+def sequence_lengths(dataset) -> Tuple[List[int], int]:
+    """
+    Returns the length of every tokenized (unpadded) example and the number of sequences per example, which is the
+    number of choices for multiple choice datasets and 1 otherwise
+    :param dataset: Tokenized dataset with an `input_ids` column
+    :return:
+    """
+    input_ids = dataset["input_ids"]
+    if len(input_ids) > 0 and isinstance(input_ids[0][0], list):
+        return [max(len(choice) for choice in x) for x in input_ids], len(input_ids[0])
+    return [len(x) for x in input_ids], 1
+
+
+class TokenBudgetBatchSampler(Sampler):
+    """
+    Groups examples of similar length into batches whose padded size (number of sequences x longest sequence) does not
+    exceed `max_tokens`. The batches are fixed, only their order is shuffled between epochs, so the number of batches
+    is the same in every epoch.
+    """
+
+    def __init__(self, lengths: Sequence[int], max_tokens: int, sequences_per_example: int = 1,
+                 shuffle: bool = False, seed: int = 0):
+        self.shuffle = shuffle
+        self.seed = seed
+        self.epoch = 0
+        self.batches = []
+
+        lengths = np.asarray(lengths)
+        batch = []
+        for index in np.argsort(lengths, kind="stable"):
+            # examples are sorted by length, so the current one is the longest in the batch
+            if batch and (len(batch) + 1) * sequences_per_example * lengths[index] > max_tokens:
+                self.batches.append(batch)
+                batch = []
+            batch.append(int(index))
+        if batch:
+            self.batches.append(batch)
+
+    def __iter__(self) -> Iterator[List[int]]:
+        if not self.shuffle:
+            yield from self.batches
+            return
+        order = np.random.default_rng(self.seed + self.epoch).permutation(len(self.batches))
+        self.epoch += 1
+        for i in order:
+            yield self.batches[i]
+
+    def __len__(self) -> int:
+        return len(self.batches)
@@ -0,0 +1,66 @@
+import json
+import re
+from typing import Any, Iterator, TextIO
+
+
+_WHITESPACE = re.compile(r"\s*")
+# characters which can continue a number
+_NUMBER_PART = re.compile(r"[0-9.eE+-]*")
+
+
+def iter_json_array(f: TextIO, chunk_size: int = 1 << 20) -> Iterator[Any]:
+    """
+    Incrementally parses a file which contains a JSON array and yields its elements one by one, so only the current
+    element and a chunk of the file are kept in memory
+    :param f: Opened text file
+    :param chunk_size: Number of characters read at once
+    :return:
+    """
+    decoder = json.JSONDecoder()
+    buffer, pos, eof = "", 0, False
+
+    def read(size: int) -> bool:
+        nonlocal buffer, pos, eof
+        chunk = f.read(size)
+        if not chunk:
+            eof = True
+            return False
+        buffer = buffer[pos:] + chunk
+        pos = 0
+        return True
+
+    def skip_whitespace() -> bool:
+        nonlocal pos
+        pos = _WHITESPACE.match(buffer, pos).end()
+        while pos == len(buffer):
+            if not read(chunk_size):
+                return False
+            pos = _WHITESPACE.match(buffer, pos).end()
+        return True
+
+    if not skip_whitespace() or buffer[pos] != "[":
+        raise ValueError("The file does not contain a JSON array")
+    pos += 1
+
+    while True:
+        if not skip_whitespace():
+            raise ValueError("Unterminated JSON array")
+        if buffer[pos] == "]":
+            return
+        if buffer[pos] == ",":
+            pos += 1
+            continue
+        try:
+            item, end = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            # the element does not fit into the buffer, the read size grows with the buffer to stay linear
+            if not read(max(chunk_size, len(buffer) - pos)):
+                raise
+            continue
+        if isinstance(item, (int, float)) and not isinstance(item, bool) and not eof \
+                and _NUMBER_PART.match(buffer, end).end() == len(buffer) and read(chunk_size):
+            # a number at the end of the buffer might continue in the next chunk (like `-0.` of `-0.5` or `1e` of
+            # `1e5`)
+            continue
+        yield item
+        pos = end
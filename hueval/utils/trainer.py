@@ -0,0 +1,96 @@
+from typing import Optional, TYPE_CHECKING
+from torch.utils.data import DataLoader
+from transformers import Trainer
+from hueval.utils.sampler import TokenBudgetBatchSampler, sequence_lengths
+
+if TYPE_CHECKING:
+    from hueval.evaluation.metrics import Metric
+
+
+class StreamingMetricTrainer(Trainer):
+    """
+    Trainer which reduces the logits of every evaluation batch to predicted label ids and adds them to a metric,
+    instead of accumulating the logits of the whole evaluation set for `compute_metrics`. The memory used by the
+    evaluation does not depend on the size of the evaluation set.
+    Distributed evaluation (and the legacy prediction loop) falls back to `compute_metrics`, since the state of the
+    metric is local to the process.
+    """
+
+    def __init__(self, *args, metric: Optional["Metric"] = None, **kwargs):
+        super(StreamingMetricTrainer, self).__init__(*args, **kwargs)
+        self.metric = metric
+        self._streaming = False
+
+    def evaluate(self, eval_dataset=None, ignore_keys=None, metric_key_prefix: str = "eval"):
+        # `predict` returns the logits, so only the evaluation is streamed
+        self._streaming = self.metric is not None and self.args.world_size == 1 and \
+            not self.args.use_legacy_prediction_loop and not self.args.prediction_loss_only
+        try:
+            return super(StreamingMetricTrainer, self).evaluate(eval_dataset, ignore_keys, metric_key_prefix)
+        finally:
+            self._streaming = False
+
+    def prediction_step(self, model, inputs, prediction_loss_only: bool, ignore_keys=None):
+        if not self._streaming:
+            return super(StreamingMetricTrainer, self).prediction_step(model, inputs, prediction_loss_only,
+                                                                       ignore_keys=ignore_keys)
+        loss, logits, labels = super(StreamingMetricTrainer, self).prediction_step(model, inputs, False,
+                                                                                   ignore_keys=ignore_keys)
+        if isinstance(logits, tuple):
+            logits = logits[0]
+        if labels is not None:
+            self.metric.add_batch(logits.argmax(dim=-1).cpu().numpy(), labels.cpu().numpy())
+        # nothing is accumulated by the evaluation loop besides the loss
+        return loss, None, None
+
+    def evaluation_loop(self, dataloader, description, prediction_loss_only=None, ignore_keys=None,
+                        metric_key_prefix: str = "eval"):
+        if not self._streaming:
+            return super(StreamingMetricTrainer, self).evaluation_loop(
+                dataloader, description, prediction_loss_only, ignore_keys, metric_key_prefix
+            )
+        self.metric.reset()
+        output = super(StreamingMetricTrainer, self).evaluation_loop(
+            dataloader, description, prediction_loss_only, ignore_keys, metric_key_prefix
+        )
+        for key, value in self.metric.compute().items():
+            output.metrics[f"{metric_key_prefix}_{key}"] = value
+        return output
+
+
+class TokenBudgetTrainer(StreamingMetricTrainer):
+    """
+    Trainer which batches examples of similar length by a token budget instead of a fixed number of examples.
+    Should be used with unpadded inputs and a data collator which pads to the longest member of the batch.
+    """
+
+    def __init__(self, *args, max_tokens: int = 4096, **kwargs):
+        super(TokenBudgetTrainer, self).__init__(*args, **kwargs)
+        self.max_tokens = max_tokens
+
+    def _token_budget_dataloader(self, dataset, shuffle: bool, description: str) -> DataLoader:
+        lengths, sequences_per_example = sequence_lengths(dataset)
+        batch_sampler = TokenBudgetBatchSampler(
+            lengths, self.max_tokens, sequences_per_example, shuffle=shuffle, seed=self.args.seed
+        )
+        return DataLoader(
+            self._remove_unused_columns(dataset, description=description),
+            batch_sampler=batch_sampler,
+            collate_fn=self.data_collator,
+            num_workers=self.args.dataloader_num_workers,
+            pin_memory=self.args.dataloader_pin_memory,
+        )
+
+    def get_train_dataloader(self) -> DataLoader:
+        if self.train_dataset is None:
+            raise ValueError("Trainer: training requires a train_dataset.")
+        return self._token_budget_dataloader(self.train_dataset, True, "training")
+
+    def get_eval_dataloader(self, eval_dataset=None) -> DataLoader:
+        if eval_dataset is None and self.eval_dataset is None:
+            raise ValueError("Trainer: evaluation requires an eval_dataset.")
+        eval_dataset = eval_dataset if eval_dataset is not None else self.eval_dataset
+        return self._token_budget_dataloader(eval_dataset, False, "evaluation")
+
+    def get_test_dataloader(self, test_dataset) -> DataLoader:
+        return self._token_budget_dataloader(test_dataset, False, "test")
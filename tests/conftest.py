@@ -0,0 +1,42 @@
+import pytest
+
+
+_VOCAB = ["[PAD]", "[UNK]", "[CLS]", "[SEP]", "buda", "##pest", "szep", "var", "##os", "##ban", "a", "nagy"]
+
+
+@pytest.fixture
+def wordpiece_tokenizer():
+    """
+    Fast WordPiece tokenizer of a tiny vocabulary, built without downloading a model
+    """
+    tokenizers = pytest.importorskip("tokenizers")
+    transformers = pytest.importorskip("transformers")
+
+    backend = tokenizers.Tokenizer(
+        tokenizers.models.WordPiece({token: i for i, token in enumerate(_VOCAB)}, unk_token="[UNK]")
+    )
+    backend.pre_tokenizer = tokenizers.pre_tokenizers.WhitespaceSplit()
+    backend.post_processor = tokenizers.processors.TemplateProcessing(
+        single="[CLS] $A [SEP]", special_tokens=[("[CLS]", 2), ("[SEP]", 3)]
+    )
+    return transformers.PreTrainedTokenizerFast(tokenizer_object=backend, unk_token="[UNK]", pad_token="[PAD]",
+                                                cls_token="[CLS]", sep_token="[SEP]")
+
+
+@pytest.fixture
+def backbone(tmp_path, monkeypatch):
+    """
+    Path of a tiny pretrained BERT (without a task head), the backbone cache is emptied afterwards
+    """
+    torch = pytest.importorskip("torch")
+    transformers = pytest.importorskip("transformers")
+    from hueval.models.cache import backbone_cache
+
+    monkeypatch.setenv("HUEVAL_CACHE", str(tmp_path / "cache"))
+    torch.manual_seed(0)
+    config = transformers.BertConfig(vocab_size=100, hidden_size=32, num_hidden_layers=2, num_attention_heads=2,
+                                     intermediate_size=37, max_position_embeddings=64)
+    path = str(tmp_path / "backbone")
+    transformers.BertModel(config).save_pretrained(path)
+    yield path
+    backbone_cache.clear()
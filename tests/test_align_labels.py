@@ -0,0 +1,65 @@
+import pytest
+
+pytest.importorskip("numpy")
+pytest.importorskip("transformers")
+from hueval.tokenizers.utils.align_labels_for_token_classification import AlignLabels  # noqa: E402
+
+
+_EXAMPLES = {
+    "tokens": [
+        ["a", "budapest", "varosban"],
+        ["nagy", "varos"],
+        # truncated in the middle of a word
+        ["budapest", "szep", "nagy", "varosban", "a", "budapest"],
+        ["ismeretlen", "a"],
+        [],
+    ],
+    "ner": [[0, 1, 2], [3, 4], [1, 2, 0, 3, 4, 1], [5, 6], []],
+}
+
+
+def _reference(tokenized_inputs, labels, label_all_tokens):
+    """
+    The per-token loop of the earlier implementation
+    """
+    aligned = []
+    for i, label in enumerate(labels):
+        previous_word_idx = None
+        label_ids = []
+        for word_idx in tokenized_inputs.word_ids(batch_index=i):
+            if word_idx is None:
+                label_ids.append(-100)
+            elif word_idx != previous_word_idx:
+                label_ids.append(label[word_idx])
+            else:
+                label_ids.append(label[word_idx] if label_all_tokens else -100)
+            previous_word_idx = word_idx
+        aligned.append(label_ids)
+    return aligned
+
+
+@pytest.mark.parametrize("label_all_tokens", [False, True])
+@pytest.mark.parametrize("padding, max_length", [("max_length", 8), (False, 8), ("max_length", 32)])
+def test_align_labels_matches_loop(label_all_tokens, padding, max_length, wordpiece_tokenizer):
+    tokenizer = wordpiece_tokenizer
+    aligner = AlignLabels(tokenizer, "ner", label_all_tokens=label_all_tokens, padding=padding,
+                          max_length=max_length)
+    tokenized = aligner.preprocess_function(_EXAMPLES)
+    expected = _reference(
+        tokenizer(_EXAMPLES["tokens"], truncation=True, is_split_into_words=True, padding=padding,
+                  max_length=max_length),
+        _EXAMPLES["ner"], label_all_tokens
+    )
+    assert tokenized["labels"] == expected
+
+
+def test_subword_continuations(wordpiece_tokenizer):
+    aligner = AlignLabels(wordpiece_tokenizer, "ner", padding=False)
+    tokenized = aligner.preprocess_function({"tokens": [["a", "budapest", "varosban"]], "ner": [[0, 1, 2]]})
+    # [CLS] a buda ##pest var ##os ##ban [SEP]
+    assert tokenized["input_ids"][0] == [2, 10, 4, 5, 7, 8, 9, 3]
+    assert tokenized["labels"][0] == [-100, 0, 1, -100, 2, -100, -100, -100]
+
+
+def test_empty_batch():
+    assert AlignLabels(None, "ner").align_labels([], []) == []
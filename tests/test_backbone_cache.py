@@ -0,0 +1,55 @@
+import json
+import struct
+
+import pytest
+
+torch = pytest.importorskip("torch")
+transformers = pytest.importorskip("transformers")
+pytest.importorskip("safetensors")
+from hueval.models.cache import MappedCheckpoint, backbone_cache, create_from_backbone  # noqa: E402
+
+
+def _create(backbone):
+    return create_from_backbone(backbone, transformers.BertForSequenceClassification, num_labels=3)
+
+
+def test_backbone_weights(backbone):
+    model = _create(backbone)
+    expected = transformers.BertModel.from_pretrained(backbone).state_dict()
+    for key, tensor in model.bert.state_dict().items():
+        assert torch.equal(tensor, expected[key]), key
+    assert backbone in backbone_cache
+
+
+def test_models_share_the_mapped_checkpoint(backbone):
+    first, second = _create(backbone), _create(backbone)
+    # the weights of the backbone are views of a single mapping of the checkpoint, not copies
+    assert len({parameter.untyped_storage().data_ptr() for parameter in first.bert.parameters()}) == 1
+    expected = {key: tensor.clone() for key, tensor in second.state_dict().items()}
+
+    # training one model modifies its own (copy-on-write) pages only
+    with torch.no_grad():
+        for parameter in first.parameters():
+            parameter.add_(1.0)
+    for model in (second, _create(backbone)):
+        for key, tensor in model.bert.state_dict().items():
+            assert torch.equal(tensor, expected[f"bert.{key}"]), key
+
+
+def test_unaligned_tensors(tmp_path):
+    path = tmp_path / "unaligned.safetensors"
+    data = bytes([1, 2, 3]) + struct.pack("<2f", 0.5, -2.0) + struct.pack("<h", 7)
+    header = json.dumps({
+        "base.a": {"dtype": "U8", "shape": [3], "data_offsets": [0, 3]},
+        "base.b": {"dtype": "F32", "shape": [2, 1], "data_offsets": [3, 11]},
+        "base.c": {"dtype": "I16", "shape": [], "data_offsets": [11, 13]},
+        "head.d": {"dtype": "U8", "shape": [0], "data_offsets": [13, 13]},
+    }).encode("utf8")
+    header += b" " * (-len(header) % 8)
+    path.write_bytes(struct.pack("<Q", len(header)) + header + data)
+
+    state_dict = MappedCheckpoint(str(path), prefix="base.").state_dict()
+    assert sorted(state_dict) == ["a", "b", "c"]
+    assert state_dict["a"].tolist() == [1, 2, 3]
+    assert state_dict["b"].tolist() == [[0.5], [-2.0]]
+    assert state_dict["c"].dtype == torch.int16 and state_dict["c"].item() == 7
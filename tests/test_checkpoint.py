@@ -0,0 +1,48 @@
+from types import SimpleNamespace
+
+import pytest
+
+torch = pytest.importorskip("torch")
+transformers = pytest.importorskip("transformers")
+pytest.importorskip("datasets")
+pytest.importorskip("safetensors")
+from hueval import cli  # noqa: E402
+from hueval.models.cache import create_from_backbone, is_fine_tuned  # noqa: E402
+from hueval.models.hubert import load_safetensors  # noqa: E402
+from hueval.training import Training, find_checkpoint  # noqa: E402
+
+
+def _save(model, name, output_dir):
+    # the state of a `Training` which is used by `Training.save`
+    training = SimpleNamespace(params=SimpleNamespace(model=model), packing=False, model_name=name, task_name="hulu",
+                               task_configuration="cola", label_name="label",
+                               arguments=SimpleNamespace(output_dir=output_dir))
+    return Training.save(training)
+
+
+def test_saved_model_is_loaded(backbone, tmp_path):
+    output_dir = str(tmp_path / "output")
+    model = create_from_backbone(backbone, transformers.BertForSequenceClassification, num_labels=3)
+    with torch.no_grad():
+        for parameter in model.parameters():
+            parameter.add_(1.0)
+    assert _save(model, backbone, output_dir) == output_dir
+
+    assert find_checkpoint(output_dir, backbone, "hulu", "cola", "label") == output_dir
+    assert find_checkpoint(output_dir, backbone, "hulu", "sst2", "label") is None
+    assert find_checkpoint(str(tmp_path), backbone, "hulu", "cola", "label") is None
+    assert is_fine_tuned(output_dir) and not is_fine_tuned(backbone)
+
+    loaded = create_from_backbone(backbone, transformers.BertForSequenceClassification, num_labels=3)
+    load_safetensors(loaded, f"{output_dir}/model.safetensors")
+    expected = model.state_dict()
+    for key, tensor in loaded.state_dict().items():
+        assert torch.equal(tensor, expected[key]), key
+
+
+@pytest.mark.parametrize("command", [["eval"], ["predict", "predictions.json"], ["optimize"]])
+def test_evaluation_requires_a_fine_tuned_model(command, backbone, tmp_path):
+    # the untrained task head of the backbone is not evaluated
+    argv = [command[0], backbone, "hulu", "cola", "label", *command[1:], "--output-dir", str(tmp_path)]
+    with pytest.raises(SystemExit, match="hueval train"):
+        cli.main(argv)
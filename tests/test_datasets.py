@@ -0,0 +1,174 @@
+import json
+import zipfile
+
+import pytest
+
+datasets = pytest.importorskip("datasets")
+pytest.importorskip("sklearn")
+from hueval.datasets.hulu import Hulu, _SOURCES, locate_answer  # noqa: E402
+from hueval.datasets.nerkor import NerKor  # noqa: E402
+from hueval.datasets.nerkor_extended import NerKorExtended  # noqa: E402
+from hueval.datasets.opinhubank import OpinHuBank  # noqa: E402
+
+
+_SPLITS = {"train": "train", "validation": "devel", "test": "test"}
+
+
+def _zip(path, files, root="snapshot-0123"):
+    with zipfile.ZipFile(path, mode="w") as f:
+        for name, content in files.items():
+            f.writestr(f"{root}/{name}", content)
+    return str(path)
+
+
+def _conll(header, sentences):
+    return "".join([header + "\n"] + ["".join("\t".join(token) + "\n" for token in s) + "\n" for s in sentences])
+
+
+@pytest.fixture
+def downloads(tmp_path, monkeypatch):
+    """
+    URL -> local file, used instead of the network by the download manager
+    """
+    monkeypatch.setenv("HUEVAL_CACHE", str(tmp_path / "hueval"))
+    files = {}
+
+    def download(self, url_or_urls):
+        return datasets.utils.py_utils.map_nested(files.__getitem__, url_or_urls)
+
+    monkeypatch.setattr(datasets.DownloadManager, "download", download)
+    monkeypatch.setattr(datasets.DownloadManager, "download_custom", lambda self, url, _: files[url])
+    return files
+
+
+def _prepare(builder_class, config_name, tmp_path):
+    builder = builder_class(config_name=config_name, cache_dir=str(tmp_path / "datasets"))
+    builder.download_and_prepare()
+    return builder.as_dataset()
+
+
+@pytest.mark.parametrize("config_name", ["all", "fiction"])
+def test_nerkor(config_name, downloads, tmp_path):
+    files = {}
+    for split, directory in _SPLITS.items():
+        for domain in ["fiction", "news"]:
+            document = f"data/genres/{domain}/morph/{split}.conllup"
+            files[document] = _conll("form\tlemma\tupos\txpos\tfeats\tconll:ner", [
+                [("Kovács", "Kovács", "PROPN", "N", "_", "B-PER"), ("jön", "jön", "VERB", "V", "_", "O")],
+                [(".", ".", "PUNCT", "_", "_", "O")],
+            ])
+            # the split directories contain pointer files with the relative path of the documents
+            files[f"data/train-devel-test/{directory}/{domain}/morph/{split}.conllup"] = \
+                f"../../../../genres/{domain}/morph/{split}.conllup\n"
+    downloads[NerKor.BUILDER_CONFIGS[0].data_url] = _zip(tmp_path / "nerkor.zip", files)
+
+    dataset = _prepare(NerKor, config_name, tmp_path)
+    expected = 4 if config_name == "all" else 2
+    assert {split: dataset[split].num_rows for split in _SPLITS} == dict.fromkeys(_SPLITS, expected)
+    assert dataset["train"]["idx"] == list(range(expected))
+    assert dataset["train"][0]["tokens"] == ["Kovács", "jön"]
+    assert dataset["train"][0]["ner"] == [1, 0]
+    assert dataset["train"][0]["file_name"] == "fiction/morph/train.conllup"
+
+
+def test_nerkor_extended(downloads, tmp_path):
+    files = {}
+    for directory in _SPLITS.values():
+        for domain in ["fiction", "cars"]:
+            files[f"data/{domain}-{directory}.conll"] = _conll("form\tner", [
+                [("Budapest", "B-GPE"), ("szép", "O")],
+            ])
+    downloads[NerKorExtended.BUILDER_CONFIGS[0].data_url] = _zip(tmp_path / "nerkor_1_41e.zip", files)
+
+    dataset = _prepare(NerKorExtended, "cars", tmp_path)
+    assert {split: dataset[split].num_rows for split in _SPLITS} == dict.fromkeys(_SPLITS, 1)
+    assert dataset["validation"][0]["file_name"] == "cars-devel.conll"
+    assert dataset["validation"][0]["tokens"] == ["Budapest", "szép"]
+
+
+def _hulu_files(name):
+    rows = range(12)
+    if name == "cola":
+        split = [{"Sent_id": f"cola_{i}", "Sent": f"mondat {i}", "Label": str(i % 2)} for i in rows]
+        test = [{"Sent_id": f"cola_{i}", "Sent": f"mondat {i}"} for i in rows]
+        return {"data/cola_train.json": {"data": split}, "data/cola_dev.json": {"data": split},
+                "data/cola_test.json": {"data": test}}
+    if name == "copa":
+        split = [{"idx": str(i), "question": "cause", "premise": "p", "choice1": "a", "choice2": "b",
+                  "label": str(i % 2 + 1)} for i in rows]
+        test = [{key: value for key, value in row.items() if key != "label"} for row in split]
+        return {"data/train.json": split, "data/val.json": split, "data/test.json": test}
+    if name == "wnli":
+        split = [{"id": str(i), "sentence1": "a", "sentence2": "b", "label": str(i % 2)} for i in rows]
+        test = [{key: value for key, value in row.items() if key != "label"} for row in split]
+        return {"data/train.json": split, "data/dev.json": {"data": split}, "data/test.json": {"data": test}}
+    if name == "sst2":
+        split = [{"Sent_id": f"sst_{i}", "Sent": "s", "Label": ["negative", "neutral", "positive"][i % 3]}
+                 for i in rows]
+        test = [{"Sent_id": f"sst_{i}", "Sent": "s"} for i in rows]
+        return {"data/sst_train.json": split, "data/sst_dev.json": split, "data/sst_test.json": test}
+    if name == "ws":
+        return {"huws.json": [{"ID": str(i), "Question": "q", "Sent": "s", "Answer1": "a", "Answer2": "b",
+                               "CorrectAnswer": "ab"[i % 2]} for i in rows]}
+    raise ValueError(name)
+
+
+@pytest.mark.parametrize("name, labels", [
+    ("cola", [0, 1, 0]), ("copa", [0, 1, 0]), ("wnli", [0, 1, 0]), ("sst2", [0, 1, 2]), ("ws", None)
+])
+def test_hulu(name, labels, downloads, tmp_path):
+    files = {path: json.dumps(content) for path, content in _hulu_files(name).items()}
+    downloads[_SOURCES[name]] = _zip(tmp_path / f"{name}.zip", files)
+
+    dataset = _prepare(Hulu, name, tmp_path)
+    if name == "ws":
+        # train (70%), validation (10%) and test (20%) of the same file
+        assert [dataset[split].num_rows for split in _SPLITS] == [8, 1, 3]
+        assert sorted(sum((dataset[split]["idx"] for split in _SPLITS), [])) == list(range(12))
+        return
+    assert [dataset[split].num_rows for split in _SPLITS] == [12, 12, 12]
+    assert dataset["train"]["labels"][:3] == labels
+    assert set(dataset["test"]["labels"]) == {-1}
+
+
+def test_hulu_rc(downloads, tmp_path):
+    rows = [{"id": str(i), "lead": ["lead"], "passage": ["első rész", f"a válasz {i} itt"], "query": "q",
+             "MASK": f"válasz {i}"} for i in range(3)]
+    for split, url in _SOURCES["rc"].items():
+        path = tmp_path / f"hurc_{split}.json"
+        path.write_text(json.dumps(rows), encoding="utf8")
+        downloads[url] = str(path)
+
+    dataset = _prepare(Hulu, "rc", tmp_path)
+    assert dataset["validation"].num_rows == 3
+    assert dataset["validation"][1]["passage_id"] == 1
+    assert dataset["validation"][1]["start_positions"] == 2
+    assert dataset["validation"][1]["end_positions"] == 10
+
+
+def test_opinhubank(downloads, tmp_path):
+    header = "ID,Start,Len,Entity,Sentence,URL,A1,A2,A3,A4,A5\n"
+    # three of the five annotators agree on the label of a row
+    rows = [f"{i},0,5,Péter,Péter jó,http://example.com,{i % 3 - 1},{i % 3 - 1},{i % 3 - 1},0,0\n"
+            for i in range(20)]
+    downloads[OpinHuBank.BUILDER_CONFIGS[0].data_url] = str(tmp_path / "opinhubank.zip")
+    with zipfile.ZipFile(downloads[OpinHuBank.BUILDER_CONFIGS[0].data_url], mode="w") as f:
+        f.writestr("OpinHuBank_20130106.csv", "".join([header] + rows).encode("iso-8859-2"))
+
+    dataset = _prepare(OpinHuBank, "opinhubank", tmp_path)
+    assert [dataset[split].num_rows for split in _SPLITS] == [14, 2, 4]
+    row = dataset["train"][0]
+    assert row["entity"] == "Péter"
+    assert row["labels"] == (row["idx"] - 1) % 3
+
+
+@pytest.mark.parametrize("passages, answer, expected", [
+    (["Budapest a főváros.", "A Duna Budapesten folyik át."], "Duna", (1, 2)),
+    (["Budapest a főváros.", "A Duna Budapesten folyik át."], "Budapest", (0, 0)),
+    (["Budapest a főváros.", "A Duna Budapesten folyik át."], "Tisza", (-1, -1)),
+    # a match can not span two passages
+    (["első", "második"], "elsőmás", (-1, -1)),
+    (["", "x"], "x", (1, 0)),
+])
+def test_locate_answer(passages, answer, expected):
+    assert locate_answer(passages, answer) == expected
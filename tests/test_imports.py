@@ -0,0 +1,44 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_HEAVY_MODULES = ("torch", "transformers", "datasets")
+
+
+def _loaded_heavy_modules(code: str):
+    script = f"import json, sys\n{code}\nprint(json.dumps([m for m in {_HEAVY_MODULES!r} if m in sys.modules]))"
+    result = subprocess.run([sys.executable, "-c", script], cwd=_ROOT, capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def test_import_cli():
+    assert _loaded_heavy_modules("import hueval.cli") == []
+
+
+def test_import_prepare():
+    # numpy is light, but it is required by the training module
+    pytest.importorskip("numpy")
+    assert _loaded_heavy_modules("import hueval.prepare, hueval.datasets, hueval.training") == []
+
+
+def test_help():
+    for argv in (["--help"], ["train", "--help"], ["sweep", "--help"]):
+        code = (
+            "import contextlib, io, hueval.cli\n"
+            "with contextlib.redirect_stdout(io.StringIO()):\n"
+            "    try:\n"
+            f"        hueval.cli.build_parser().parse_args({argv!r})\n"
+            "    except SystemExit:\n"
+            "        pass"
+        )
+        assert _loaded_heavy_modules(code) == [], argv
+
+
+def test_parse_arguments():
+    code = "import hueval.cli\nhueval.cli.build_parser().parse_args(['train', 'model', 'hulu', 'cola', 'labels'])"
+    assert _loaded_heavy_modules(code) == []
@@ -0,0 +1,87 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+from hueval.evaluation.metrics import load_metric  # noqa: E402
+
+
+# expected values were computed with sklearn (accuracy_score, matthews_corrcoef, f1_score) and seqeval
+# (classification_report, accuracy_score)
+_REFERENCES = [["B-PER", "I-PER", "O", "B-LOC"], ["B-ORG", "O"], ["I-PER", "I-PER", "O", "S-LOC", "E-LOC"]]
+_PREDICTIONS = [["B-PER", "I-PER", "O", "B-ORG"], ["B-ORG", "I-ORG"], ["B-PER", "I-PER", "O", "S-LOC", "O"]]
+_LABEL_NAMES = ["O", "B-PER", "I-PER", "B-ORG", "I-ORG", "B-LOC", "I-LOC", "S-LOC", "E-LOC"]
+_SEQEVAL = {
+    "LOC": {"precision": 1.0, "recall": 1 / 3, "f1": 0.5, "number": 3},
+    "ORG": {"precision": 0.0, "recall": 0.0, "f1": 0.0, "number": 1},
+    "PER": {"precision": 1.0, "recall": 1.0, "f1": 1.0, "number": 2},
+    "overall_precision": 0.6,
+    "overall_recall": 0.5,
+    "overall_f1": 0.5454545454545454,
+    "overall_accuracy": 0.6363636363636364,
+}
+
+
+def _assert_seqeval(result):
+    assert result.keys() == _SEQEVAL.keys()
+    for key, expected in _SEQEVAL.items():
+        assert result[key] == (pytest.approx(expected) if isinstance(expected, float) else expected), key
+
+
+def _compute_in_batches(metric, predictions, references, batch_size=2):
+    for start in range(0, len(references), batch_size):
+        metric.add_batch(predictions[start:start + batch_size], references[start:start + batch_size])
+    return metric.compute()
+
+
+def test_accuracy():
+    predictions, references = [0, 2, 1, 1, 0, 2, 1, 0, 0, 2], [0, 1, 1, 2, 0, 2, 1, 1, 0, 0]
+    assert _compute_in_batches(load_metric("accuracy"), predictions, references) == {"accuracy": 0.6}
+
+
+@pytest.mark.parametrize("predictions, references, expected", [
+    ([0, 2, 1, 1, 0, 2, 1, 0, 0, 2], [0, 1, 1, 2, 0, 2, 1, 1, 0, 0], 0.40004734568283135),
+    ([1, 1, 0, 0, 1, 0, 1], [1, 0, 0, 0, 1, 1, 1], 0.4166666666666667),
+    # a constant prediction
+    ([1, 1, 1, 1], [1, 0, 0, 1], 0.0),
+])
+def test_matthews_correlation(predictions, references, expected):
+    result = _compute_in_batches(load_metric("matthews_correlation"), predictions, references)
+    assert result["matthews_correlation"] == pytest.approx(expected, abs=1e-12)
+
+
+def test_f1():
+    result = _compute_in_batches(load_metric("f1"), [1, 1, 0, 0, 1, 0, 1], [1, 0, 0, 0, 1, 1, 1])
+    assert result == {"f1": pytest.approx(0.75)}
+    assert load_metric("f1").compute(predictions=[0, 0], references=[0, 0]) == {"f1": 0.0}
+
+
+def test_record():
+    predictions = [{"idx": {"query": 0}, "prediction_text": "the Budapest"},
+                   {"idx": {"query": 1}, "prediction_text": "Pest city"}]
+    references = [{"idx": {"query": 0}, "answers": ["Budapest", "Buda"]},
+                  {"idx": {"query": 1}, "answers": ["Budapest city"]}]
+    result = load_metric("record").compute(predictions=predictions, references=references)
+    assert result == {"exact_match": 0.5, "f1": 0.75}
+
+
+def test_seqeval_strings():
+    _assert_seqeval(_compute_in_batches(load_metric("seqeval"), _PREDICTIONS, _REFERENCES))
+
+
+def test_seqeval_label_ids():
+    # outputs of a token classification model, the positions of the padding (and subword continuations) are ignored
+    label_ids = {name: i for i, name in enumerate(_LABEL_NAMES)}
+    width = max(map(len, _REFERENCES)) + 2
+    references = np.full((len(_REFERENCES), width), -100)
+    predictions = np.zeros((len(_REFERENCES), width), dtype=np.int64)
+    for i, (reference, prediction) in enumerate(zip(_REFERENCES, _PREDICTIONS)):
+        # position 0 is a special token
+        references[i, 1:len(reference) + 1] = [label_ids[label] for label in reference]
+        predictions[i, 1:len(prediction) + 1] = [label_ids[label] for label in prediction]
+    metric = load_metric("seqeval", label_names=_LABEL_NAMES)
+    _assert_seqeval(_compute_in_batches(metric, predictions, references))
+
+
+def test_seqeval_without_labeled_tokens():
+    metric = load_metric("seqeval", label_names=_LABEL_NAMES)
+    result = metric.compute(predictions=np.zeros((2, 3), dtype=np.int64), references=np.full((2, 3), -100))
+    assert result == {"overall_precision": 0.0, "overall_recall": 0.0, "overall_f1": 0.0, "overall_accuracy": 0.0}
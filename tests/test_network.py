@@ -0,0 +1,190 @@
+import hashlib
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+pytest.importorskip("requests")
+pytest.importorskip("bs4")
+from hueval.utils import network  # noqa: E402
+
+
+CHUNK_SIZE = 1024
+
+
+class _Resource:
+    def __init__(self):
+        self.content = os.urandom(10 * CHUNK_SIZE + 123)
+        self.etag = '"v1"'
+        self.head_status = 200
+        self.truncate = 0  # number of GET responses which are cut in half
+        self.requests = []
+
+
+class _Handler(BaseHTTPRequestHandler):
+    resource: _Resource
+
+    def log_message(self, *args):
+        pass
+
+    def _range(self):
+        header = self.headers.get("Range")
+        if header is None:
+            return None
+        if_range = self.headers.get("If-Range")
+        if if_range is not None and if_range != self.resource.etag:
+            # the resource changed, the whole resource is sent
+            return None
+        start, _, end = header.partition("=")[2].partition("-")
+        size = len(self.resource.content)
+        return int(start), min(int(end), size - 1) if end else size - 1
+
+    def do_HEAD(self):
+        if self.resource.head_status != 200:
+            self.send_response(self.resource.head_status)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(self.resource.content)))
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("ETag", self.resource.etag)
+        self.end_headers()
+
+    def do_GET(self):
+        resource = self.resource
+        resource.requests.append(dict(self.headers))
+        content, byte_range = resource.content, self._range()
+        if byte_range is None:
+            self.send_response(200)
+            body = content
+        else:
+            start, end = byte_range
+            if start >= len(content):
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{len(content)}")
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{len(content)}")
+            body = content[start:end + 1]
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", resource.etag)
+        self.end_headers()
+        if resource.truncate > 0:
+            resource.truncate -= 1
+            body = body[:len(body) // 2]
+            self.close_connection = True
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    monkeypatch.setenv("HUEVAL_CACHE", str(tmp_path / "cache"))
+    resource = _Resource()
+    handler = type("Handler", (_Handler,), {"resource": resource})
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield resource, f"http://127.0.0.1:{httpd.server_address[1]}/resource.bin"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def _download(url, output, **kwargs):
+    kwargs.setdefault("retries", 1)
+    return network.download_url(url, str(output), tqdm_params={"disable": True}, chunk_size=CHUNK_SIZE, **kwargs)
+
+
+def _read(path):
+    with open(path, mode="rb") as f:
+        return f.read()
+
+
+def test_segmented_download(server, tmp_path):
+    resource, url = server
+    output = tmp_path / "resource.bin"
+    _download(url, output, connections=4)
+    assert _read(output) == resource.content
+    assert sum("Range" in headers for headers in resource.requests) == 4
+    assert not [f for f in os.listdir(tmp_path) if ".part" in f]
+
+
+def test_resume(server, tmp_path):
+    resource, url = server
+    output = tmp_path / "resource.bin"
+    with open(f"{output}.part", mode="wb") as f:
+        f.write(resource.content[:3000])
+    with open(f"{output}.part.validator", mode="w") as f:
+        f.write(resource.etag)
+    _download(url, output, connections=1)
+    assert _read(output) == resource.content
+    assert resource.requests[0]["Range"] == "bytes=3000-"
+    assert resource.requests[0]["If-Range"] == resource.etag
+
+
+def test_stale_part_is_discarded(server, tmp_path):
+    resource, url = server
+    output = tmp_path / "resource.bin"
+    with open(f"{output}.part", mode="wb") as f:
+        f.write(os.urandom(3000))
+    with open(f"{output}.part.validator", mode="w") as f:
+        f.write('"v0"')
+    _download(url, output, connections=1)
+    assert _read(output) == resource.content
+    assert "Range" not in resource.requests[0]
+
+
+def test_truncated_response(server, tmp_path):
+    resource, url = server
+    # without a HEAD response the size is only known from the GET response
+    resource.head_status = 405
+    resource.truncate = 1
+    output = tmp_path / "resource.bin"
+    with pytest.raises(RuntimeError):
+        _download(url, output)
+    assert not output.exists()
+
+    resource.truncate = 1
+    _download(url, output, retries=3)
+    assert _read(output) == resource.content
+
+
+def test_truncated_segment(server, tmp_path):
+    resource, url = server
+    resource.truncate = 1
+    output = tmp_path / "resource.bin"
+    _download(url, output, connections=4, retries=3)
+    assert _read(output) == resource.content
+
+
+def test_checksum_mismatch(server, tmp_path):
+    resource, url = server
+    output = tmp_path / "resource.bin"
+    with pytest.raises(RuntimeError, match="Checksum mismatch"):
+        _download(url, output, sha256="0" * 64)
+    assert not output.exists()
+    assert not [f for f in os.listdir(tmp_path) if ".part" in f]
+
+    _download(url, output, sha256=hashlib.sha256(resource.content).hexdigest())
+    assert _read(output) == resource.content
+
+
+def test_recorded_checksum(server, tmp_path):
+    resource, url = server
+    _download(url, tmp_path / "first.bin")
+    assert network.expected_checksum(url) == hashlib.sha256(resource.content).hexdigest()
+
+    # the resource changed, a new download does not match the digest recorded at the first download
+    resource.content = os.urandom(len(resource.content))
+    resource.etag = '"v2"'
+    with pytest.raises(RuntimeError, match="refresh-checksums"):
+        _download(url, tmp_path / "second.bin")
+
+    # the recorded digest is refreshed explicitly
+    assert network.refresh_checksums(["http://127.0.0.1/other"]) == []
+    assert network.refresh_checksums([url]) == [url]
+    assert network.expected_checksum(url) is None
+    _download(url, tmp_path / "second.bin")
+    assert _read(tmp_path / "second.bin") == resource.content
+    assert network.expected_checksum(url) == hashlib.sha256(resource.content).hexdigest()
@@ -0,0 +1,28 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("datasets")
+pytest.importorskip("pandas")
+from hueval.datasets.opinhubank import majority_vote  # noqa: E402
+
+
+# label ids: 0 negative, 1 neutral, 2 positive
+@pytest.mark.parametrize("annotators, expected", [
+    ([2, 2, 2, 2, 2], 2),  # unanimous
+    ([0, 0, 0, 0, 0], 0),
+    ([0, 0, 0, 2, 2], 0),  # 3-2
+    ([2, 1, 2, 1, 2], 2),
+    ([0, 1, 0, 0, 2], 0),  # 3-1-1
+    ([1, 1, 1, 1, 0], 1),  # 4-1
+    ([0, 0, 2, 2, 1], 1),  # 2-2-1 ties are neutral
+    ([2, 1, 2, 0, 0], 1),
+    ([1, 0, 1, 0, 2], 1),
+])
+def test_majority_vote(annotators, expected):
+    assert majority_vote(np.array([annotators])).tolist() == [expected]
+
+
+def test_majority_vote_rows():
+    annotators = np.array([[2, 2, 2, 2, 2], [0, 0, 0, 2, 2], [0, 0, 2, 2, 1], [1, 1, 1, 1, 0]])
+    assert majority_vote(annotators).tolist() == [2, 0, 1, 1]
+    assert majority_vote(np.zeros((0, 5), dtype=np.int64)).tolist() == []
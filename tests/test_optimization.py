@@ -0,0 +1,44 @@
+import pytest
+
+torch = pytest.importorskip("torch")
+transformers = pytest.importorskip("transformers")
+from hueval.models.optimization import create_runtime  # noqa: E402
+
+
+def _model():
+    torch.manual_seed(0)
+    config = transformers.BertConfig(vocab_size=100, hidden_size=32, num_hidden_layers=2, num_attention_heads=2,
+                                     intermediate_size=37, max_position_embeddings=64, num_labels=3)
+    return transformers.BertForSequenceClassification(config)
+
+
+def _batch(batch_size, sequence_length):
+    input_ids = torch.randint(1, 100, (batch_size, sequence_length))
+    attention_mask = torch.ones_like(input_ids)
+    # padding in the last example
+    attention_mask[-1, sequence_length // 2:] = 0
+    return {"input_ids": input_ids, "attention_mask": attention_mask,
+            "token_type_ids": torch.zeros_like(input_ids)}
+
+
+@pytest.mark.parametrize("name", ["torchscript", "onnx"])
+def test_runtime_matches_fp32(name, tmp_path):
+    if name == "onnx":
+        pytest.importorskip("onnx")
+        pytest.importorskip("onnxruntime")
+    model = _model()
+    # the exported graph has to generalize to other batch sizes and sequence lengths than the ones of the export
+    example_batch, batch = _batch(2, 8), _batch(3, 13)
+    fp32 = create_runtime("fp32", model, example_batch, str(tmp_path))
+    runtime = create_runtime(name, model, example_batch, str(tmp_path))
+    with torch.inference_mode():
+        expected, logits = fp32(batch), runtime(batch)
+    assert logits.shape == (3, 3)
+    assert torch.allclose(logits, expected, atol=1e-4)
+
+
+def test_model_is_not_modified(tmp_path):
+    model = _model().train()
+    create_runtime("torchscript", model, _batch(2, 8), str(tmp_path))
+    assert model.training
+    assert all(module.training for module in model.modules())
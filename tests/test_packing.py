@@ -0,0 +1,58 @@
+from types import SimpleNamespace
+
+import pytest
+
+torch = pytest.importorskip("torch")
+transformers = pytest.importorskip("transformers")
+from hueval.models.packing import PackedForSequenceClassification  # noqa: E402
+from hueval.utils.data_collator import DataCollatorForPacking  # noqa: E402
+
+
+_TOKENIZER = SimpleNamespace(pad_token_id=0, pad_token_type_id=0)
+
+
+def _features(lengths):
+    generator = torch.Generator().manual_seed(0)
+    features = []
+    for i, length in enumerate(lengths):
+        input_ids = [2] + torch.randint(5, 100, (length - 1,), generator=generator).tolist()
+        # sentence pairs have two segments
+        token_type_ids = [0] * (length // 2) + [1] * (length - length // 2)
+        features.append({"input_ids": input_ids, "token_type_ids": token_type_ids, "labels": i % 3})
+    return features
+
+
+def test_collator_boundaries():
+    # next-fit: 3 + 4 fill the first row, 2 + 5 the second, 8 fills a row exactly
+    batch = DataCollatorForPacking(tokenizer=_TOKENIZER, max_length=8)(_features([3, 4, 2, 5, 8]))
+    assert batch["cls_positions"].tolist() == [[0, 0], [0, 3], [1, 0], [1, 2], [2, 0]]
+    assert batch["input_ids"].shape == (3, 8)
+    assert batch["position_ids"][0].tolist() == [0, 1, 2, 0, 1, 2, 3, 0]
+    assert batch["position_ids"][1].tolist() == [0, 1, 0, 1, 2, 3, 4, 0]
+    expected = torch.zeros(3, 8, 8, dtype=torch.int64)
+    for row, blocks in enumerate([[(0, 3), (3, 7)], [(0, 2), (2, 7)], [(0, 8)]]):
+        for start, end in blocks:
+            expected[row, start:end, start:end] = 1
+    assert torch.equal(batch["attention_mask"], expected)
+    assert batch["labels"].tolist() == [0, 1, 2, 0, 1]
+
+
+def test_packed_logits_match_unpacked():
+    torch.manual_seed(0)
+    config = transformers.BertConfig(vocab_size=100, hidden_size=32, num_hidden_layers=2, num_attention_heads=2,
+                                     intermediate_size=37, max_position_embeddings=64, num_labels=3)
+    model = transformers.BertForSequenceClassification(config).eval()
+    features = _features([5, 9, 3, 12, 7, 16])
+
+    with torch.no_grad():
+        expected = torch.cat([
+            model(input_ids=torch.tensor([f["input_ids"]]), token_type_ids=torch.tensor([f["token_type_ids"]])).logits
+            for f in features
+        ])
+        batch = DataCollatorForPacking(tokenizer=_TOKENIZER, max_length=16)(features)
+        output = PackedForSequenceClassification(model)(**batch)
+
+    # several examples share a row
+    assert batch["input_ids"].shape[0] < len(features)
+    assert torch.allclose(output.logits, expected, atol=1e-5)
+    assert output.loss is not None
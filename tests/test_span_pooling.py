@@ -0,0 +1,57 @@
+import pytest
+
+torch = pytest.importorskip("torch")
+transformers = pytest.importorskip("transformers")
+from hueval.models.bert import BertForSpanClassification, span_max_pool  # noqa: E402
+
+
+def _reference(sequence_output, spans, num_spans=None):
+    """
+    Max pools every span separately, padded (and empty) spans are zeros
+    """
+    batch_size, _, hidden_size = sequence_output.shape
+    num_spans = spans.size(1) if num_spans is None else num_spans
+    span_reps = torch.zeros(batch_size, num_spans, hidden_size)
+    for b in range(batch_size):
+        for s, (start, end) in enumerate(spans[b].tolist()):
+            if start >= 0 and end >= start:
+                span_reps[b, s] = sequence_output[b, start:end + 1].max(dim=0).values
+    return span_reps
+
+
+def test_span_max_pool():
+    torch.manual_seed(0)
+    # negative states, so a zero vector (or a -inf) of a wrong mask would change the maximum
+    sequence_output = -torch.rand(3, 10, 4) - 1
+    spans = torch.tensor([
+        [[0, 0], [2, 6], [8, 9]],  # a span at the end of the sequence with a shorter width than the window
+        [[9, 9], [-1, -1], [-1, -1]],  # padded spans
+        [[4, 3], [1, 9], [5, 5]],  # an empty span (end before the start)
+    ])
+    assert torch.equal(span_max_pool(sequence_output, spans), _reference(sequence_output, spans))
+
+
+def test_span_max_pool_without_valid_spans():
+    sequence_output = torch.rand(2, 5, 4)
+    assert torch.equal(span_max_pool(sequence_output, torch.full((2, 2, 2), -1)), torch.zeros(2, 2, 4))
+    assert span_max_pool(sequence_output, torch.zeros(2, 0, 2, dtype=torch.int64)).shape == (2, 0, 4)
+
+
+@pytest.mark.parametrize("spans", [
+    [[[1, 3]], [[0, 7]]],
+    [[[1, 3], [5, 7], [7, 7]], [[0, 0], [-1, -1], [-1, -1]]],
+])
+def test_batches_with_different_span_counts(spans):
+    torch.manual_seed(0)
+    config = transformers.BertConfig(vocab_size=100, hidden_size=32, num_hidden_layers=2, num_attention_heads=2,
+                                     intermediate_size=37, max_position_embeddings=64, num_labels=2)
+    config.num_spans = 3
+    model = BertForSpanClassification(config).eval()
+    input_ids = torch.randint(1, 100, (2, 8))
+    spans = torch.tensor(spans)
+
+    with torch.no_grad():
+        logits = model(input_ids, spans=spans)[0]
+        sequence_output = model.bert(input_ids)[0]
+        expected = model.classifier(_reference(sequence_output, spans, num_spans=3).flatten(1))
+    assert torch.allclose(logits, expected, atol=1e-6)
@@ -0,0 +1,49 @@
+import io
+import json
+
+import pytest
+
+from hueval.utils.streaming_json import iter_json_array
+
+
+_VALUES = [
+    {"id": "1", "passage": ["első", "második " * 20], "MASK": "x"},
+    12345678901234567890,
+    -1.5e-3,
+    'a string with "escapes", commas ] and \\\\ backslashes',
+    [],
+    {},
+    None,
+    True,
+    [1, [2, [3]]],
+]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 64, 1 << 20])
+@pytest.mark.parametrize("indent", [None, 2])
+def test_values_across_buffer_boundaries(chunk_size, indent):
+    text = json.dumps(_VALUES, indent=indent, ensure_ascii=False)
+    assert list(iter_json_array(io.StringIO(text), chunk_size=chunk_size)) == _VALUES
+
+
+@pytest.mark.parametrize("text", ["[]", "  [ ]  ", "\n[\n\n]\n"])
+@pytest.mark.parametrize("chunk_size", [1, 1 << 20])
+def test_empty_array(text, chunk_size):
+    assert list(iter_json_array(io.StringIO(text), chunk_size=chunk_size)) == []
+
+
+@pytest.mark.parametrize("text, chunk_size, expected", [
+    ("[123456]", 4, [123456]),
+    # the chunks end in a prefix which is a valid number itself
+    ("[-0.5]", 3, [-0.5]),
+    ("[1e5, 2]", 2, [1e5, 2]),
+    ("[1.5E+3]", 5, [1.5e3]),
+])
+def test_number_at_the_end_of_a_chunk(text, chunk_size, expected):
+    assert list(iter_json_array(io.StringIO(text), chunk_size=chunk_size)) == expected
+
+
+@pytest.mark.parametrize("text", ["", "   ", "{}", "[1, 2"])
+def test_invalid(text):
+    with pytest.raises(ValueError):
+        list(iter_json_array(io.StringIO(text), chunk_size=2))
@@ -0,0 +1,24 @@
+import json
+
+from hueval.sweep import _GB, _load_result, job_name, select_device
+
+
+def test_select_device():
+    budgets = [10 * _GB, 10 * _GB]
+    # workers share a device while they fit into its budget, the device with the most free memory is used
+    assert select_device([0, 0], budgets, 4 * _GB) == 0
+    assert select_device([4 * _GB, 0], budgets, 4 * _GB) == 1
+    assert select_device([4 * _GB, 4 * _GB], budgets, 4 * _GB) == 0
+    assert select_device([8 * _GB, 8 * _GB], budgets, 4 * _GB) is None
+    # a worker which does not fit into the budget of any device is run alone
+    assert select_device([0], [10 * _GB], 20 * _GB) == 0
+    assert select_device([], [], _GB) is None
+
+
+def test_result_without_scores_is_not_finished(tmp_path):
+    configuration = ("model", "hulu", "cola", "labels")
+    path = tmp_path / f"{job_name(configuration)}.json"
+    path.write_text(json.dumps({"results": None}))
+    assert _load_result(str(tmp_path), configuration) is None
+    path.write_text(json.dumps({"results": {"eval_accuracy": 1.0}, "split": "validation"}))
+    assert _load_result(str(tmp_path), configuration)["split"] == "validation"
@@ -0,0 +1,38 @@
+import os
+
+import pytest
+
+datasets = pytest.importorskip("datasets")
+pytest.importorskip("transformers")
+from hueval.tokenizers.utils.align_labels_for_token_classification import AlignLabels  # noqa: E402
+from hueval.tokenizers.utils.tokenized_cache import tokenize_dataset  # noqa: E402
+
+
+def _dataset():
+    tokens = [["a", "budapest"], ["nagy", "varosban"], ["szep", "a", "varos"], ["budapest"]] * 5
+    split = datasets.Dataset.from_dict({
+        "tokens": tokens,
+        "ner": [[i % 3] * len(x) for i, x in enumerate(tokens)],
+        "idx": list(range(len(tokens))),
+    })
+    return datasets.DatasetDict({"train": split})
+
+
+def test_cache_does_not_depend_on_processes(wordpiece_tokenizer, tmp_path, monkeypatch):
+    monkeypatch.setenv("HUEVAL_CACHE", str(tmp_path))
+    dataset = _dataset()
+    aligner = AlignLabels(wordpiece_tokenizer, "ner", padding="max_length", max_length=8)
+    expected = tokenize_dataset(dataset, aligner, batch_size=3, num_proc=2)["train"]
+    # the shards of the processes are merged into one file
+    assert os.listdir(tmp_path / "tokenized") == [os.path.basename(expected.cache_files[0]["filename"])]
+
+    calls = []
+    preprocess_function = AlignLabels.preprocess_function
+    monkeypatch.setattr(AlignLabels, "preprocess_function",
+                        lambda self, examples: calls.append(1) or preprocess_function(self, examples))
+    for batch_size, num_proc in [(1000, None), (5, 3), (3, 1)]:
+        tokenized = tokenize_dataset(dataset, aligner, batch_size=batch_size, num_proc=num_proc)["train"]
+        assert tokenized.cache_files == expected.cache_files
+        assert tokenized["labels"] == expected["labels"]
+    assert not calls
+    assert "tokens" not in expected.column_names and "idx" in expected.column_names